@@ -73,7 +73,8 @@ CREATE TABLE IF NOT EXISTS `risk_alerts` (
     
     -- 时间戳
     `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
-    `resolved_at` DATETIME NULL COMMENT '解决时间'
+    `resolved_at` DATETIME NULL COMMENT '解决时间',
+    `alert_key` CHAR(32) NULL COMMENT '批量写入时客户端生成的唯一键，用于取回自增ID'
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='风险预警记录表';
 
 -- ========================================
@@ -102,8 +103,11 @@ CREATE INDEX `idx_risk_alerts_ts_code_type` ON `risk_alerts` (`ts_code`, `alert_
 -- 预警级别和活跃状态复合索引  
 CREATE INDEX `idx_risk_alerts_level_active` ON `risk_alerts` (`alert_level`, `is_active`);
 
--- 创建时间索引
-CREATE INDEX `idx_risk_alerts_created_at` ON `risk_alerts` (`created_at`);
+-- 统计聚合覆盖索引（按时间范围GROUP BY无需回表，前缀列也用于按创建时间查询）
+CREATE INDEX `idx_risk_alerts_created_stats` ON `risk_alerts` (`created_at`, `alert_type`, `alert_level`, `is_active`, `is_resolved`);
+
+-- 批量写入唯一键（NULL不参与唯一约束）
+CREATE UNIQUE INDEX `uk_risk_alerts_alert_key` ON `risk_alerts` (`alert_key`);
 
 -- ========================================
 -- 5. 插入预警规则类型字典数据（可选）
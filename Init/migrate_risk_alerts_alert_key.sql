@@ -0,0 +1,16 @@
+-- ========================================
+-- 预警记录批量写入唯一键迁移脚本
+-- 说明: 预警检查批量INSERT预警记录后，按客户端生成的 alert_key 一次查询取回自增ID，
+--       Webhook发件箱记录据此关联预警（与 RiskAlert 模型一致）
+-- ========================================
+
+-- 使用数据库（请根据实际情况修改数据库名）
+-- USE your_database_name;
+
+ALTER TABLE `risk_alerts`
+    ADD COLUMN `alert_key` CHAR(32) NULL COMMENT '批量写入时客户端生成的唯一键，用于取回自增ID';
+
+CREATE UNIQUE INDEX `uk_risk_alerts_alert_key` ON `risk_alerts` (`alert_key`);
+
+-- 查看表结构
+DESCRIBE `risk_alerts`;
@@ -0,0 +1,16 @@
+-- ========================================
+-- 预警记录统计索引迁移脚本
+-- 说明: 已按旧版 create_alert_tables.sql 建表的数据库，将创建时间单列索引
+--       替换为统计聚合使用的覆盖索引（与 RiskAlert.__table_args__ 一致）
+-- ========================================
+
+-- 使用数据库（请根据实际情况修改数据库名）
+-- USE your_database_name;
+
+-- 先建新索引再删旧索引，迁移期间按创建时间的查询始终有索引可用
+CREATE INDEX `idx_risk_alerts_created_stats` ON `risk_alerts` (`created_at`, `alert_type`, `alert_level`, `is_active`, `is_resolved`);
+
+DROP INDEX `idx_risk_alerts_created_at` ON `risk_alerts`;
+
+-- 查看索引
+SHOW INDEX FROM `risk_alerts`;
@@ -55,6 +55,10 @@ def create_app(config_name='default'):
         from app.api import webhook_routes
         webhook_routes.register_webhook_routes(api_bp)
 
+        # 注册异动检测路由
+        from app.api import anomaly_api
+        anomaly_api.register_anomaly_routes(api_bp)
+
     # 立即注册路由
     register_api_routes()
 
@@ -7,12 +7,20 @@ from flask import request, jsonify
 from loguru import logger
 from datetime import datetime, timedelta
 from app.api import api_bp
-from app.extensions import db
 from app.models.alert_rule import AlertRule
 from app.models.risk_alert import RiskAlert
 from app.models.stock_basic import StockBasic
 from app.services.stock_data_service import StockDataService
 from app.services.alert_trigger_engine import alert_trigger_engine
+from app.services.anomaly_detection_engine import AnomalyDetectionEngine
+from app.services.intraday_alert_engine import intraday_alert_engine
+from app.services.stock_search_index import stock_search_index
+from app.utils.pagination import clear_count_cache, paginate
+
+
+def _rule_types():
+    """可创建的规则类型：模型内置类型加异动检测指标"""
+    return {**AlertRule.RULE_TYPES, **AnomalyDetectionEngine.RULE_TYPES}
 
 
 # ==================== 预警规则管理 ====================
@@ -25,7 +33,9 @@ def get_alert_rules():
         ts_code = request.args.get('ts_code')
         rule_type = request.args.get('rule_type')
         is_enabled = request.args.get('is_enabled')
-        page = int(request.args.get('page', 1))
+        page = request.args.get('page', type=int)
+        cursor = request.args.get('cursor')
+        with_total = request.args.get('with_total', 'true').lower() == 'true'
         per_page = min(int(request.args.get('per_page', 20)), 100)
         
         # 构建查询
@@ -39,29 +49,26 @@ def get_alert_rules():
             enabled = is_enabled.lower() == 'true'
             query = query.filter_by(is_enabled=enabled)
         
-        # 分页查询
-        pagination = query.order_by(AlertRule.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        # 键集分页（created_at, id 倒序），总数按筛选条件缓存
+        pagination = paginate(
+            query, [AlertRule.created_at, AlertRule.id],
+            count_key=('alert_rules', ts_code, rule_type, is_enabled) if with_total else None,
+            per_page=per_page, page=page, cursor=cursor, descending=True
         )
         
-        rules = [rule.to_dict() for rule in pagination.items]
+        rules = [rule.to_dict() for rule in pagination.pop('items')]
         
         return jsonify({
             'success': True,
             'data': {
                 'rules': rules,
-                'pagination': {
-                    'page': page,
-                    'per_page': per_page,
-                    'total': pagination.total,
-                    'pages': pagination.pages,
-                    'has_next': pagination.has_next,
-                    'has_prev': pagination.has_prev
-                }
+                'pagination': pagination
             },
             'message': f'获取到 {len(rules)} 条预警规则'
         })
         
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         logger.error(f"获取预警规则失败: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -99,7 +106,7 @@ def create_alert_rule():
                 }), 400
         
         # 验证规则类型
-        if data['rule_type'] not in AlertRule.RULE_TYPES:
+        if data['rule_type'] not in _rule_types():
             return jsonify({
                 'success': False,
                 'message': f'无效的规则类型: {data["rule_type"]}'
@@ -125,6 +132,9 @@ def create_alert_rule():
             extra_config=data.get('extra_config')
         )
         
+        alert_trigger_engine.rule_index.upsert(rule)
+        clear_count_cache('alert_rules')
+        
         logger.info(f"创建预警规则成功: {rule.rule_name} ({rule.id})")
         
         return jsonify({
@@ -186,6 +196,8 @@ def update_alert_rule(rule_id):
         
         if update_data:
             rule.update_rule(**update_data)
+            alert_trigger_engine.rule_index.upsert(rule)
+            clear_count_cache('alert_rules')
             logger.info(f"更新预警规则成功: {rule.rule_name} ({rule.id})")
         
         return jsonify({
@@ -212,6 +224,8 @@ def delete_alert_rule(rule_id):
         
         # 软删除
         rule.update_rule(is_active=False)
+        alert_trigger_engine.rule_index.remove(rule.id)
+        clear_count_cache('alert_rules')
         
         logger.info(f"删除预警规则成功: {rule.rule_name} ({rule.id})")
         
@@ -243,6 +257,8 @@ def toggle_alert_rule(rule_id):
         else:
             rule.enable_rule()
             action = '启用'
+        alert_trigger_engine.rule_index.upsert(rule)
+        clear_count_cache('alert_rules')
         
         logger.info(f"{action}预警规则成功: {rule.rule_name} ({rule.id})")
         
@@ -269,7 +285,9 @@ def get_alert_records():
         alert_level = request.args.get('alert_level')
         is_active = request.args.get('is_active')
         days = int(request.args.get('days', 7))  # 默认查询最近7天
-        page = int(request.args.get('page', 1))
+        page = request.args.get('page', type=int)
+        cursor = request.args.get('cursor')
+        with_total = request.args.get('with_total', 'true').lower() == 'true'
         per_page = min(int(request.args.get('per_page', 50)), 100)
         
         # 构建查询
@@ -289,29 +307,26 @@ def get_alert_records():
             active = is_active.lower() == 'true'
             query = query.filter_by(is_active=active)
         
-        # 分页查询
-        pagination = query.order_by(RiskAlert.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        # 键集分页（created_at, id 倒序），深翻页不再随偏移量线性变慢
+        pagination = paginate(
+            query, [RiskAlert.created_at, RiskAlert.id],
+            count_key=('risk_alerts', days, ts_code, alert_type, alert_level, is_active) if with_total else None,
+            per_page=per_page, page=page, cursor=cursor, descending=True
         )
         
-        records = [record.to_dict() for record in pagination.items]
+        records = [record.to_dict() for record in pagination.pop('items')]
         
         return jsonify({
             'success': True,
             'data': {
                 'records': records,
-                'pagination': {
-                    'page': page,
-                    'per_page': per_page,
-                    'total': pagination.total,
-                    'pages': pagination.pages,
-                    'has_next': pagination.has_next,
-                    'has_prev': pagination.has_prev
-                }
+                'pagination': pagination
             },
             'message': f'获取到 {len(records)} 条预警记录'
         })
         
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         logger.error(f"获取预警记录失败: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -344,6 +359,7 @@ def create_alert_record():
             position_size=data.get('position_size'),
             portfolio_weight=data.get('portfolio_weight')
         )
+        clear_count_cache('risk_alerts')
         
         logger.info(f"创建预警记录成功: {alert.ts_code} - {alert.alert_type}")
         
@@ -370,6 +386,8 @@ def resolve_alert_record(alert_id):
             }), 404
         
         alert.resolve_alert()
+        alert_trigger_engine.dedup_index.discard(alert.ts_code, alert.alert_type)
+        clear_count_cache('risk_alerts')
         
         logger.info(f"解决预警记录成功: {alert.ts_code} - {alert.alert_type}")
         
@@ -396,29 +414,15 @@ def get_alert_stats():
         # 获取预警统计
         alert_stats = RiskAlert.get_alert_stats()
         
-        # 最近预警趋势（最近7天）
-        recent_alerts = []
-        for i in range(7):
-            date = datetime.now().date() - timedelta(days=i)
-            start_time = datetime.combine(date, datetime.min.time())
-            end_time = datetime.combine(date, datetime.max.time())
-            
-            count = RiskAlert.query.filter(
-                RiskAlert.created_at >= start_time,
-                RiskAlert.created_at <= end_time
-            ).count()
-            
-            recent_alerts.append({
-                'date': date.isoformat(),
-                'count': count
-            })
+        # 最近预警趋势（最近7天，一次按日期聚合）
+        recent_trend = RiskAlert.get_daily_counts(days=7)
         
         return jsonify({
             'success': True,
             'data': {
                 'rule_stats': rule_stats,
                 'alert_stats': alert_stats,
-                'recent_trend': list(reversed(recent_alerts))
+                'recent_trend': recent_trend
             },
             'message': '获取预警统计信息成功'
         })
@@ -440,7 +444,7 @@ def get_alert_options():
         return jsonify({
             'success': True,
             'data': {
-                'rule_types': AlertRule.RULE_TYPES,
+                'rule_types': _rule_types(),
                 'operators': AlertRule.OPERATORS,
                 'alert_levels': AlertRule.ALERT_LEVELS,
                 'stock_count': stock_count
@@ -491,25 +495,8 @@ def search_stocks():
                 'message': '请提供搜索关键词'
             }), 400
         
-        # 搜索股票（按代码或名称）
-        stocks = StockBasic.query.filter(
-            db.or_(
-                StockBasic.ts_code.like(f'%{query}%'),
-                StockBasic.name.like(f'%{query}%'),
-                StockBasic.symbol.like(f'%{query}%')
-            )
-        ).limit(limit).all()
-        
-        results = []
-        for stock in stocks:
-            results.append({
-                'ts_code': stock.ts_code,
-                'symbol': stock.symbol,
-                'name': stock.name,
-                'area': stock.area,
-                'industry': stock.industry,
-                'list_date': stock.list_date.isoformat() if stock.list_date else None
-            })
+        # 内存索引：代码前缀、名称前缀、拼音首字母和子串匹配
+        results = stock_search_index.search(query, limit)
         
         return jsonify({
             'success': True,
@@ -533,11 +520,25 @@ def trigger_alert_check():
         # 获取参数
         ts_codes = data.get('ts_codes')  # 指定股票代码列表
         rule_types = data.get('rule_types')  # 指定规则类型列表
+        workers = data.get('workers')  # 分片并行的工作进程数（默认取配置）
+        
+        if workers is not None:
+            max_workers = alert_trigger_engine.max_workers()
+            try:
+                workers = int(workers)
+            except (TypeError, ValueError):
+                workers = 0
+            if not 1 <= workers <= max_workers:
+                return jsonify({
+                    'success': False,
+                    'message': f'workers 取值范围为 1-{max_workers}'
+                }), 400
         
         # 运行预警检查
         result = alert_trigger_engine.run_alert_check(
             ts_codes=ts_codes,
-            rule_types=rule_types
+            rule_types=rule_types,
+            workers=workers
         )
         
         if result['success']:
@@ -591,4 +592,77 @@ def trigger_stock_check(ts_code):
         return jsonify({
             'success': False,
             'message': f'触发股票预警检查失败: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+# ==================== 盘中预警 ====================
+
+@api_bp.route('/trigger/intraday/start', methods=['POST'])
+def start_intraday_alerts():
+    """开始盘中预警评估（消费新同步的分钟K线）"""
+    try:
+        data = request.get_json() or {}
+        
+        trade_date = None
+        if data.get('trade_date'):
+            trade_date = datetime.strptime(data['trade_date'], '%Y-%m-%d').date()
+        period_type = data.get('period_type', '5min')
+        
+        status = intraday_alert_engine.start_session(trade_date=trade_date, period_type=period_type)
+        
+        return jsonify({
+            'success': True,
+            'data': status,
+            'message': '盘中预警已启动'
+        })
+        
+    except Exception as e:
+        logger.error(f"启动盘中预警失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'启动盘中预警失败: {str(e)}'
+        }), 500
+
+
+@api_bp.route('/trigger/intraday/stop', methods=['POST'])
+def stop_intraday_alerts():
+    """停止盘中预警评估"""
+    try:
+        intraday_alert_engine.stop_session()
+        
+        return jsonify({
+            'success': True,
+            'data': intraday_alert_engine.get_status(),
+            'message': '盘中预警已停止'
+        })
+        
+    except Exception as e:
+        logger.error(f"停止盘中预警失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'停止盘中预警失败: {str(e)}'
+        }), 500
+
+
+@api_bp.route('/trigger/intraday/status', methods=['GET'])
+def get_intraday_status():
+    """获取盘中预警状态，可选返回指定股票的盘中累计状态"""
+    try:
+        data = intraday_alert_engine.get_status()
+        
+        ts_code = request.args.get('ts_code')
+        if ts_code:
+            data['state'] = intraday_alert_engine.get_state(ts_code)
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'message': '获取盘中预警状态成功'
+        })
+        
+    except Exception as e:
+        logger.error(f"获取盘中预警状态失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'获取盘中预警状态失败: {str(e)}'
+        }), 500
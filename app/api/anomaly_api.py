@@ -0,0 +1,152 @@
+"""
+异动检测API路由
+提供日线异动扫描、盘中异动检测会话管理和异动事件查询功能
+"""
+
+from datetime import datetime
+from flask import request, jsonify
+from loguru import logger
+from app.services.anomaly_detection_engine import anomaly_detection_engine
+
+
+def register_anomaly_routes(api_bp):
+    """注册异动检测路由到API蓝图"""
+
+    @api_bp.route('/anomaly/daily', methods=['GET'])
+    def get_daily_anomalies():
+        """获取日线异动列表"""
+        try:
+            trade_date = request.args.get('trade_date')
+            anomaly_type = request.args.get('type')
+            ts_code = request.args.get('ts_code')
+            limit = min(int(request.args.get('limit', 100)), 1000)
+
+            if trade_date:
+                result = anomaly_detection_engine.scan_daily(datetime.strptime(trade_date, '%Y-%m-%d').date())
+            else:
+                result = anomaly_detection_engine.ensure_daily_scan()
+
+            anomalies = result['anomalies']
+            if anomaly_type:
+                anomalies = [item for item in anomalies if anomaly_type in item['types']]
+            if ts_code:
+                anomalies = [item for item in anomalies if item['ts_code'] == ts_code]
+
+            return jsonify({
+                'success': True,
+                'data': {
+                    'trade_date': result['trade_date'].isoformat() if result['trade_date'] else None,
+                    'stock_count': len(result['codes']),
+                    'total': len(anomalies),
+                    'anomalies': anomalies[:limit]
+                },
+                'message': '获取日线异动成功'
+            })
+
+        except ValueError:
+            return jsonify({'success': False, 'message': '日期格式错误，应为YYYY-MM-DD'}), 400
+        except Exception as e:
+            logger.error(f"获取日线异动失败: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+    @api_bp.route('/anomaly/intraday/start', methods=['POST'])
+    def start_anomaly_session():
+        """开始盘中异动检测"""
+        try:
+            data = request.get_json(silent=True) or {}
+            trade_date = data.get('trade_date')
+            period_type = data.get('period_type', '5min')
+
+            status = anomaly_detection_engine.start_session(
+                trade_date=datetime.strptime(trade_date, '%Y-%m-%d').date() if trade_date else None,
+                period_type=period_type
+            )
+
+            return jsonify({
+                'success': True,
+                'data': status,
+                'message': '盘中异动检测已开始'
+            })
+
+        except ValueError:
+            return jsonify({'success': False, 'message': '日期格式错误，应为YYYY-MM-DD'}), 400
+        except Exception as e:
+            logger.error(f"开始盘中异动检测失败: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+    @api_bp.route('/anomaly/intraday/stop', methods=['POST'])
+    def stop_anomaly_session():
+        """结束盘中异动检测"""
+        try:
+            anomaly_detection_engine.stop_session()
+
+            return jsonify({
+                'success': True,
+                'data': anomaly_detection_engine.get_status(),
+                'message': '盘中异动检测已结束'
+            })
+
+        except Exception as e:
+            logger.error(f"结束盘中异动检测失败: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+    @api_bp.route('/anomaly/intraday/events', methods=['GET'])
+    def get_anomaly_events():
+        """获取最近的盘中异动事件"""
+        try:
+            ts_code = request.args.get('ts_code')
+            anomaly_type = request.args.get('type')
+            limit = min(int(request.args.get('limit', 100)), 1000)
+
+            events = anomaly_detection_engine.get_events(ts_code=ts_code, anomaly_type=anomaly_type, limit=limit)
+
+            return jsonify({
+                'success': True,
+                'data': events,
+                'message': '获取盘中异动事件成功'
+            })
+
+        except Exception as e:
+            logger.error(f"获取盘中异动事件失败: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+    @api_bp.route('/anomaly/intraday/<ts_code>', methods=['GET'])
+    def get_anomaly_state(ts_code):
+        """获取单只股票的盘中异动状态"""
+        try:
+            state = anomaly_detection_engine.get_state(ts_code)
+            if state is None:
+                return jsonify({
+                    'success': False,
+                    'message': f'股票 {ts_code} 不在盘中异动检测范围内'
+                }), 404
+
+            return jsonify({
+                'success': True,
+                'data': state,
+                'message': '获取盘中异动状态成功'
+            })
+
+        except Exception as e:
+            logger.error(f"获取盘中异动状态失败: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+    @api_bp.route('/anomaly/status', methods=['GET'])
+    def get_anomaly_status():
+        """获取异动检测引擎状态"""
+        try:
+            return jsonify({
+                'success': True,
+                'data': {
+                    **anomaly_detection_engine.get_status(),
+                    'anomaly_types': anomaly_detection_engine.ANOMALY_TYPES
+                },
+                'message': '获取异动检测状态成功'
+            })
+
+        except Exception as e:
+            logger.error(f"获取异动检测状态失败: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+    # 返回注册的函数
+    return register_anomaly_routes
@@ -1,6 +1,7 @@
 from flask import request, jsonify
 from app.api import api_bp
 from app.services.stock_service import StockService
+from app.services.ohlc_resampler import ohlc_resampler
 from loguru import logger
 
 @api_bp.route('/stocks', methods=['GET'])
@@ -10,15 +11,17 @@ def get_stocks():
         # 获取查询参数
         industry = request.args.get('industry')
         area = request.args.get('area')
-        page = int(request.args.get('page', 1))
+        page = request.args.get('page', type=int)
         page_size = min(int(request.args.get('page_size', 20)), 100)
+        cursor = request.args.get('cursor')
         
         # 调用服务
         result = StockService.get_stock_list(
             industry=industry,
             area=area,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            cursor=cursor
         )
         
         return jsonify({
@@ -26,6 +29,12 @@ def get_stocks():
             'message': '成功',
             'data': result
         })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+            'data': None
+        }), 400
     except Exception as e:
         logger.error(f"获取股票列表API错误: {e}")
         return jsonify({
@@ -66,20 +75,38 @@ def get_stock_history(ts_code):
     try:
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
-        limit = int(request.args.get('limit', 60))
+        period = request.args.get('period')
+        points = request.args.get('points', type=int)
         
-        result = StockService.get_daily_history(
-            ts_code=ts_code,
-            start_date=start_date,
-            end_date=end_date,
-            limit=limit
-        )
+        if period or points:
+            # 服务端聚合为周/月K或目标点数，limit为聚合后的K线数
+            result = ohlc_resampler.resample_daily(
+                ts_code=ts_code,
+                period=period,
+                points=points,
+                start_date=start_date,
+                end_date=end_date,
+                limit=request.args.get('limit', type=int)
+            )
+        else:
+            result = StockService.get_daily_history(
+                ts_code=ts_code,
+                start_date=start_date,
+                end_date=end_date,
+                limit=int(request.args.get('limit', 60))
+            )
         
         return jsonify({
             'code': 200,
             'message': '成功',
             'data': result
         })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+            'data': None
+        }), 400
     except Exception as e:
         logger.error(f"获取股票历史数据API错误: {ts_code}, {e}")
         return jsonify({
@@ -6,7 +6,9 @@
 from flask import request, jsonify
 from loguru import logger
 from app.api import api_bp
+from app.models.stock_minute_data import StockMinuteData
 from app.services.stock_data_service import StockDataService
+from app.services.ohlc_resampler import ohlc_resampler
 
 
 @api_bp.route('/stocks', methods=['GET'])
@@ -16,19 +18,23 @@ def get_stocks():
         # 获取查询参数
         industry = request.args.get('industry')
         area = request.args.get('area')
-        page = request.args.get('page', 1, type=int)
+        page = request.args.get('page', type=int)
         page_size = request.args.get('page_size', 50, type=int)
+        cursor = request.args.get('cursor')
         
         # 从数据服务获取（会自动处理缓存）
         result = StockDataService.get_stock_list(
             industry=industry,
             area=area,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            cursor=cursor
         )
         
         return jsonify(result)
     
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         logger.error(f"获取股票列表失败: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -102,23 +108,76 @@ def get_daily_data(ts_code):
         # 获取查询参数
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
-        limit = request.args.get('limit', 60, type=int)
+        period = request.args.get('period')
+        points = request.args.get('points', type=int)
+        
+        if period or points:
+            # 服务端聚合为周/月K或目标点数，limit为聚合后的K线数
+            data = ohlc_resampler.resample_daily(
+                ts_code=ts_code,
+                period=period,
+                points=points,
+                start_date=start_date,
+                end_date=end_date,
+                limit=request.args.get('limit', type=int)
+            )
+            return jsonify({'success': True, 'data': data, 'period': period, 'source': 'database'})
         
         # 从数据服务获取（会自动处理缓存）
         result = StockDataService.get_daily_data(
             ts_code=ts_code,
             start_date=start_date,
             end_date=end_date,
-            limit=limit
+            limit=request.args.get('limit', 60, type=int)
         )
         
         return jsonify(result)
     
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         logger.error(f"获取日线数据失败: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@api_bp.route('/stocks/<string:ts_code>/minute', methods=['GET'])
+def get_minute_data(ts_code):
+    """获取分钟K线（可按 period 聚合为5/15/30/60分钟或日K，或按 points 聚合到目标点数）"""
+    try:
+        period_type = request.args.get('period_type', '1min')
+        start_time = request.args.get('start_time')
+        end_time = request.args.get('end_time')
+        period = request.args.get('period')
+        points = request.args.get('points', type=int)
+        
+        if period or points:
+            data = ohlc_resampler.resample_minute(
+                ts_code=ts_code,
+                period=period,
+                points=points,
+                period_type=period_type,
+                start_time=start_time,
+                end_time=end_time,
+                limit=request.args.get('limit', type=int)
+            )
+        else:
+            limit = min(request.args.get('limit', 240, type=int), 5000)
+            query = StockMinuteData.query.filter_by(ts_code=ts_code, period_type=period_type)
+            if start_time:
+                query = query.filter(StockMinuteData.datetime >= start_time)
+            if end_time:
+                query = query.filter(StockMinuteData.datetime <= end_time)
+            data = [bar.to_dict() for bar in query.order_by(StockMinuteData.datetime.desc()).limit(limit).all()]
+        
+        return jsonify({'success': True, 'data': data, 'period': period or period_type})
+    
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"获取分钟数据失败: {ts_code}, {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
 @api_bp.route('/stocks/<string:ts_code>/daily/sync', methods=['POST'])
 def sync_daily_data(ts_code):
     """手动同步日线数据"""
@@ -8,7 +8,8 @@ from loguru import logger
 from datetime import datetime
 from app.extensions import db
 from app.models.webhook_config import WebhookConfig
-from app.services.webhook_service import send_webhook_notification
+from app.models.webhook_outbox import WebhookOutbox
+from app.services.webhook_service import sync_send_webhook_notification, invalidate_template_cache
 
 
 def register_webhook_routes(api_bp):
@@ -184,6 +185,7 @@ def register_webhook_routes(api_bp):
 
             if update_data:
                 webhook.update_config(**update_data)
+                invalidate_template_cache(webhook.id)
                 logger.info(f"更新Webhook配置成功: {webhook.name} ({webhook.id})")
 
             return jsonify({
@@ -209,6 +211,7 @@ def register_webhook_routes(api_bp):
 
             # 软删除
             webhook.delete_config()
+            invalidate_template_cache(webhook.id)
 
             logger.info(f"删除Webhook配置成功: {webhook.name} ({webhook.id})")
 
@@ -277,7 +280,7 @@ def register_webhook_routes(api_bp):
             }
 
             # 发送测试消息
-            result = send_webhook_notification(webhook.to_dict(), test_data)
+            result = sync_send_webhook_notification(webhook.to_dict(), test_data)
 
             if result.get('success'):
                 webhook.record_success()
@@ -320,7 +323,8 @@ def register_webhook_routes(api_bp):
                     'total_configs': total_configs,
                     'enabled_configs': enabled_configs,
                     'disabled_configs': total_configs - enabled_configs,
-                    'by_type': stats
+                    'by_type': stats,
+                    'outbox': WebhookOutbox.get_stats()
                 },
                 'message': '获取Webhook统计信息成功'
             })
@@ -4,8 +4,8 @@
 """
 
 from app.extensions import db
-from datetime import datetime
-from sqlalchemy import Index
+from datetime import datetime, timedelta
+from sqlalchemy import Index, case, func
 
 
 class RiskAlert(db.Model):
@@ -26,12 +26,15 @@ class RiskAlert(db.Model):
     is_resolved = db.Column(db.Boolean, default=False, comment='是否已解决')
     created_at = db.Column(db.DateTime, default=datetime.utcnow, comment='创建时间')
     resolved_at = db.Column(db.DateTime, comment='解决时间')
+    alert_key = db.Column(db.String(32), comment='批量写入时客户端生成的唯一键，用于取回自增ID')
     
     # 复合索引
     __table_args__ = (
         Index('idx_risk_alerts_ts_code_type', 'ts_code', 'alert_type'),
         Index('idx_risk_alerts_level_active', 'alert_level', 'is_active'),
-        Index('idx_risk_alerts_created_at', 'created_at'),
+        # 统计聚合的覆盖索引（按时间范围GROUP BY无需回表）
+        Index('idx_risk_alerts_created_stats', 'created_at', 'alert_type', 'alert_level', 'is_active', 'is_resolved'),
+        Index('uk_risk_alerts_alert_key', 'alert_key', unique=True),
     )
     
     def to_dict(self):
@@ -56,8 +59,11 @@ class RiskAlert(db.Model):
     @classmethod
     def create_alert(cls, ts_code, alert_type, alert_level, alert_message, 
                     risk_value=None, threshold_value=None, current_price=None,
-                    position_size=None, portfolio_weight=None):
-        """创建风险预警"""
+                    position_size=None, portfolio_weight=None, commit=True):
+        """创建风险预警
+
+        commit=False 时仅flush获取ID，由调用方在同一事务中提交
+        """
         alert = cls(
             ts_code=ts_code,
             alert_type=alert_type,
@@ -70,7 +76,10 @@ class RiskAlert(db.Model):
             portfolio_weight=portfolio_weight
         )
         db.session.add(alert)
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
         return alert
     
     def resolve_alert(self):
@@ -97,11 +106,69 @@ class RiskAlert(db.Model):
     @classmethod
     def get_alert_stats(cls):
         """获取预警统计"""
-        from sqlalchemy import func
-        
         stats = db.session.query(
             cls.alert_level,
             func.count(cls.id).label('count')
         ).filter_by(is_active=True, is_resolved=False).group_by(cls.alert_level).all()
         
-        return {level: count for level, count in stats} 
\ No newline at end of file
+        return {level: count for level, count in stats}
+    
+    @classmethod
+    def get_period_stats(cls, start_time):
+        """
+        统计某时间之后的预警（一次GROUP BY聚合）
+        
+        Returns:
+            总数、活跃数、已解决数及按类型、按级别的数量
+        """
+        rows = db.session.query(
+            cls.alert_type,
+            cls.alert_level,
+            func.count(cls.id).label('total'),
+            func.sum(case((cls.is_active == True, 1), else_=0)).label('active'),
+            func.sum(case((cls.is_resolved == True, 1), else_=0)).label('resolved')
+        ).filter(
+            cls.created_at >= start_time
+        ).group_by(cls.alert_type, cls.alert_level).all()
+        
+        stats = {
+            'total_alerts': 0,
+            'active_alerts': 0,
+            'resolved_alerts': 0,
+            'by_type': {},
+            'by_level': {}
+        }
+        for row in rows:
+            total = int(row.total or 0)
+            stats['total_alerts'] += total
+            stats['active_alerts'] += int(row.active or 0)
+            stats['resolved_alerts'] += int(row.resolved or 0)
+            stats['by_type'][row.alert_type] = stats['by_type'].get(row.alert_type, 0) + total
+            stats['by_level'][row.alert_level] = stats['by_level'].get(row.alert_level, 0) + total
+        
+        return stats
+    
+    @classmethod
+    def get_daily_counts(cls, days=7):
+        """最近N天每天的预警数量（一次按日期GROUP BY，无预警的日期补0）"""
+        today = datetime.utcnow().date()
+        start_date = today - timedelta(days=days - 1)
+        
+        stat_date = func.date(cls.created_at).label('stat_date')
+        rows = db.session.query(
+            stat_date,
+            func.count(cls.id).label('count')
+        ).filter(
+            cls.created_at >= datetime.combine(start_date, datetime.min.time())
+        ).group_by(stat_date).all()
+        
+        # 不同数据库驱动返回date或字符串
+        counts = {str(row.stat_date)[:10]: int(row.count) for row in rows}
+        
+        return [
+            {
+                'date': (start_date + timedelta(days=i)).isoformat(),
+                'count': counts.get((start_date + timedelta(days=i)).isoformat(), 0)
+            }
+            for i in range(days)
+        ]
@@ -0,0 +1,154 @@
+"""
+Webhook发件箱模型
+预警记录与待发送通知在同一事务中写入，由后台分发器批量发送
+"""
+
+import json
+from app.extensions import db
+from datetime import datetime, timedelta
+from sqlalchemy import Index, func, insert
+
+
+class WebhookOutbox(db.Model):
+    """Webhook发件箱模型"""
+    __tablename__ = 'webhook_outbox'
+
+    # 状态
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+
+    id = db.Column(db.Integer, primary_key=True)
+    webhook_id = db.Column(db.Integer, nullable=False, comment='Webhook配置ID')
+    alert_id = db.Column(db.Integer, comment='预警记录ID')
+    ts_code = db.Column(db.String(20), comment='股票代码')
+    payload = db.Column(db.Text, nullable=False, comment='预警数据JSON')
+    status = db.Column(db.String(20), default=STATUS_PENDING, nullable=False, comment='发送状态')
+    attempts = db.Column(db.Integer, default=0, comment='发送次数')
+    last_error = db.Column(db.Text, comment='最后一次错误信息')
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, comment='下次发送时间')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, comment='创建时间')
+    sent_at = db.Column(db.DateTime, comment='发送时间')
+
+    # 复合索引
+    __table_args__ = (
+        Index('idx_webhook_outbox_status_next', 'status', 'next_attempt_at'),
+        Index('idx_webhook_outbox_webhook_status', 'webhook_id', 'status'),
+    )
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'webhook_id': self.webhook_id,
+            'alert_id': self.alert_id,
+            'ts_code': self.ts_code,
+            'payload': self.get_payload(),
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
+
+    def get_payload(self):
+        """获取预警数据"""
+        try:
+            return json.loads(self.payload) if self.payload else {}
+        except (TypeError, ValueError):
+            return {}
+
+    @classmethod
+    def enqueue(cls, webhook_ids, alert_data, alert_id=None):
+        """写入待发送通知（不提交，由调用方与预警记录一起提交）"""
+        payload = json.dumps(alert_data, ensure_ascii=False, default=str)
+        now = datetime.utcnow()
+
+        entries = [
+            cls(
+                webhook_id=webhook_id,
+                alert_id=alert_id,
+                ts_code=alert_data.get('ts_code'),
+                payload=payload,
+                status=cls.STATUS_PENDING,
+                attempts=0,
+                next_attempt_at=now,
+                created_at=now
+            )
+            for webhook_id in webhook_ids
+        ]
+        db.session.add_all(entries)
+        return entries
+
+    @classmethod
+    def enqueue_batch(cls, webhook_ids, alerts_data):
+        """批量写入待发送通知（单条多行INSERT，不提交）"""
+        now = datetime.utcnow()
+
+        mappings = []
+        for alert_data in alerts_data:
+            payload = json.dumps(alert_data, ensure_ascii=False, default=str)
+            for webhook_id in webhook_ids:
+                mappings.append({
+                    'webhook_id': webhook_id,
+                    'alert_id': alert_data.get('id'),
+                    'ts_code': alert_data.get('ts_code'),
+                    'payload': payload,
+                    'status': cls.STATUS_PENDING,
+                    'attempts': 0,
+                    'next_attempt_at': now,
+                    'created_at': now
+                })
+
+        if mappings:
+            db.session.execute(insert(cls), mappings)
+        return len(mappings)
+
+    @classmethod
+    def get_due_entries(cls, limit=1000):
+        """获取到期的待发送通知"""
+        return cls.query.filter(
+            cls.status == cls.STATUS_PENDING,
+            cls.next_attempt_at <= datetime.utcnow()
+        ).order_by(cls.id.asc()).limit(limit).all()
+
+    @classmethod
+    def mark_sent(cls, entries):
+        """标记为已发送（不提交）"""
+        now = datetime.utcnow()
+        for entry in entries:
+            entry.status = cls.STATUS_SENT
+            entry.attempts = (entry.attempts or 0) + 1
+            entry.sent_at = now
+            entry.last_error = None
+
+    @classmethod
+    def mark_failed(cls, entries, error, retry_delay, max_attempts):
+        """记录发送失败，未超过最大次数时延后重试（不提交）"""
+        now = datetime.utcnow()
+        for entry in entries:
+            entry.attempts = (entry.attempts or 0) + 1
+            entry.last_error = str(error)[:2000]
+            if entry.attempts >= max_attempts:
+                entry.status = cls.STATUS_FAILED
+            else:
+                entry.next_attempt_at = now + timedelta(seconds=retry_delay * (2 ** (entry.attempts - 1)))
+
+    @classmethod
+    def mark_cancelled(cls, entries, reason):
+        """取消发送（Webhook已删除或禁用，不提交）"""
+        for entry in entries:
+            entry.status = cls.STATUS_CANCELLED
+            entry.last_error = reason
+
+    @classmethod
+    def get_stats(cls):
+        """获取发件箱统计"""
+        stats = db.session.query(
+            cls.status,
+            func.count(cls.id).label('count')
+        ).group_by(cls.status).all()
+
+        return {status: count for status, count in stats}
@@ -0,0 +1,151 @@
+"""
+预警去重索引
+按 (ts_code, alert_type) 记录最近一次预警的过期时间，检查前一次性批量预热，
+使重复预警判断为O(1)内存查找（可选Redis后端供多进程共享）
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func
+
+from app.extensions import db
+from app.models.risk_alert import RiskAlert
+
+logger = logging.getLogger(__name__)
+
+
+class AlertDedupIndex:
+    """预警去重索引"""
+
+    def __init__(self, window_seconds: int = 3600, backend: str = 'memory',
+                 key_prefix: str = 'alert_dedup'):
+        """
+        Args:
+            window_seconds: 去重窗口（秒），窗口内同一股票同一类型只预警一次
+            backend: 'memory' 进程内字典；'redis' 使用Redis键过期（多进程共享）
+            key_prefix: Redis键前缀
+        """
+        self.window_seconds = window_seconds
+        self.backend = backend
+        self.key_prefix = key_prefix
+
+        # (ts_code, alert_type) -> 过期时间戳
+        self._expiry: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._redis = None
+
+        if backend == 'redis':
+            from app.extensions import redis_client
+            self._redis = redis_client
+
+    def _redis_key(self, ts_code: str, alert_type: str) -> str:
+        return f"{self.key_prefix}:{ts_code}:{alert_type}"
+
+    def warm(self, ts_codes: Optional[Iterable[str]] = None) -> int:
+        """
+        从数据库批量加载去重窗口内的活跃预警（一次GROUP BY查询）
+
+        Args:
+            ts_codes: 只预热指定股票，为空则预热全部
+
+        Returns:
+            加载的键数量
+        """
+        window_start = datetime.utcnow() - timedelta(seconds=self.window_seconds)
+
+        query = db.session.query(
+            RiskAlert.ts_code,
+            RiskAlert.alert_type,
+            func.max(RiskAlert.created_at).label('last_created_at')
+        ).filter(
+            RiskAlert.is_active == True,
+            RiskAlert.created_at >= window_start
+        )
+
+        ts_code_set = set(ts_codes) if ts_codes else None
+        if ts_code_set:
+            query = query.filter(RiskAlert.ts_code.in_(ts_code_set))
+
+        rows = query.group_by(RiskAlert.ts_code, RiskAlert.alert_type).all()
+
+        entries = {
+            (row.ts_code, row.alert_type): self._to_expiry(row.last_created_at)
+            for row in rows
+        }
+
+        if self._redis is not None:
+            try:
+                now = time.time()
+                pipe = self._redis.pipeline()
+                for (ts_code, alert_type), expire_at in entries.items():
+                    ttl = int(expire_at - now)
+                    if ttl > 0:
+                        pipe.set(self._redis_key(ts_code, alert_type), 1, ex=ttl)
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"预热Redis预警去重索引失败: {e}")
+
+        with self._lock:
+            if ts_code_set is None:
+                self._expiry = entries
+            else:
+                self._expiry = {
+                    key: expire_at for key, expire_at in self._expiry.items()
+                    if key[0] not in ts_code_set
+                }
+                self._expiry.update(entries)
+
+        logger.debug(f"预警去重索引预热完成: {len(entries)} 个键")
+        return len(entries)
+
+    def should_alert(self, ts_code: str, alert_type: str) -> bool:
+        """去重窗口内没有同类预警时返回True"""
+        expire_at = self._expiry.get((ts_code, alert_type))
+        if expire_at is not None and expire_at > time.time():
+            return False
+
+        if self._redis is not None:
+            try:
+                return not self._redis.exists(self._redis_key(ts_code, alert_type))
+            except Exception as e:
+                logger.error(f"查询Redis预警去重索引失败: {e}")
+
+        return True
+
+    def mark(self, ts_code: str, alert_type: str, created_at: Optional[datetime] = None):
+        """记录新创建的预警"""
+        expire_at = self._to_expiry(created_at or datetime.utcnow())
+
+        with self._lock:
+            self._expiry[(ts_code, alert_type)] = expire_at
+
+        if self._redis is not None:
+            try:
+                ttl = int(expire_at - time.time())
+                if ttl > 0:
+                    self._redis.set(self._redis_key(ts_code, alert_type), 1, ex=ttl)
+            except Exception as e:
+                logger.error(f"写入Redis预警去重索引失败: {e}")
+
+    def discard(self, ts_code: str, alert_type: str):
+        """预警被解决后移除去重记录"""
+        with self._lock:
+            self._expiry.pop((ts_code, alert_type), None)
+
+        if self._redis is not None:
+            try:
+                self._redis.delete(self._redis_key(ts_code, alert_type))
+            except Exception as e:
+                logger.error(f"删除Redis预警去重索引失败: {e}")
+
+    def _to_expiry(self, created_at: datetime) -> float:
+        """created_at为UTC时间，换算为过期的Unix时间戳"""
+        return (created_at - datetime(1970, 1, 1)).total_seconds() + self.window_seconds
+
+    def size(self) -> int:
+        """当前内存中的键数量"""
+        return len(self._expiry)
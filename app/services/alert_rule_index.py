@@ -0,0 +1,210 @@
+"""
+预警规则索引
+启用规则按 股票代码 -> 规则类型 -> 比较运算符 编译为有序阈值数组，
+新数值通过二分查找得到候选规则，无需逐条扫描；
+候选规则最终仍由 AlertRule.check_condition 判定，索引只负责缩小范围
+"""
+
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, inspect
+
+from app.extensions import db
+from app.models.alert_rule import AlertRule
+
+logger = logging.getLogger(__name__)
+
+
+class ThresholdBook:
+    """单只股票单个规则类型下的阈值簿"""
+
+    # 按阈值二分匹配的运算符；其他运算符（eq/ne 等可能带容差的比较）每次都作为候选
+    RANGE_OPERATORS = ('gt', 'gte', 'lt', 'lte')
+
+    def __init__(self):
+        # 运算符 -> 按(阈值, 规则ID)升序排列的列表
+        self._sorted: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+        # 规则ID -> (运算符, 阈值)
+        self._positions: Dict[int, Tuple[str, float]] = {}
+        # 不走二分的规则ID
+        self._scan: List[int] = []
+
+    def __len__(self):
+        return len(self._positions)
+
+    def add(self, operator: str, threshold: float, rule_id: int):
+        if operator in self.RANGE_OPERATORS:
+            insort(self._sorted[operator], (threshold, rule_id))
+        else:
+            self._scan.append(rule_id)
+        self._positions[rule_id] = (operator, threshold)
+
+    def remove(self, rule_id: int) -> bool:
+        position = self._positions.pop(rule_id, None)
+        if position is None:
+            return False
+
+        operator, threshold = position
+        if operator not in self.RANGE_OPERATORS:
+            self._scan.remove(rule_id)
+            return True
+
+        entries = self._sorted[operator]
+        i = bisect_left(entries, (threshold, rule_id))
+        if i < len(entries) and entries[i] == (threshold, rule_id):
+            del entries[i]
+        if not entries:
+            del self._sorted[operator]
+        return True
+
+    def match(self, value: float) -> List[int]:
+        """返回候选规则ID（区间运算符按阈值二分，其余全部返回）"""
+        matched = list(self._scan)
+
+        for operator, entries in self._sorted.items():
+            if operator == 'gt':
+                # 阈值 < value
+                matched.extend(rule_id for _, rule_id in entries[:bisect_left(entries, (value, -1))])
+            elif operator == 'gte':
+                # 阈值 <= value
+                matched.extend(rule_id for _, rule_id in entries[:bisect_right(entries, (value, float('inf')))])
+            elif operator == 'lt':
+                # 阈值 > value
+                matched.extend(rule_id for _, rule_id in entries[bisect_right(entries, (value, float('inf'))):])
+            elif operator == 'lte':
+                # 阈值 >= value
+                matched.extend(rule_id for _, rule_id in entries[bisect_left(entries, (value, -1)):])
+
+        return matched
+
+
+class AlertRuleIndex:
+    """启用预警规则的内存索引"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._books: Dict[str, Dict[str, ThresholdBook]] = {}
+        self._rules: Dict[int, AlertRule] = {}
+        self._version = None
+        self.is_built = False
+
+    # ---------- 构建与刷新 ----------
+
+    def build(self):
+        """一次查询加载全部启用规则并编译索引"""
+        rules = AlertRule.query.filter_by(is_enabled=True, is_active=True).all()
+
+        with self._lock:
+            self._books = {}
+            self._rules = {}
+            for rule in rules:
+                self._add(self._snapshot(rule))
+            self._version = self._query_version()
+            self.is_built = True
+
+        logger.info(f"预警规则索引构建完成: {len(self._rules)} 条规则, {len(self._books)} 只股票")
+
+    def ensure_fresh(self):
+        """索引未构建或规则表在其他进程中被修改时重建"""
+        if not self.is_built or self._query_version() != self._version:
+            self.build()
+
+    def _query_version(self) -> Tuple[Any, Any]:
+        """规则表版本：(总数, 最大更新时间)"""
+        row = db.session.query(func.count(AlertRule.id), func.max(AlertRule.updated_at)).one()
+        return tuple(row)
+
+    def _snapshot(self, rule: AlertRule) -> AlertRule:
+        """复制为不绑定会话的规则对象，避免提交后属性过期"""
+        snapshot = AlertRule()
+        for attr in inspect(AlertRule).column_attrs:
+            setattr(snapshot, attr.key, getattr(rule, attr.key))
+        return snapshot
+
+    # ---------- 增量维护（由规则增删改接口调用） ----------
+
+    def upsert(self, rule: AlertRule):
+        """规则创建、更新或启停后同步索引"""
+        with self._lock:
+            self._remove(rule.id)
+            if rule.is_enabled and rule.is_active:
+                self._add(self._snapshot(rule))
+            self._version = self._query_version()
+
+    def remove(self, rule_id: int):
+        """规则删除后从索引移除"""
+        with self._lock:
+            self._remove(rule_id)
+            self._version = self._query_version()
+
+    def _add(self, rule: AlertRule):
+        if rule.threshold_value is None:
+            return
+        if rule.comparison_operator not in ThresholdBook.RANGE_OPERATORS + ('eq', 'ne'):
+            logger.warning(f"规则 {rule.id} 的运算符 {rule.comparison_operator} 未被索引识别，"
+                           f"每次取值后逐条调用 check_condition 判定")
+        book = self._books.setdefault(rule.ts_code, {}).setdefault(rule.rule_type, ThresholdBook())
+        book.add(rule.comparison_operator, float(rule.threshold_value), rule.id)
+        self._rules[rule.id] = rule
+
+    def _remove(self, rule_id: int):
+        rule = self._rules.pop(rule_id, None)
+        if rule is None:
+            return
+
+        books = self._books.get(rule.ts_code, {})
+        book = books.get(rule.rule_type)
+        if book is not None:
+            book.remove(rule_id)
+            if not len(book):
+                del books[rule.rule_type]
+        if not books:
+            self._books.pop(rule.ts_code, None)
+
+    # ---------- 查询 ----------
+
+    def match(self, ts_code: str, rule_type: str, value: float) -> List[AlertRule]:
+        """返回该股票该类型下条件成立的规则（索引给出候选，AlertRule.check_condition 最终判定）"""
+        book = self._books.get(ts_code, {}).get(rule_type)
+        if book is None or value is None:
+            return []
+        value = float(value)
+        with self._lock:
+            candidates = [self._rules[rule_id] for rule_id in book.match(value)]
+        return [rule for rule in candidates if rule.check_condition(value)]
+
+    def get_rule(self, rule_id: int) -> Optional[AlertRule]:
+        """按ID获取索引中的规则"""
+        return self._rules.get(rule_id)
+
+    def get_rule_types(self, ts_code: str) -> List[str]:
+        """该股票存在启用规则的规则类型"""
+        return list(self._books.get(ts_code, {}).keys())
+
+    def count_rules(self, ts_code: str, rule_types: Optional[Iterable[str]] = None) -> int:
+        """该股票的启用规则数量"""
+        books = self._books.get(ts_code, {})
+        if rule_types is None:
+            return sum(len(book) for book in books.values())
+        return sum(len(books[rule_type]) for rule_type in rule_types if rule_type in books)
+
+    def get_ts_codes(self, ts_codes: Optional[Iterable[str]] = None,
+                     rule_types: Optional[Iterable[str]] = None) -> List[str]:
+        """有启用规则的股票代码（可按代码和规则类型过滤）"""
+        codes = list(self._books.keys()) if not ts_codes else [code for code in ts_codes if code in self._books]
+        if rule_types:
+            rule_types = set(rule_types)
+            codes = [code for code in codes if rule_types.intersection(self._books[code])]
+        return codes
+
+    def get_stats(self) -> Dict[str, Any]:
+        """索引统计"""
+        return {
+            'is_built': self.is_built,
+            'rule_count': len(self._rules),
+            'stock_count': len(self._books)
+        }
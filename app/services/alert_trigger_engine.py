@@ -4,10 +4,17 @@
 """
 
 import logging
+import multiprocessing
+import os
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
-from sqlalchemy import and_, or_, desc
-import asyncio
+from sqlalchemy import and_, func, insert, update
 
 from app.extensions import db
 from app.models.alert_rule import AlertRule
@@ -17,34 +24,145 @@ from app.models.stock_daily_history import StockDailyHistory
 from app.models.stock_daily_basic import StockDailyBasic
 from app.models.stock_moneyflow import StockMoneyflow
 from app.models.webhook_config import WebhookConfig
-from app.services.webhook_service import send_webhook_notification
+from app.models.webhook_outbox import WebhookOutbox
+from app.services.alert_dedup_index import AlertDedupIndex
+from app.services.alert_rule_index import AlertRuleIndex
+from app.utils.pagination import clear_count_cache
+from config import Config
 
 logger = logging.getLogger(__name__)
 
 
+class AlertSweepBatch:
+    """预警检查批次
+
+    累积一轮检查中的新预警、Webhook发件箱通知和规则触发计数，
+    检查结束时一次批量INSERT、一次批量UPDATE并单次提交。
+    """
+
+    # 按 alert_key 取回自增ID时每次查询的键数
+    ID_LOOKUP_CHUNK_SIZE = 1000
+
+    def __init__(self):
+        self.alerts = []
+        self.alerts_data = []
+        self.trigger_counts = defaultdict(int)
+
+    def add(self, rule: AlertRule, alert_mapping: Dict[str, Any], alert_data: Dict[str, Any]):
+        """记录一条新预警"""
+        self.alerts.append(alert_mapping)
+        self.alerts_data.append(alert_data)
+        self.trigger_counts[rule.id] += 1
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def flush(self) -> int:
+        """写入数据库并提交，返回写入的预警数量"""
+        if not self.alerts:
+            return 0
+
+        try:
+            # 新预警：单条多行INSERT（MySQL不支持RETURNING），
+            # 再按客户端生成的唯一键在同一事务内取回自增ID，发件箱记录据此关联预警
+            keys = [uuid.uuid4().hex for _ in self.alerts]
+            for mapping, key in zip(self.alerts, keys):
+                mapping['alert_key'] = key
+            db.session.execute(insert(RiskAlert), self.alerts)
+
+            ids = {}
+            for start in range(0, len(keys), self.ID_LOOKUP_CHUNK_SIZE):
+                chunk = keys[start:start + self.ID_LOOKUP_CHUNK_SIZE]
+                ids.update(db.session.query(RiskAlert.alert_key, RiskAlert.id)
+                           .filter(RiskAlert.alert_key.in_(chunk)).all())
+            for alert_data, key in zip(self.alerts_data, keys):
+                alert_data['id'] = ids.get(key)
+
+            # Webhook发件箱：与预警记录同一事务
+            webhooks = WebhookConfig.get_enabled_configs()
+            if webhooks:
+                WebhookOutbox.enqueue_batch([webhook.id for webhook in webhooks], self.alerts_data)
+
+            # 规则触发计数：按增量分组，通常只有一条UPDATE
+            now = datetime.utcnow()
+            rule_ids_by_increment = defaultdict(list)
+            for rule_id, count in self.trigger_counts.items():
+                rule_ids_by_increment[count].append(rule_id)
+
+            for count, rule_ids in rule_ids_by_increment.items():
+                db.session.execute(
+                    update(AlertRule)
+                    .where(AlertRule.id.in_(rule_ids))
+                    .values(
+                        trigger_count=func.coalesce(AlertRule.trigger_count, 0) + count,
+                        last_triggered_at=now
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+
+            db.session.commit()
+
+        except Exception:
+            db.session.rollback()
+            raise
+
+        written = len(self.alerts)
+        self.alerts = []
+        self.alerts_data = []
+        self.trigger_counts = defaultdict(int)
+        return written
+
+
 class AlertTriggerEngine:
     """预警规则触发引擎"""
     
+    # 批量加载股票数据的分块大小（控制IN列表长度）
+    LOAD_CHUNK_SIZE = 500
+    
+    # 取值来自全市场日线异动扫描的规则类型 -> 扫描结果指标
+    DAILY_ANOMALY_METRICS = {'price_zscore': 'zscore', 'volume_spike': 'volume_spike'}
+    
     def __init__(self):
         """初始化触发引擎"""
-        self.rule_processors = {
-            'price_threshold': self._process_price_threshold,
-            'price_change_pct': self._process_price_change_pct,
-            'volume_ratio': self._process_volume_ratio,
-            'turnover_rate': self._process_turnover_rate,
-            'market_value': self._process_market_value,
-            'technical_indicator': self._process_technical_indicator,
-            'money_flow': self._process_money_flow
+        # 规则类型 -> 从股票最新数据中取比较值（每只股票每种类型只计算一次）
+        self.value_extractors = {
+            'price_threshold': self._get_price_threshold_value,
+            'price_change_pct': self._get_price_change_pct_value,
+            'volume_ratio': self._get_volume_ratio_value,
+            'turnover_rate': self._get_turnover_rate_value,
+            'market_value': self._get_market_value_value,
+            'technical_indicator': self._get_technical_indicator_value,
+            'money_flow': self._get_money_flow_value,
+            'price_zscore': self._get_price_zscore_value,
+            'volume_spike': self._get_volume_spike_value
         }
+        
+        # 启用规则的内存索引（阈值有序数组，二分匹配）
+        self.rule_index = AlertRuleIndex()
+        self._anomaly_scan_checked = False
+        # 分片工作进程使用主进程下发的异动指标（None时读取本进程的扫描结果）
+        self._anomaly_values = None
+        
+        # 分片并行检查的常驻进程池（按需创建）
+        self._pool = None
+        self._pool_workers = 0
+        
+        # 重复预警去重索引（每次检查前批量预热）
+        self.dedup_index = AlertDedupIndex(
+            window_seconds=Config.ALERT_DEDUP_WINDOW,
+            backend=Config.ALERT_DEDUP_BACKEND
+        )
     
     def run_alert_check(self, ts_codes: List[str] = None, 
-                       rule_types: List[str] = None) -> Dict[str, Any]:
+                       rule_types: List[str] = None,
+                       workers: Optional[int] = None) -> Dict[str, Any]:
         """
         运行预警检查
         
         Args:
             ts_codes: 指定股票代码列表，为空则检查所有启用规则的股票
             rule_types: 指定规则类型列表，为空则检查所有类型
+            workers: 分片并行的工作进程数，默认取配置ALERT_SWEEP_WORKERS，1为单进程，不超过 max_workers()
         
         Returns:
             检查结果统计
@@ -52,10 +170,17 @@ class AlertTriggerEngine:
         try:
             logger.info("开始运行预警检查...")
             
-            # 获取启用的预警规则
-            enabled_rules = self._get_enabled_rules(ts_codes, rule_types)
+            # 规则索引（其他进程修改过规则时自动重建）
+            self.rule_index.ensure_fresh()
+            
+            # 异动类规则在本轮首次取值时检查日线异动扫描是否过期
+            self._anomaly_scan_checked = False
             
-            if not enabled_rules:
+            # 有启用规则的股票
+            target_codes = self.rule_index.get_ts_codes(ts_codes, rule_types)
+            total_rules = sum(self.rule_index.count_rules(ts_code, rule_types) for ts_code in target_codes)
+            
+            if not total_rules:
                 logger.info("没有找到启用的预警规则")
                 return {
                     'success': True,
@@ -68,33 +193,59 @@ class AlertTriggerEngine:
                     }
                 }
             
-            logger.info(f"找到 {len(enabled_rules)} 个启用的预警规则")
+            logger.info(f"找到 {total_rules} 个启用的预警规则，涉及 {len(target_codes)} 只股票")
             
-            # 按股票代码分组规则
-            rules_by_stock = self._group_rules_by_stock(enabled_rules)
+            # 一次查询预热去重索引，后续重复预警判断不再访问数据库
+            self.dedup_index.warm(target_codes if ts_codes else None)
             
             # 统计信息
             stats = {
-                'total_rules': len(enabled_rules),
+                'total_rules': total_rules,
                 'checked_rules': 0,
                 'triggered_alerts': 0,
                 'new_alerts': 0,
-                'failed_checks': 0
+                'failed_checks': 0,
+                'shards': 1
             }
             
-            # 逐个股票检查规则
-            for ts_code, rules in rules_by_stock.items():
-                try:
-                    stock_stats = self._check_stock_rules(ts_code, rules)
-                    
-                    stats['checked_rules'] += stock_stats['checked_rules']
-                    stats['triggered_alerts'] += stock_stats['triggered_alerts']
-                    stats['new_alerts'] += stock_stats['new_alerts']
-                    
-                except Exception as e:
-                    logger.error(f"检查股票 {ts_code} 规则失败: {str(e)}")
-                    stats['failed_checks'] += len(rules)
+            # 评估规则：股票较多且配置了多个工作进程时按股票代码哈希分片并行
+            workers = min(Config.ALERT_SWEEP_WORKERS if workers is None else workers, self.max_workers())
+            if workers > 1 and len(target_codes) >= Config.ALERT_SWEEP_PARALLEL_MIN_STOCKS:
+                matches = self._evaluate_sharded(target_codes, rule_types, workers, stats)
+            else:
+                matches = self._evaluate_stocks(target_codes, rule_types, stats)
+            
+            stats['triggered_alerts'] = len(matches)
+            
+            # 合并结果：去重后统一创建预警，本轮新预警在检查结束时写入
+            batch = AlertSweepBatch()
+            for match in matches:
+                rule = self.rule_index.get_rule(match['rule_id'])
+                if rule is None:
+                    continue
+                
+                # 检查是否需要创建新预警（避免重复预警）
+                if not self._should_create_alert(rule, match['current_value']):
                     continue
+                
+                result = {'triggered': True, 'current_value': match['current_value']}
+                stock_data = {'ts_code': match['ts_code'], 'name': match['stock_name']}
+                alert_data = self._create_alert_record(
+                    rule, result, stock_data, batch, current_price=match['current_price']
+                )
+                if alert_data:
+                    stats['new_alerts'] += 1
+                    logger.info(f"触发预警: {rule.rule_name} - {alert_data['alert_message']}")
+            
+            # 批量写入新预警、发件箱通知和规则触发计数
+            try:
+                batch.flush()
+            except Exception:
+                # 写入失败时按数据库实际状态重建去重索引
+                self.dedup_index.warm(target_codes if ts_codes else None)
+                raise
+            if stats['new_alerts']:
+                clear_count_cache('risk_alerts')
             
             logger.info(f"预警检查完成: {stats}")
             
@@ -112,250 +263,302 @@ class AlertTriggerEngine:
                 'stats': {}
             }
     
-    def _get_enabled_rules(self, ts_codes: List[str] = None, 
-                          rule_types: List[str] = None) -> List[AlertRule]:
-        """获取启用的预警规则"""
-        query = AlertRule.query.filter_by(is_enabled=True, is_active=True)
-        
-        if ts_codes:
-            query = query.filter(AlertRule.ts_code.in_(ts_codes))
+    def _evaluate_stocks(self, ts_codes: List[str], rule_types: Optional[List[str]],
+                         stats: Dict[str, int]) -> List[Dict[str, Any]]:
+        """按块批量加载股票数据并评估规则，返回命中的规则（不做去重、不写库）"""
+        matches = []
         
-        if rule_types:
-            query = query.filter(AlertRule.rule_type.in_(rule_types))
+        for i in range(0, len(ts_codes), self.LOAD_CHUNK_SIZE):
+            chunk = ts_codes[i:i + self.LOAD_CHUNK_SIZE]
+            stock_data_map = self._load_stock_data(chunk)
+            
+            for ts_code in chunk:
+                try:
+                    matches.extend(self._check_stock_rules(ts_code, rule_types, stock_data_map.get(ts_code), stats))
+                except Exception as e:
+                    logger.error(f"检查股票 {ts_code} 规则失败: {str(e)}")
+                    stats['failed_checks'] += self.rule_index.count_rules(ts_code, rule_types)
+                    continue
         
-        return query.order_by(AlertRule.created_at.desc()).all()
+        return matches
     
-    def _group_rules_by_stock(self, rules: List[AlertRule]) -> Dict[str, List[AlertRule]]:
-        """按股票代码分组规则"""
-        rules_by_stock = {}
+    def _evaluate_sharded(self, ts_codes: List[str], rule_types: Optional[List[str]],
+                          workers: int, stats: Dict[str, int]) -> List[Dict[str, Any]]:
+        """按股票代码哈希分片，由进程池并行加载数据并评估规则"""
+        shards = [shard for shard in partition_ts_codes(ts_codes, workers) if shard]
+        stats['shards'] = len(shards)
+        
+        pool = self._get_pool()
+        futures = [
+            (pool.submit(_evaluate_shard, shard, rule_types, self._shard_anomaly_values(shard, rule_types)), shard)
+            for shard in shards
+        ]
         
-        for rule in rules:
-            ts_code = rule.ts_code
-            if ts_code not in rules_by_stock:
-                rules_by_stock[ts_code] = []
-            rules_by_stock[ts_code].append(rule)
+        matches = []
+        deadline = time.monotonic() + Config.ALERT_SWEEP_SHARD_TIMEOUT
+        for future, shard in futures:
+            try:
+                shard_result = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except Exception as e:
+                logger.error(f"预警检查分片失败（{len(shard)} 只股票）: {str(e)}")
+                if isinstance(e, BrokenProcessPool):
+                    # 工作进程异常退出，下一轮重新创建进程池
+                    self.shutdown_pool()
+                stats['failed_checks'] += sum(self.rule_index.count_rules(ts_code, rule_types) for ts_code in shard)
+                continue
+            
+            matches.extend(shard_result['matches'])
+            stats['checked_rules'] += shard_result['stats']['checked_rules']
+            stats['failed_checks'] += shard_result['stats']['failed_checks']
         
-        return rules_by_stock
+        return matches
     
-    def _check_stock_rules(self, ts_code: str, rules: List[AlertRule]) -> Dict[str, int]:
-        """检查单个股票的所有规则"""
-        logger.debug(f"检查股票 {ts_code} 的 {len(rules)} 个规则")
+    def _shard_anomaly_values(self, ts_codes: List[str],
+                              rule_types: Optional[List[str]]) -> Optional[Dict[str, Dict[str, Optional[float]]]]:
+        """
+        分片内异动类规则所需的指标值（主进程每轮最多扫描一次全市场，工作进程不再各自扫描）
         
-        stats = {
-            'checked_rules': 0,
-            'triggered_alerts': 0,
-            'new_alerts': 0
+        Returns:
+            ts_code -> {指标: 值}；分片内没有异动类规则时为None
+        """
+        metrics_by_code = {}
+        for ts_code in ts_codes:
+            types = self.rule_index.get_rule_types(ts_code)
+            if rule_types:
+                types = [rule_type for rule_type in types if rule_type in rule_types]
+            metrics = [self.DAILY_ANOMALY_METRICS[rule_type] for rule_type in types
+                       if rule_type in self.DAILY_ANOMALY_METRICS]
+            if metrics:
+                metrics_by_code[ts_code] = metrics
+        
+        if not metrics_by_code:
+            return None
+        return {
+            ts_code: {metric: self._get_daily_anomaly_value(ts_code, metric) for metric in metrics}
+            for ts_code, metrics in metrics_by_code.items()
         }
+    
+    def evaluate_shard(self, ts_codes: List[str], rule_types: Optional[List[str]] = None,
+                       anomaly_values: Optional[Dict[str, Dict[str, Optional[float]]]] = None) -> Dict[str, Any]:
+        """
+        工作进程内评估一个分片（需在应用上下文中调用），只读不写
+        
+        Args:
+            anomaly_values: 主进程下发的异动指标值（见 _shard_anomaly_values）
+        """
+        self.rule_index.ensure_fresh()
+        self._anomaly_values = anomaly_values or {}
         
-        # 获取股票最新数据
-        stock_data = self._get_latest_stock_data(ts_code)
+        stats = {'checked_rules': 0, 'failed_checks': 0}
+        try:
+            matches = self._evaluate_stocks(ts_codes, rule_types, stats)
+        finally:
+            self._anomaly_values = None
+        
+        # 工作进程不持有长连接事务
+        db.session.remove()
+        
+        return {'matches': matches, 'stats': stats}
+    
+    @staticmethod
+    def max_workers() -> int:
+        """分片并行的工作进程数上限：配置值与CPU核数取小"""
+        return max(1, min(Config.ALERT_SWEEP_WORKERS, os.cpu_count() or 1))
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """获取常驻进程池（按上限创建，本轮分片数由workers决定，不随请求参数重建）"""
+        workers = self.max_workers()
+        if self._pool is None or self._pool_workers != workers:
+            self.shutdown_pool()
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_sweep_worker,
+                initargs=(os.getenv('FLASK_ENV', 'default'),)
+            )
+            self._pool_workers = workers
+        return self._pool
+    
+    def shutdown_pool(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._pool_workers = 0
+    
+    def _check_stock_rules(self, ts_code: str, rule_types: Optional[List[str]],
+                           stock_data: Optional[Dict[str, Any]],
+                           stats: Dict[str, int]) -> List[Dict[str, Any]]:
+        """检查单个股票的规则：每种规则类型取一次值，通过规则索引直接得到命中规则"""
+        stock_types = self.rule_index.get_rule_types(ts_code)
+        if rule_types:
+            stock_types = [rule_type for rule_type in stock_types if rule_type in rule_types]
+        
+        logger.debug(f"检查股票 {ts_code} 的 {len(stock_types)} 类规则")
         
         if not stock_data:
             logger.warning(f"股票 {ts_code} 没有最新数据，跳过检查")
-            return stats
+            return []
         
-        # 逐个检查规则
-        for rule in rules:
+        daily_data = stock_data.get('daily_data')
+        current_price = float(daily_data.close) if daily_data and daily_data.close is not None else None
+        
+        matches = []
+        for rule_type in stock_types:
             try:
-                stats['checked_rules'] += 1
+                stats['checked_rules'] += self.rule_index.count_rules(ts_code, [rule_type])
                 
-                # 根据规则类型处理
-                processor = self.rule_processors.get(rule.rule_type)
-                if not processor:
-                    logger.warning(f"不支持的规则类型: {rule.rule_type}")
+                extractor = self.value_extractors.get(rule_type)
+                if not extractor:
+                    logger.warning(f"不支持的规则类型: {rule_type}")
                     continue
                 
-                # 处理规则
-                result = processor(rule, stock_data)
+                current_value = extractor(stock_data)
+                if current_value is None:
+                    continue
+                current_value = float(current_value)
                 
-                if result['triggered']:
-                    stats['triggered_alerts'] += 1
-                    
-                    # 检查是否需要创建新预警（避免重复预警）
-                    if self._should_create_alert(rule, result['current_value']):
-                        alert = self._create_alert_record(rule, result, stock_data)
-                        if alert:
-                            stats['new_alerts'] += 1
-                            logger.info(f"触发预警: {rule.rule_name} - {alert.alert_message}")
+                # 二分查找命中的规则（只返回可跨进程传递的基本数据）
+                for rule in self.rule_index.match(ts_code, rule_type, current_value):
+                    matches.append({
+                        'rule_id': rule.id,
+                        'ts_code': ts_code,
+                        'current_value': current_value,
+                        'stock_name': stock_data.get('name'),
+                        'current_price': current_price
+                    })
                 
             except Exception as e:
-                logger.error(f"处理规则 {rule.id} 失败: {str(e)}")
+                logger.error(f"处理股票 {ts_code} 的 {rule_type} 规则失败: {str(e)}")
                 continue
         
-        return stats
+        return matches
+    
+    def _load_stock_data(self, ts_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量获取一组股票的最新数据（每张表一次查询）"""
+        if not ts_codes:
+            return {}
+        
+        stocks = StockBasic.query.filter(StockBasic.ts_code.in_(ts_codes)).all()
+        daily = self._query_latest_rows(StockDailyHistory, ts_codes)
+        basic = self._query_latest_rows(StockDailyBasic, ts_codes)
+        moneyflow = self._query_latest_rows(StockMoneyflow, ts_codes)
+        
+        return {
+            stock.ts_code: {
+                'ts_code': stock.ts_code,
+                'name': stock.name,
+                'industry': stock.industry,
+                'daily_data': daily.get(stock.ts_code),
+                'basic_data': basic.get(stock.ts_code),
+                'moneyflow_data': moneyflow.get(stock.ts_code)
+            }
+            for stock in stocks
+        }
+    
+    def _query_latest_rows(self, model, ts_codes: List[str]) -> Dict[str, Any]:
+        """每只股票最新交易日的一行数据"""
+        latest = db.session.query(
+            model.ts_code.label('ts_code'),
+            func.max(model.trade_date).label('trade_date')
+        ).filter(
+            model.ts_code.in_(ts_codes)
+        ).group_by(model.ts_code).subquery()
+        
+        rows = model.query.join(
+            latest,
+            and_(model.ts_code == latest.c.ts_code, model.trade_date == latest.c.trade_date)
+        ).all()
+        
+        return {row.ts_code: row for row in rows}
     
     def _get_latest_stock_data(self, ts_code: str) -> Optional[Dict[str, Any]]:
         """获取股票最新数据"""
         try:
-            # 获取股票基本信息
-            stock_basic = StockBasic.query.filter_by(ts_code=ts_code).first()
-            if not stock_basic:
-                return None
-            
-            # 获取最新日线数据
-            latest_daily = StockDailyHistory.query.filter_by(
-                ts_code=ts_code
-            ).order_by(desc(StockDailyHistory.trade_date)).first()
-            
-            # 获取最新每日指标
-            latest_basic = StockDailyBasic.query.filter_by(
-                ts_code=ts_code
-            ).order_by(desc(StockDailyBasic.trade_date)).first()
-            
-            # 获取最新资金流向
-            latest_moneyflow = StockMoneyflow.query.filter_by(
-                ts_code=ts_code
-            ).order_by(desc(StockMoneyflow.trade_date)).first()
-            
-            # 组装数据
-            stock_data = {
-                'ts_code': ts_code,
-                'name': stock_basic.name,
-                'industry': stock_basic.industry,
-                'daily_data': latest_daily,
-                'basic_data': latest_basic,
-                'moneyflow_data': latest_moneyflow
-            }
-            
-            return stock_data
-            
+            return self._load_stock_data([ts_code]).get(ts_code)
         except Exception as e:
             logger.error(f"获取股票 {ts_code} 数据失败: {str(e)}")
             return None
     
-    def _process_price_threshold(self, rule: AlertRule, stock_data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理价格阈值规则"""
+    def _get_price_threshold_value(self, stock_data: Dict[str, Any]) -> Optional[float]:
+        """价格阈值规则：最新收盘价"""
         daily_data = stock_data.get('daily_data')
         if not daily_data:
-            return {'triggered': False, 'current_value': None, 'message': '无日线数据'}
-        
-        current_price = daily_data.close
-        triggered = rule.check_condition(current_price)
-        
-        return {
-            'triggered': triggered,
-            'current_value': current_price,
-            'message': f'当前价格: {current_price}, 阈值: {rule.threshold_value}'
-        }
+            return None
+        return daily_data.close
     
-    def _process_price_change_pct(self, rule: AlertRule, stock_data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理涨跌幅规则"""
+    def _get_price_change_pct_value(self, stock_data: Dict[str, Any]) -> Optional[float]:
+        """涨跌幅规则：最新涨跌幅"""
         daily_data = stock_data.get('daily_data')
         if not daily_data:
-            return {'triggered': False, 'current_value': None, 'message': '无日线数据'}
-        
-        change_pct = daily_data.pct_chg or 0.0
-        triggered = rule.check_condition(change_pct)
-        
-        return {
-            'triggered': triggered,
-            'current_value': change_pct,
-            'message': f'当前涨跌幅: {change_pct}%, 阈值: {rule.threshold_value}%'
-        }
+            return None
+        return daily_data.pct_chg or 0.0
     
-    def _process_volume_ratio(self, rule: AlertRule, stock_data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理成交量比率规则"""
+    def _get_volume_ratio_value(self, stock_data: Dict[str, Any]) -> Optional[float]:
+        """成交量比率规则：量比"""
         basic_data = stock_data.get('basic_data')
         if not basic_data:
-            return {'triggered': False, 'current_value': None, 'message': '无每日指标数据'}
-        
-        volume_ratio = basic_data.volume_ratio or 0.0
-        triggered = rule.check_condition(volume_ratio)
-        
-        return {
-            'triggered': triggered,
-            'current_value': volume_ratio,
-            'message': f'当前量比: {volume_ratio}, 阈值: {rule.threshold_value}'
-        }
+            return None
+        return basic_data.volume_ratio or 0.0
     
-    def _process_turnover_rate(self, rule: AlertRule, stock_data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理换手率规则"""
+    def _get_turnover_rate_value(self, stock_data: Dict[str, Any]) -> Optional[float]:
+        """换手率规则：换手率"""
         basic_data = stock_data.get('basic_data')
         if not basic_data:
-            return {'triggered': False, 'current_value': None, 'message': '无每日指标数据'}
-        
-        turnover_rate = basic_data.turnover_rate or 0.0
-        triggered = rule.check_condition(turnover_rate)
-        
-        return {
-            'triggered': triggered,
-            'current_value': turnover_rate,
-            'message': f'当前换手率: {turnover_rate}%, 阈值: {rule.threshold_value}%'
-        }
+            return None
+        return basic_data.turnover_rate or 0.0
     
-    def _process_market_value(self, rule: AlertRule, stock_data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理市值变化规则"""
+    def _get_market_value_value(self, stock_data: Dict[str, Any]) -> Optional[float]:
+        """市值规则：总市值（万元）"""
         basic_data = stock_data.get('basic_data')
         if not basic_data:
-            return {'triggered': False, 'current_value': None, 'message': '无每日指标数据'}
-        
-        # 使用总市值（万元）
-        market_value = basic_data.total_mv or 0.0
-        triggered = rule.check_condition(market_value)
-        
-        return {
-            'triggered': triggered,
-            'current_value': market_value,
-            'message': f'当前总市值: {market_value}万元, 阈值: {rule.threshold_value}万元'
-        }
+            return None
+        return basic_data.total_mv or 0.0
     
-    def _process_technical_indicator(self, rule: AlertRule, stock_data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理技术指标规则"""
-        # 这里可以扩展更多技术指标
-        # 目前使用 PE 作为示例
+    def _get_technical_indicator_value(self, stock_data: Dict[str, Any]) -> Optional[float]:
+        """技术指标规则：目前使用 PE 作为示例，可扩展更多技术指标"""
         basic_data = stock_data.get('basic_data')
         if not basic_data:
-            return {'triggered': False, 'current_value': None, 'message': '无每日指标数据'}
-        
-        pe_ratio = basic_data.pe or 0.0
-        triggered = rule.check_condition(pe_ratio)
-        
-        return {
-            'triggered': triggered,
-            'current_value': pe_ratio,
-            'message': f'当前PE: {pe_ratio}, 阈值: {rule.threshold_value}'
-        }
+            return None
+        return basic_data.pe or 0.0
     
-    def _process_money_flow(self, rule: AlertRule, stock_data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理资金流向规则"""
+    def _get_money_flow_value(self, stock_data: Dict[str, Any]) -> Optional[float]:
+        """资金流向规则：净流入金额（万元）"""
         moneyflow_data = stock_data.get('moneyflow_data')
         if not moneyflow_data:
-            return {'triggered': False, 'current_value': None, 'message': '无资金流向数据'}
+            return None
+        return moneyflow_data.net_mf or 0.0
+    
+    def _get_price_zscore_value(self, stock_data: Dict[str, Any]) -> Optional[float]:
+        """价格异动规则：最新日收益率相对前N日的Z分数（带符号）"""
+        return self._get_daily_anomaly_value(stock_data['ts_code'], self.DAILY_ANOMALY_METRICS['price_zscore'])
+    
+    def _get_volume_spike_value(self, stock_data: Dict[str, Any]) -> Optional[float]:
+        """放量异动规则：最新成交量 / 前N日成交量中位数"""
+        return self._get_daily_anomaly_value(stock_data['ts_code'], self.DAILY_ANOMALY_METRICS['volume_spike'])
+    
+    def _get_daily_anomaly_value(self, ts_code: str, metric: str) -> Optional[float]:
+        """从全市场日线异动扫描结果中取值（每轮检查最多扫描一次）"""
+        if self._anomaly_values is not None:
+            return self._anomaly_values.get(ts_code, {}).get(metric)
         
-        # 使用净流入金额（万元）
-        net_mf = moneyflow_data.net_mf or 0.0
-        triggered = rule.check_condition(net_mf)
+        # 延迟导入避免循环依赖
+        from app.services.anomaly_detection_engine import anomaly_detection_engine
         
-        return {
-            'triggered': triggered,
-            'current_value': net_mf,
-            'message': f'当前净流入: {net_mf}万元, 阈值: {rule.threshold_value}万元'
-        }
+        if not self._anomaly_scan_checked:
+            anomaly_detection_engine.ensure_daily_scan()
+            self._anomaly_scan_checked = True
+        return anomaly_detection_engine.get_daily_value(ts_code, metric)
     
     def _should_create_alert(self, rule: AlertRule, current_value: float) -> bool:
-        """判断是否应该创建新预警（避免重复预警）"""
-        try:
-            # 检查最近1小时内是否已有相同规则的预警
-            recent_time = datetime.utcnow() - timedelta(hours=1)
-            
-            existing_alert = RiskAlert.query.filter(
-                and_(
-                    RiskAlert.ts_code == rule.ts_code,
-                    RiskAlert.alert_type == rule.rule_type,
-                    RiskAlert.is_active == True,
-                    RiskAlert.created_at >= recent_time
-                )
-            ).first()
-            
-            return existing_alert is None
-            
-        except Exception as e:
-            logger.error(f"检查重复预警失败: {str(e)}")
-            return True  # 出错时默认创建预警
+        """判断是否应该创建新预警（去重窗口内已有同类预警则跳过）"""
+        return self.dedup_index.should_alert(rule.ts_code, rule.rule_type)
     
     def _create_alert_record(self, rule: AlertRule, result: Dict[str, Any],
-                           stock_data: Dict[str, Any]) -> Optional[RiskAlert]:
-        """创建预警记录"""
+                           stock_data: Dict[str, Any],
+                           batch: AlertSweepBatch,
+                           current_price: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """创建预警记录（加入本轮批次，检查结束时统一写入）"""
         try:
             # 生成预警消息
             alert_message = rule.generate_alert_message(
@@ -363,117 +566,63 @@ class AlertTriggerEngine:
                 stock_data.get('name')
             )
 
-            # 获取当前价格
-            current_price = None
+            # 获取当前价格（未指定时取最新日线收盘价）
             daily_data = stock_data.get('daily_data')
-            if daily_data:
+            if current_price is None and daily_data:
                 current_price = daily_data.close
 
-            # 创建预警记录
-            alert = RiskAlert.create_alert(
-                ts_code=rule.ts_code,
-                alert_type=rule.rule_type,
-                alert_level=rule.alert_level,
-                alert_message=alert_message,
-                risk_value=result['current_value'],
-                threshold_value=rule.threshold_value,
-                current_price=current_price
-            )
-
-            # 更新规则触发统计
-            rule.record_trigger()
-
-            # 发送Webhook通知
-            self._send_webhook_notifications(alert, stock_data)
-
-            return alert
-
-        except Exception as e:
-            logger.error(f"创建预警记录失败: {str(e)}")
-            return None
-
-    def _send_webhook_notifications(self, alert: RiskAlert, stock_data: Dict[str, Any]):
-        """发送Webhook通知"""
-        try:
-            # 获取启用的Webhook配置
-            webhooks = WebhookConfig.get_enabled_configs()
+            created_at = datetime.utcnow()
 
-            if not webhooks:
-                logger.debug("没有启用的Webhook配置，跳过通知发送")
-                return
+            # 预警记录
+            alert_mapping = {
+                'ts_code': rule.ts_code,
+                'alert_type': rule.rule_type,
+                'alert_level': rule.alert_level,
+                'alert_message': alert_message,
+                'risk_value': result['current_value'],
+                'threshold_value': rule.threshold_value,
+                'current_price': current_price,
+                'is_active': True,
+                'is_resolved': False,
+                'created_at': created_at
+            }
 
-            # 构建预警数据
+            # Webhook通知数据
             alert_data = {
-                'ts_code': alert.ts_code,
+                'ts_code': rule.ts_code,
                 'stock_name': stock_data.get('name', ''),
-                'alert_level': alert.alert_level,
-                'alert_type': alert.alert_type,
-                'alert_message': alert.alert_message,
-                'current_price': alert.current_price,
-                'threshold_value': alert.threshold_value,
-                'risk_value': alert.risk_value,
-                'created_at': alert.created_at.isoformat() if alert.created_at else datetime.now().isoformat()
+                'alert_level': rule.alert_level,
+                'alert_type': rule.rule_type,
+                'alert_message': alert_message,
+                'current_price': current_price,
+                'threshold_value': rule.threshold_value,
+                'risk_value': result['current_value'],
+                'created_at': created_at.isoformat()
             }
 
-            # 异步发送Webhook通知
-            asyncio.create_task(self._async_send_webhooks(webhooks, alert_data))
+            batch.add(rule, alert_mapping, alert_data)
 
-        except Exception as e:
-            logger.error(f"发送Webhook通知失败: {str(e)}")
-
-    async def _async_send_webhooks(self, webhooks: List[WebhookConfig], alert_data: Dict[str, Any]):
-        """异步发送多个Webhook通知"""
-        for webhook in webhooks:
-            try:
-                # 发送Webhook通知
-                result = await send_webhook_notification(webhook.to_dict(), alert_data)
+            # 同一轮内后续规则立即可见
+            self.dedup_index.mark(rule.ts_code, rule.rule_type, created_at)
 
-                if result.get('success'):
-                    webhook.record_success()
-                    logger.info(f"Webhook通知发送成功: {webhook.name}")
-                else:
-                    webhook.record_failure()
-                    logger.error(f"Webhook通知发送失败: {webhook.name} - {result.get('message')}")
+            return alert_data
 
-            except Exception as e:
-                webhook.record_failure()
-                logger.error(f"Webhook通知发送异常: {webhook.name} - {str(e)}")
+        except Exception as e:
+            logger.error(f"创建预警记录失败: {str(e)}")
+            return None
     
     def get_trigger_stats(self, days: int = 7) -> Dict[str, Any]:
         """获取触发统计信息"""
         try:
             start_date = datetime.utcnow() - timedelta(days=days)
             
-            # 统计最近N天的预警
-            recent_alerts = RiskAlert.query.filter(
-                RiskAlert.created_at >= start_date
-            ).all()
-            
-            # 按类型统计
-            type_stats = {}
-            level_stats = {}
-            
-            for alert in recent_alerts:
-                # 按类型统计
-                alert_type = alert.alert_type
-                if alert_type not in type_stats:
-                    type_stats[alert_type] = 0
-                type_stats[alert_type] += 1
-                
-                # 按级别统计
-                alert_level = alert.alert_level
-                if alert_level not in level_stats:
-                    level_stats[alert_level] = 0
-                level_stats[alert_level] += 1
+            # 数据库端按类型、级别聚合
+            stats = RiskAlert.get_period_stats(start_date)
             
             return {
                 'success': True,
                 'data': {
-                    'total_alerts': len(recent_alerts),
-                    'active_alerts': len([a for a in recent_alerts if a.is_active]),
-                    'resolved_alerts': len([a for a in recent_alerts if a.is_resolved]),
-                    'by_type': type_stats,
-                    'by_level': level_stats,
+                    **stats,
                     'period_days': days
                 }
             }
@@ -490,6 +639,32 @@ class AlertTriggerEngine:
 alert_trigger_engine = AlertTriggerEngine()
 
 
+def partition_ts_codes(ts_codes: List[str], shards: int) -> List[List[str]]:
+    """按股票代码的稳定哈希分片（CRC32，不受进程哈希随机化影响）"""
+    partitions = [[] for _ in range(shards)]
+    for ts_code in ts_codes:
+        partitions[zlib.crc32(ts_code.encode('utf-8')) % shards].append(ts_code)
+    return partitions
+
+
+# 工作进程内的应用实例
+_worker_app = None
+
+
+def _init_sweep_worker(config_name: str):
+    """工作进程初始化：创建独立的应用和数据库连接池"""
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app(config_name)
+
+
+def _evaluate_shard(ts_codes: List[str], rule_types: Optional[List[str]],
+                    anomaly_values: Optional[Dict[str, Dict[str, Optional[float]]]] = None) -> Dict[str, Any]:
+    """工作进程入口：评估一个分片"""
+    with _worker_app.app_context():
+        return alert_trigger_engine.evaluate_shard(ts_codes, rule_types, anomaly_values)
+
+
 def run_scheduled_alert_check():
     """定时预警检查任务"""
     logger.info("开始定时预警检查...")
@@ -0,0 +1,572 @@
+"""
+异动检测引擎
+全市场向量化计算收益率滚动Z分数、成交量相对N日中位数放大倍数和跳空缺口
+（收益率和缺口基准使用交易所除权后的涨跌幅和昨收，除权除息日不产生假异动）：
+- 日线：一次查询加载最近N个交易日面板，矩阵运算得到全市场结果
+- 盘中：每只股票一行的NumPy状态数组（收益率环形缓冲区 + 滚动和/平方和），
+  每根新K线O(1)更新，同一分钟的全市场K线一次向量化处理
+"""
+
+import logging
+import threading
+import warnings
+from collections import deque
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.extensions import db
+from app.models.stock_daily_history import StockDailyHistory
+from app.models.stock_minute_data import StockMinuteData
+from app.services.intraday_alert_engine import TRADING_MINUTES, trading_minutes_elapsed
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class AnomalyDetectionEngine:
+    """异动检测引擎"""
+
+    # 异动类型
+    TYPE_PRICE_ZSCORE = 'price_zscore'
+    TYPE_VOLUME_SPIKE = 'volume_spike'
+    TYPE_GAP = 'gap'
+
+    ANOMALY_TYPES = {
+        TYPE_PRICE_ZSCORE: '价格异动',
+        TYPE_VOLUME_SPIKE: '放量异动',
+        TYPE_GAP: '跳空缺口'
+    }
+
+    # 可作为预警规则类型的异动指标（规则类型 -> 名称）
+    RULE_TYPES = {
+        TYPE_PRICE_ZSCORE: '价格异动(Z分数)',
+        TYPE_VOLUME_SPIKE: '放量倍数'
+    }
+
+    def __init__(self, window: int = 20, volume_lookback: int = 20, min_periods: int = 10,
+                 zscore_threshold: float = 3.0, volume_spike_ratio: float = 3.0,
+                 gap_threshold: float = 2.0, max_events: int = 2000):
+        """
+        Args:
+            window: 收益率Z分数的滚动窗口（日线为交易日数，盘中为K线根数）
+            volume_lookback: 成交量中位数回看交易日数
+            min_periods: 计算Z分数所需的最少样本数
+            zscore_threshold: |Z|超过该值视为价格异动
+            volume_spike_ratio: 成交量超过N日中位数该倍数视为放量
+            gap_threshold: 跳空幅度(%)超过该值视为缺口异动
+            max_events: 保留的最近盘中异动事件数
+        """
+        self.window = window
+        self.volume_lookback = volume_lookback
+        self.min_periods = min_periods
+        self.zscore_threshold = zscore_threshold
+        self.volume_spike_ratio = volume_spike_ratio
+        self.gap_threshold = gap_threshold
+
+        self._lock = threading.RLock()
+
+        # 日线扫描结果（按最新交易日缓存）
+        self.daily_result: Optional[Dict[str, Any]] = None
+
+        # 盘中会话
+        self.is_active = False
+        self.trade_date = None
+        self.period_type = None
+        self.codes = np.array([], dtype=object)
+        self.index: Dict[str, int] = {}
+        self.events = deque(maxlen=max_events)
+        self.stats = {'bars': 0, 'batches': 0, 'events': 0}
+        self._init_state(0)
+
+    # ---------- 日线面板 ----------
+
+    def _load_daily_panel(self, end_date: Optional[date] = None, inclusive: bool = True,
+                          days: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        加载最近N个交易日的全市场日线面板（股票 x 交易日矩阵）
+
+        Args:
+            end_date: 截止日期，默认最新
+            inclusive: 是否包含截止日期当天
+            days: 交易日数
+        """
+        days = days or max(self.window, self.volume_lookback) + 1
+
+        date_query = db.session.query(StockDailyHistory.trade_date).distinct()
+        if end_date:
+            date_query = date_query.filter(
+                StockDailyHistory.trade_date <= end_date if inclusive else StockDailyHistory.trade_date < end_date
+            )
+        trade_dates = [row[0] for row in date_query.order_by(StockDailyHistory.trade_date.desc()).limit(days).all()]
+        if len(trade_dates) < 2:
+            return None
+
+        rows = db.session.query(
+            StockDailyHistory.ts_code,
+            StockDailyHistory.trade_date,
+            StockDailyHistory.open,
+            StockDailyHistory.high,
+            StockDailyHistory.low,
+            StockDailyHistory.close,
+            StockDailyHistory.pre_close,
+            StockDailyHistory.pct_chg,
+            StockDailyHistory.vol
+        ).filter(StockDailyHistory.trade_date.in_(trade_dates)).all()
+        if not rows:
+            return None
+
+        fields = ['open', 'high', 'low', 'close', 'pre_close', 'pct_chg', 'vol']
+        df = pd.DataFrame(rows, columns=['ts_code', 'trade_date'] + fields)
+        frame = df.set_index(['ts_code', 'trade_date'])[fields].astype(float)
+        frame = frame[~frame.index.duplicated(keep='last')]
+
+        # 补齐为完整矩阵，停牌日为NaN
+        wide = frame.unstack('trade_date')
+        panel = {
+            'codes': wide.index.to_numpy(dtype=object),
+            'dates': sorted(trade_dates)
+        }
+        for field in fields:
+            panel[field] = wide[field].reindex(columns=panel['dates']).to_numpy(dtype=np.float64)
+
+        # 昨收/涨跌幅缺失时按相邻收盘价补齐
+        with np.errstate(divide='ignore', invalid='ignore'):
+            raw_pre_close = np.hstack([np.full((len(panel['codes']), 1), np.nan), panel['close'][:, :-1]])
+            panel['pre_close'] = np.where(np.isnan(panel['pre_close']), raw_pre_close, panel['pre_close'])
+            panel['pct_chg'] = np.where(np.isnan(panel['pct_chg']),
+                                        (panel['close'] / panel['pre_close'] - 1) * 100, panel['pct_chg'])
+
+        return panel
+
+    def scan_daily(self, trade_date: Optional[date] = None) -> Dict[str, Any]:
+        """
+        全市场日线异动扫描
+
+        Args:
+            trade_date: 扫描的交易日，默认最新交易日；指定历史交易日时结果不替换最新扫描结果
+
+        Returns:
+            扫描结果（各指标数组 + 超过阈值的异动列表）
+        """
+        panel = self._load_daily_panel(trade_date)
+        if panel is None:
+            return {'trade_date': None, 'codes': np.array([], dtype=object), 'index': {}, 'anomalies': []}
+
+        close, vol = panel['close'], panel['vol']
+
+        with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+            warnings.simplefilter('ignore', RuntimeWarning)
+
+            # 收益率矩阵(%)（交易所除权后的涨跌幅），最新一日对前window日做Z分数
+            returns = panel['pct_chg'][:, 1:]
+            last_return = returns[:, -1]
+            history = returns[:, -(self.window + 1):-1]
+            counts = np.sum(np.isfinite(history), axis=1)
+            mean = np.nanmean(history, axis=1)
+            std = np.nanstd(history, axis=1)
+            zscore = np.where((counts >= self.min_periods) & (std > 0), (last_return - mean) / std, np.nan)
+
+            # 成交量相对前N日中位数
+            volume_median = np.nanmedian(vol[:, -(self.volume_lookback + 1):-1], axis=1)
+            volume_spike = np.where(volume_median > 0, vol[:, -1] / volume_median, np.nan)
+
+            # 跳空：今开相对除权后的昨收，且开盘价在除权后的昨日最高/最低价之外
+            pre_close = panel['pre_close'][:, -1]
+            ex_scale = _ex_scale(pre_close, close[:, -2])
+            gap_pct = (panel['open'][:, -1] - pre_close) / pre_close * 100
+            gap_up = panel['low'][:, -1] > panel['high'][:, -2] * ex_scale
+            gap_down = panel['high'][:, -1] < panel['low'][:, -2] * ex_scale
+
+        result = {
+            'trade_date': panel['dates'][-1],
+            'codes': panel['codes'],
+            'index': {ts_code: i for i, ts_code in enumerate(panel['codes'])},
+            'close': close[:, -1],
+            'pct_chg': last_return,
+            'zscore': zscore,
+            'volume_spike': volume_spike,
+            'gap_pct': gap_pct,
+            'gap_up': gap_up,
+            'gap_down': gap_down
+        }
+        result['anomalies'] = self._collect_daily_anomalies(result)
+
+        # 只有最新交易日的扫描结果供预警规则取值
+        if trade_date is None:
+            with self._lock:
+                self.daily_result = result
+
+        logger.info(f"日线异动扫描完成: {result['trade_date']}, 股票 {len(panel['codes'])} 只, "
+                    f"异动 {len(result['anomalies'])} 条")
+        return result
+
+    def _collect_daily_anomalies(self, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """取出超过阈值的股票"""
+        zscore, volume_spike, gap_pct = result['zscore'], result['volume_spike'], result['gap_pct']
+        gap = result['gap_up'] | result['gap_down']
+
+        with np.errstate(invalid='ignore'):
+            flags = {
+                self.TYPE_PRICE_ZSCORE: np.abs(zscore) >= self.zscore_threshold,
+                self.TYPE_VOLUME_SPIKE: volume_spike >= self.volume_spike_ratio,
+                self.TYPE_GAP: gap & (np.abs(gap_pct) >= self.gap_threshold)
+            }
+
+        anomalies = []
+        for i in np.flatnonzero(np.logical_or.reduce(list(flags.values()))):
+            anomalies.append({
+                'ts_code': result['codes'][i],
+                'trade_date': result['trade_date'].isoformat(),
+                'types': [anomaly_type for anomaly_type, flag in flags.items() if flag[i]],
+                'close': _to_float(result['close'][i]),
+                'pct_chg': _to_float(result['pct_chg'][i], 2),
+                'zscore': _to_float(zscore[i], 2),
+                'volume_spike': _to_float(volume_spike[i], 2),
+                'gap_pct': _to_float(gap_pct[i], 2),
+                'gap_direction': 'up' if result['gap_up'][i] else ('down' if result['gap_down'][i] else None)
+            })
+
+        anomalies.sort(key=lambda item: abs(item['zscore'] or 0), reverse=True)
+        return anomalies
+
+    def ensure_daily_scan(self) -> Dict[str, Any]:
+        """日线有新交易日数据时重新扫描"""
+        latest_date = db.session.query(db.func.max(StockDailyHistory.trade_date)).scalar()
+        if self.daily_result is None or self.daily_result['trade_date'] != latest_date:
+            return self.scan_daily()
+        return self.daily_result
+
+    def get_daily_value(self, ts_code: str, metric: str) -> Optional[float]:
+        """最近一次日线扫描中某只股票的指标值"""
+        result = self.daily_result
+        if result is None:
+            return None
+        i = result['index'].get(ts_code)
+        if i is None:
+            return None
+        return _to_float(result[metric][i], 4)
+
+    # ---------- 盘中增量状态 ----------
+
+    def _init_state(self, size: int):
+        """按股票数分配状态数组"""
+        self.ret_buf = np.zeros((size, self.window), dtype=np.float64)
+        self.ret_pos = np.zeros(size, dtype=np.int64)
+        self.ret_count = np.zeros(size, dtype=np.int64)
+        self.ret_sum = np.zeros(size, dtype=np.float64)
+        self.ret_sumsq = np.zeros(size, dtype=np.float64)
+
+        self.pre_close = np.full(size, np.nan)
+        self.pre_high = np.full(size, np.nan)
+        self.pre_low = np.full(size, np.nan)
+        self.volume_median = np.full(size, np.nan)
+
+        self.day_open = np.full(size, np.nan)
+        self.last_close = np.full(size, np.nan)
+        self.cum_volume = np.zeros(size, dtype=np.float64)
+        self.last_bar_ts = np.full(size, np.iinfo(np.int64).min, dtype=np.int64)
+
+        self.zscore = np.full(size, np.nan)
+        self.volume_spike = np.full(size, np.nan)
+        self.gap_pct = np.full(size, np.nan)
+
+    def start_session(self, trade_date: Optional[date] = None, period_type: str = '5min') -> Dict[str, Any]:
+        """
+        开始盘中异动检测：加载昨日基准并用上一交易日分钟线预热收益率窗口
+
+        当日日线已入库（如回放历史交易日）时以交易所除权后的昨收为跳空基准，
+        否则以上一交易日收盘价为基准
+
+        Args:
+            trade_date: 交易日，默认今天
+            period_type: 消费的K线周期
+        """
+        trade_date = trade_date or datetime.now().date()
+        panel = self._load_daily_panel(trade_date, days=max(self.window, self.volume_lookback) + 2)
+        today_pre_close = None
+        if panel is not None and panel['dates'][-1] == trade_date:
+            today_pre_close = panel['pre_close'][:, -1]
+            panel = {key: value[:, :-1] if np.ndim(value) == 2 else value for key, value in panel.items()}
+            panel['dates'] = panel['dates'][:-1]
+            if not panel['dates']:
+                panel = None
+
+        with self._lock:
+            self.trade_date = trade_date
+            self.period_type = period_type
+            self.events.clear()
+            self.stats = {'bars': 0, 'batches': 0, 'events': 0}
+
+            if panel is None:
+                self.codes = np.array([], dtype=object)
+                self.index = {}
+                self._init_state(0)
+            else:
+                self.codes = panel['codes']
+                self.index = {ts_code: i for i, ts_code in enumerate(self.codes)}
+                self._init_state(len(self.codes))
+
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    self.pre_close = panel['close'][:, -1].copy()
+                    ex_scale = np.ones(len(self.codes))
+                    if today_pre_close is not None:
+                        ex_scale = _ex_scale(today_pre_close, self.pre_close)
+                        self.pre_close = np.where(np.isnan(today_pre_close), self.pre_close, today_pre_close)
+                    self.pre_high = panel['high'][:, -1] * ex_scale
+                    self.pre_low = panel['low'][:, -1] * ex_scale
+                    # 日线成交量单位为手，分钟线为股
+                    self.volume_median = np.nanmedian(panel['vol'][:, -self.volume_lookback:], axis=1) * 100
+
+                self._warm_returns(panel['dates'][-1], trade_date, period_type)
+
+            self.is_active = True
+
+        logger.info(f"盘中异动检测开始: {trade_date} {period_type}, 股票 {len(self.codes)} 只")
+        return self.get_status()
+
+    def stop_session(self):
+        """结束盘中异动检测"""
+        self.is_active = False
+        logger.info(f"盘中异动检测结束: {self.trade_date}, 统计: {self.stats}")
+
+    def _warm_returns(self, previous_date: date, trade_date: date, period_type: str):
+        """用上一交易日最后window根K线的收益率填充环形缓冲区"""
+        rows = db.session.query(
+            StockMinuteData.ts_code,
+            StockMinuteData.datetime,
+            StockMinuteData.close
+        ).filter(
+            StockMinuteData.period_type == period_type,
+            StockMinuteData.datetime >= datetime.combine(previous_date, datetime.min.time()),
+            StockMinuteData.datetime < datetime.combine(trade_date, datetime.min.time())
+        ).all()
+        if not rows:
+            return
+
+        df = pd.DataFrame(rows, columns=['ts_code', 'datetime', 'close'])
+        df = df[df['ts_code'].isin(self.index.keys())].sort_values(['ts_code', 'datetime'])
+        df['ret'] = df.groupby('ts_code')['close'].pct_change() * 100
+        df = df.dropna(subset=['ret']).groupby('ts_code').tail(self.window)
+        if df.empty:
+            return
+
+        idx = df['ts_code'].map(self.index).to_numpy(dtype=np.int64)
+        slot = df.groupby('ts_code').cumcount().to_numpy(dtype=np.int64)
+        ret = df['ret'].to_numpy(dtype=np.float64)
+
+        self.ret_buf[idx, slot] = ret
+        np.add.at(self.ret_count, idx, 1)
+        np.add.at(self.ret_sum, idx, ret)
+        np.add.at(self.ret_sumsq, idx, ret * ret)
+        self.ret_pos = self.ret_count % self.window
+
+    def on_bars(self, bars: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        处理一批新K线（可混合多只股票、多个时刻），同一时刻的K线一次向量化更新
+
+        Returns:
+            本批新产生的异动事件
+        """
+        if not self.is_active:
+            return []
+
+        records = [
+            bar for bar in bars
+            if bar.get('ts_code') in self.index and bar.get('datetime') is not None
+            and bar['datetime'].date() == self.trade_date
+            and bar.get('period_type', self.period_type) == self.period_type
+        ]
+        if not records:
+            return []
+
+        df = pd.DataFrame(records, columns=['ts_code', 'datetime', 'open', 'high', 'low', 'close', 'volume'])
+        df['idx'] = df['ts_code'].map(self.index)
+        df = df.drop_duplicates(['idx', 'datetime'], keep='last')
+
+        events = []
+        with self._lock:
+            for bar_time, group in df.groupby('datetime', sort=True):
+                events.extend(self.update(
+                    group['idx'].to_numpy(dtype=np.int64),
+                    bar_time.to_pydatetime(),
+                    group['open'].to_numpy(dtype=np.float64),
+                    group['close'].to_numpy(dtype=np.float64),
+                    group['volume'].fillna(0).to_numpy(dtype=np.float64)
+                ))
+        return events
+
+    def update(self, idx: np.ndarray, bar_time: datetime, opens: np.ndarray,
+               closes: np.ndarray, volumes: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        同一时刻一批股票的K线向量化更新（idx不重复），每只股票O(1)
+
+        Returns:
+            超过阈值的异动事件
+        """
+        bar_ts = np.datetime64(bar_time, 'm').astype(np.int64)
+
+        # 同步服务会重复提交已处理过的K线
+        fresh = self.last_bar_ts[idx] < bar_ts
+        idx, opens, closes, volumes = idx[fresh], opens[fresh], closes[fresh], volumes[fresh]
+        if not len(idx):
+            return []
+
+        self.stats['bars'] += len(idx)
+        self.stats['batches'] += 1
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 当日第一根K线：记录开盘价与跳空，收益率相对开盘价（隔夜跳空单独计入缺口）
+            first = np.isnan(self.day_open[idx])
+            first_idx = idx[first]
+            self.day_open[first_idx] = np.where(np.isnan(opens[first]), closes[first], opens[first])
+            self.gap_pct[first_idx] = (self.day_open[first_idx] - self.pre_close[first_idx]) \
+                / self.pre_close[first_idx] * 100
+
+            prev = np.where(first, self.day_open[idx], self.last_close[idx])
+            ret = (closes / prev - 1) * 100
+
+            # 新收益率相对此前window根K线的Z分数
+            count = self.ret_count[idx]
+            mean = self.ret_sum[idx] / count
+            var = self.ret_sumsq[idx] / count - mean * mean
+            std = np.sqrt(np.maximum(var, 0))
+            zscore = np.where((count >= self.min_periods) & (std > 1e-12), (ret - mean) / std, np.nan)
+
+            # 压入环形缓冲区，滚动和/平方和O(1)更新
+            valid = np.isfinite(ret)
+            vi, vr = idx[valid], ret[valid]
+            pos = self.ret_pos[vi]
+            old = np.where(self.ret_count[vi] >= self.window, self.ret_buf[vi, pos], 0.0)
+            self.ret_sum[vi] += vr - old
+            self.ret_sumsq[vi] += vr * vr - old * old
+            self.ret_buf[vi, pos] = vr
+            self.ret_pos[vi] = (pos + 1) % self.window
+            self.ret_count[vi] = np.minimum(self.ret_count[vi] + 1, self.window)
+
+            # 累计成交量相对N日中位数按已交易时间折算的预期量
+            self.cum_volume[idx] += volumes
+            elapsed = trading_minutes_elapsed(bar_time)
+            expected = self.volume_median[idx] * max(elapsed, 1) / TRADING_MINUTES
+            volume_spike = np.where(expected > 0, self.cum_volume[idx] / expected, np.nan)
+
+            self.last_close[idx] = closes
+            self.last_bar_ts[idx] = bar_ts
+            self.zscore[idx] = zscore
+            self.volume_spike[idx] = volume_spike
+
+            flags = {
+                self.TYPE_PRICE_ZSCORE: np.abs(zscore) >= self.zscore_threshold,
+                self.TYPE_VOLUME_SPIKE: volume_spike >= self.volume_spike_ratio,
+                self.TYPE_GAP: first & (np.abs(self.gap_pct[idx]) >= self.gap_threshold)
+                & ((self.day_open[idx] > self.pre_high[idx]) | (self.day_open[idx] < self.pre_low[idx]))
+            }
+
+        events = []
+        for j in np.flatnonzero(np.logical_or.reduce(list(flags.values()))):
+            i = idx[j]
+            event = {
+                'ts_code': self.codes[i],
+                'datetime': bar_time.isoformat(),
+                'types': [anomaly_type for anomaly_type, flag in flags.items() if flag[j]],
+                'close': _to_float(closes[j]),
+                'bar_return': _to_float(ret[j], 4),
+                'zscore': _to_float(zscore[j], 2),
+                'volume_spike': _to_float(volume_spike[j], 2),
+                'gap_pct': _to_float(self.gap_pct[i], 2)
+            }
+            events.append(event)
+            self.events.append(event)
+
+        self.stats['events'] += len(events)
+        return events
+
+    def get_value(self, ts_code: str, metric: str) -> Optional[float]:
+        """盘中某只股票的最新指标值（zscore / volume_spike / gap_pct）"""
+        i = self.index.get(ts_code)
+        if i is None or not self.is_active:
+            return None
+        return _to_float(getattr(self, metric)[i], 4)
+
+    def get_state(self, ts_code: str) -> Optional[Dict[str, Any]]:
+        """获取单只股票的盘中异动状态"""
+        i = self.index.get(ts_code)
+        if i is None:
+            return None
+
+        return {
+            'ts_code': ts_code,
+            'pre_close': _to_float(self.pre_close[i]),
+            'day_open': _to_float(self.day_open[i]),
+            'last_close': _to_float(self.last_close[i]),
+            'cum_volume': _to_float(self.cum_volume[i]),
+            'volume_median': _to_float(self.volume_median[i]),
+            'window_size': int(self.ret_count[i]),
+            'zscore': _to_float(self.zscore[i], 2),
+            'volume_spike': _to_float(self.volume_spike[i], 2),
+            'gap_pct': _to_float(self.gap_pct[i], 2)
+        }
+
+    def get_events(self, ts_code: Optional[str] = None, anomaly_type: Optional[str] = None,
+                   limit: int = 100) -> List[Dict[str, Any]]:
+        """最近的盘中异动事件（新的在前）"""
+        events = []
+        for event in reversed(self.events):
+            if ts_code and event['ts_code'] != ts_code:
+                continue
+            if anomaly_type and anomaly_type not in event['types']:
+                continue
+            events.append(event)
+            if len(events) >= limit:
+                break
+        return events
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取引擎状态"""
+        return {
+            'is_active': self.is_active,
+            'trade_date': self.trade_date.isoformat() if self.trade_date else None,
+            'period_type': self.period_type,
+            'stock_count': len(self.codes),
+            'daily_trade_date': self.daily_result['trade_date'].isoformat()
+            if self.daily_result and self.daily_result['trade_date'] else None,
+            'params': {
+                'window': self.window,
+                'volume_lookback': self.volume_lookback,
+                'min_periods': self.min_periods,
+                'zscore_threshold': self.zscore_threshold,
+                'volume_spike_ratio': self.volume_spike_ratio,
+                'gap_threshold': self.gap_threshold
+            },
+            'stats': dict(self.stats)
+        }
+
+
+def _ex_scale(pre_close: np.ndarray, previous_close: np.ndarray) -> np.ndarray:
+    """除权缩放比例：除权后昨收 / 上一交易日收盘价（无法计算时为1）"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = pre_close / previous_close
+    return np.where(np.isfinite(scale) & (scale > 0), scale, 1.0)
+
+
+def _to_float(value, digits: Optional[int] = None) -> Optional[float]:
+    """NumPy数值转为可JSON序列化的float，NaN/inf返回None"""
+    if value is None:
+        return None
+    value = float(value)
+    if not np.isfinite(value):
+        return None
+    return round(value, digits) if digits is not None else value
+
+
+# 全局实例
+anomaly_detection_engine = AnomalyDetectionEngine(
+    window=Config.ANOMALY_WINDOW,
+    volume_lookback=Config.ANOMALY_VOLUME_LOOKBACK,
+    zscore_threshold=Config.ANOMALY_ZSCORE_THRESHOLD,
+    volume_spike_ratio=Config.ANOMALY_VOLUME_SPIKE_RATIO,
+    gap_threshold=Config.ANOMALY_GAP_THRESHOLD
+)
@@ -0,0 +1,555 @@
+"""
+交易信号回测引擎
+- 行情：一次性加载区间内全市场日线（或分钟线）为 K线×股票 矩阵，停牌为NaN
+- 策略：插件式接口，在整个面板上向量化生成信号矩阵（第t行只能使用t及之前的数据）
+- 撮合：逐根K线推进、全市场向量化撮合，t根K线收盘的信号在t+1根K线开盘成交，
+  遵守A股规则（T+1、涨跌停无法买入/卖出、整手交易、佣金与印花税）
+- 除权除息：由交易所昨收与上一交易日收盘价之比得到除权系数，策略使用复权价，
+  持仓在除权日按系数折算股数，送转和分红不会被当作亏损
+- 结果：成交记录经 TradingSignal.batch_insert 写入交易信号表
+"""
+
+import json
+import logging
+import time
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Type
+
+import numpy as np
+import pandas as pd
+
+from app.extensions import db
+from app.models.stock_basic import StockBasic
+from app.models.stock_daily_history import StockDailyHistory
+from app.models.stock_minute_data import StockMinuteData
+from app.models.trading_signal import TradingSignal
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class BarPanel:
+    """K线面板：K线×股票 的OHLCV矩阵"""
+
+    FIELDS = ('open', 'high', 'low', 'close', 'pre_close', 'volume')
+
+    def __init__(self, times: pd.DatetimeIndex, ts_codes: np.ndarray, period_type: str,
+                 arrays: Dict[str, np.ndarray], names: Optional[np.ndarray] = None):
+        self.times = times
+        self.ts_codes = ts_codes
+        self.period_type = period_type
+        for field in self.FIELDS:
+            setattr(self, field, arrays[field])
+
+        # 每根K线所属交易日的序号（T+1按交易日判断）
+        self.bar_days, self.trade_dates = pd.factorize(times.normalize(), sort=True)
+
+        # 涨跌停以上一交易日收盘价为基准：分钟线统一按上一交易日最后一根K线计算，日线只补齐缺失的昨收
+        previous_close = self._previous_day_close()
+        if period_type != 'daily':
+            self.pre_close = previous_close
+            self.ex_ratio = np.ones(self.shape)
+        else:
+            # 日线昨收为交易所除权后的价格，与上一交易日收盘价之比即除权系数（10送10为2）
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ratio = previous_close / self.pre_close
+            valid = np.isfinite(ratio) & (ratio > 0) & (np.abs(ratio - 1) > 1e-6)
+            self.ex_ratio = np.where(valid, ratio, 1.0)
+
+            missing = np.isnan(self.pre_close)
+            if missing.any():
+                self.pre_close[missing] = previous_close[missing]
+
+        # 后复权系数：首根K线为1，复权价在除权日连续
+        self.adj_factor = np.cumprod(self.ex_ratio, axis=0)
+
+        up_limit, down_limit = self.price_limits(self.pre_close, ts_codes, names)
+        self.up_limit = up_limit
+        self.down_limit = down_limit
+
+    @property
+    def shape(self):
+        return self.close.shape
+
+    def _previous_day_close(self) -> np.ndarray:
+        """每根K线对应的上一交易日收盘价"""
+        filled = pd.DataFrame(self.close).ffill().to_numpy()
+        # 每个交易日最后一根K线的行号
+        last_rows = np.flatnonzero(np.diff(np.append(self.bar_days, -1)) != 0)
+        day_close = filled[last_rows]
+        previous = np.vstack([np.full((1, self.close.shape[1]), np.nan), day_close[:-1]])
+        return previous[self.bar_days]
+
+    def adjusted(self, values: np.ndarray) -> np.ndarray:
+        """原始价格转为后复权价格（策略生成信号使用，避免除权缺口产生假信号）"""
+        return values * self.adj_factor
+
+    @staticmethod
+    def price_limits(pre_close: np.ndarray, ts_codes: np.ndarray, names: Optional[np.ndarray] = None):
+        """涨跌停价：主板ST股5%，创业板、科创板20%，北交所30%，其余10%"""
+        codes = pd.Series(np.asarray(ts_codes).astype(str))
+        pct = np.full(len(codes), 0.10)
+        if names is not None:
+            is_st = pd.Series(np.asarray(names, dtype=object)).fillna('').astype(str).str.upper().str.contains('ST')
+            pct[is_st.to_numpy()] = 0.05
+        pct[codes.str.startswith(('300', '301', '688', '689')).to_numpy()] = 0.20
+        pct[codes.str.endswith('.BJ').to_numpy()] = 0.30
+        up_limit = np.round(pre_close * (1 + pct), 2)
+        down_limit = np.round(pre_close * (1 - pct), 2)
+        return up_limit, down_limit
+
+    def rolling(self, values: np.ndarray, window: int, how: str = 'mean') -> np.ndarray:
+        """按列滚动计算（窗口不足时为NaN）"""
+        return getattr(pd.DataFrame(values).rolling(window, min_periods=window), how)().to_numpy()
+
+
+# ---------- 策略 ----------
+
+class BacktestStrategy:
+    """
+    回测策略基类
+
+    子类实现 generate_signals，返回与面板同形状的信号矩阵：
+    正数为买入（数值为信号强度，用于同一根K线多只股票的排序），负数为卖出，0或NaN无信号
+    """
+
+    name = 'base'
+    indicators: List[str] = []
+    default_params: Dict[str, Any] = {}
+
+    def __init__(self, **params):
+        self.params = {**self.default_params, **params}
+
+    def generate_signals(self, bars: BarPanel) -> np.ndarray:
+        raise NotImplementedError
+
+
+class MovingAverageCrossStrategy(BacktestStrategy):
+    """均线交叉：短均线上穿长均线买入，下穿卖出"""
+
+    name = 'ma_cross'
+    indicators = ['MA']
+    default_params = {'fast': 5, 'slow': 20}
+
+    def generate_signals(self, bars: BarPanel) -> np.ndarray:
+        close = bars.adjusted(bars.close)
+        fast = bars.rolling(close, self.params['fast'])
+        slow = bars.rolling(close, self.params['slow'])
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            above = fast > slow
+            below = fast < slow
+            was_above = np.vstack([np.zeros((1, above.shape[1]), dtype=bool), above[:-1]])
+            was_below = np.vstack([np.zeros((1, below.shape[1]), dtype=bool), below[:-1]])
+
+            # 强度：短均线高出长均线的幅度
+            strength = np.clip((fast / slow - 1) * 10, 0.01, 1.0)
+
+        signals = np.where(above & ~was_above, strength, 0.0)
+        signals[below & ~was_below] = -1.0
+        return signals
+
+
+class BreakoutStrategy(BacktestStrategy):
+    """通道突破：收盘价突破前N根K线最高价买入，跌破前M根K线最低价卖出"""
+
+    name = 'breakout'
+    indicators = ['HHV', 'LLV']
+    default_params = {'entry_window': 20, 'exit_window': 10}
+
+    def generate_signals(self, bars: BarPanel) -> np.ndarray:
+        close = bars.adjusted(bars.close)
+        # 前N根K线（不含当前）的最高价/最低价
+        highest = np.vstack([np.full((1, bars.shape[1]), np.nan),
+                             bars.rolling(bars.adjusted(bars.high), self.params['entry_window'], 'max')[:-1]])
+        lowest = np.vstack([np.full((1, bars.shape[1]), np.nan),
+                            bars.rolling(bars.adjusted(bars.low), self.params['exit_window'], 'min')[:-1]])
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            strength = np.clip((close / highest - 1) * 10, 0.01, 1.0)
+            signals = np.where(close > highest, strength, 0.0)
+            signals[close < lowest] = -1.0
+        return signals
+
+
+# 可用策略：策略名 -> 策略类
+STRATEGIES: Dict[str, Type[BacktestStrategy]] = {
+    MovingAverageCrossStrategy.name: MovingAverageCrossStrategy,
+    BreakoutStrategy.name: BreakoutStrategy
+}
+
+
+def register_strategy(strategy_class: Type[BacktestStrategy]) -> Type[BacktestStrategy]:
+    """注册策略（可用作类装饰器）"""
+    STRATEGIES[strategy_class.name] = strategy_class
+    return strategy_class
+
+
+def create_strategy(name: str, **params) -> BacktestStrategy:
+    if name not in STRATEGIES:
+        raise ValueError(f"不支持的策略: {name}，可用策略: {list(STRATEGIES)}")
+    return STRATEGIES[name](**params)
+
+
+# ---------- 回测引擎 ----------
+
+class BacktestEngine:
+    """A股交易信号回测引擎"""
+
+    PERIODS_PER_DAY = {'daily': 1, '1min': 240, '5min': 48, '15min': 16, '30min': 8, '60min': 4}
+    TRADING_DAYS_PER_YEAR = 244
+
+    def __init__(self, initial_capital: float = 1_000_000, max_positions: int = 10,
+                 commission_rate: float = 0.00025, min_commission: float = 5.0,
+                 stamp_duty: float = 0.0005, slippage: float = 0.001, lot_size: int = 100):
+        """
+        Args:
+            initial_capital: 初始资金
+            max_positions: 最大持仓股票数（每只股票按 组合净值/max_positions 分配资金）
+            commission_rate: 佣金费率（买卖双向）
+            min_commission: 单笔最低佣金
+            stamp_duty: 印花税率（仅卖出）
+            slippage: 滑点（成交价相对开盘价的比例）
+            lot_size: 每手股数
+        """
+        self.initial_capital = initial_capital
+        self.max_positions = max_positions
+        self.commission_rate = commission_rate
+        self.min_commission = min_commission
+        self.stamp_duty = stamp_duty
+        self.slippage = slippage
+        self.lot_size = lot_size
+
+    # ---------- 行情加载 ----------
+
+    def load_bars(self, start_date: date, end_date: date, ts_codes: Optional[List[str]] = None,
+                  period_type: str = 'daily') -> Optional[BarPanel]:
+        """按块流式读取区间内K线并直接填入矩阵"""
+        if period_type == 'daily':
+            model, time_column = StockDailyHistory, StockDailyHistory.trade_date
+            columns = [StockDailyHistory.ts_code, StockDailyHistory.trade_date.label('bar_time'),
+                       StockDailyHistory.open, StockDailyHistory.high, StockDailyHistory.low,
+                       StockDailyHistory.close, StockDailyHistory.pre_close,
+                       StockDailyHistory.vol.label('volume')]
+            conditions = [time_column >= start_date, time_column <= end_date]
+        else:
+            model, time_column = StockMinuteData, StockMinuteData.datetime
+            columns = [StockMinuteData.ts_code, StockMinuteData.datetime.label('bar_time'),
+                       StockMinuteData.open, StockMinuteData.high, StockMinuteData.low,
+                       StockMinuteData.close, StockMinuteData.pre_close, StockMinuteData.volume]
+            conditions = [StockMinuteData.period_type == period_type,
+                          time_column >= datetime.combine(start_date, datetime.min.time()),
+                          time_column <= datetime.combine(end_date, datetime.max.time())]
+        if ts_codes:
+            conditions.append(model.ts_code.in_(ts_codes))
+
+        times = [row[0] for row in db.session.query(time_column).filter(*conditions)
+                 .distinct().order_by(time_column).all()]
+        codes = [row[0] for row in db.session.query(model.ts_code).filter(*conditions)
+                 .distinct().order_by(model.ts_code).all()]
+        if len(times) < 2 or not codes:
+            return None
+
+        time_index = pd.DatetimeIndex(pd.to_datetime(times))
+        code_index = pd.Index(codes)
+        arrays = {field: np.full((len(time_index), len(code_index)), np.nan) for field in BarPanel.FIELDS}
+
+        statement = db.session.query(*columns).filter(*conditions).statement
+        with db.engine.connect().execution_options(stream_results=True) as connection:
+            for chunk in pd.read_sql(statement, connection, chunksize=Config.BACKTEST_LOAD_CHUNK_SIZE):
+                rows = time_index.get_indexer(pd.to_datetime(chunk['bar_time']))
+                cols = code_index.get_indexer(chunk['ts_code'])
+                for field in BarPanel.FIELDS:
+                    arrays[field][rows, cols] = chunk[field].to_numpy(dtype=np.float64)
+
+        # 按当前简称判断ST（历史摘帽/戴帽不回溯）
+        names = dict(db.session.query(StockBasic.ts_code, StockBasic.name)
+                     .filter(StockBasic.ts_code.in_(codes)).all())
+        return BarPanel(time_index, code_index.to_numpy(dtype=object), period_type, arrays,
+                        names=np.array([names.get(code) for code in codes], dtype=object))
+
+    # ---------- 撮合 ----------
+
+    def _commission(self, amount: np.ndarray) -> np.ndarray:
+        return np.maximum(amount * self.commission_rate, self.min_commission)
+
+    def simulate(self, bars: BarPanel, signals: np.ndarray) -> Dict[str, Any]:
+        """
+        逐根K线撮合
+
+        t根K线的信号在t+1根K线开盘成交：先卖后买；卖单未成交（跌停、停牌、T+1）时保留到下一根K线，
+        买单未成交（涨停、停牌、无空余仓位或资金不足）时作废。
+        除权日开盘前持仓股数乘以除权系数（分红按再投资折算），持仓成本总额不变
+        """
+        n_bars, n_stocks = bars.shape
+        eps = 1e-6
+
+        cash = float(self.initial_capital)
+        shares = np.zeros(n_stocks)
+        cost_basis = np.zeros(n_stocks)
+        entry_bar = np.full(n_stocks, -1, dtype=np.int64)
+        pending_sell = np.zeros(n_stocks, dtype=bool)
+
+        last_close = np.full(n_stocks, np.nan)
+        equity = np.empty(n_bars)
+        trades: List[Dict[str, Any]] = []
+        stats = {'blocked_limit_up': 0, 'blocked_limit_down': 0, 'blocked_t1': 0,
+                 'blocked_suspended': 0, 'skipped_no_slot': 0, 'skipped_no_cash': 0}
+
+        signals = np.nan_to_num(np.asarray(signals, dtype=np.float64), nan=0.0)
+
+        for t in range(n_bars):
+            opens = bars.open[t]
+            tradable = ~np.isnan(opens) & (np.nan_to_num(bars.volume[t]) > 0)
+
+            if t > 0:
+                # 除权除息：股数按系数折算，市值和成本总额保持连续
+                ratio = bars.ex_ratio[t]
+                shares *= ratio
+                last_close /= ratio
+
+                previous = signals[t - 1]
+                held = shares > 0
+
+                # 卖出
+                pending_sell |= (previous < 0) & held
+                if pending_sell.any():
+                    t1_ok = bars.bar_days[entry_bar] < bars.bar_days[t]
+                    # 没有昨收（首个交易日）时不限制
+                    above_limit = ~(opens <= bars.down_limit[t] + eps)
+                    sell = pending_sell & tradable & t1_ok & above_limit
+
+                    stats['blocked_suspended'] += int((pending_sell & ~tradable).sum())
+                    stats['blocked_t1'] += int((pending_sell & tradable & ~t1_ok).sum())
+                    stats['blocked_limit_down'] += int((pending_sell & tradable & t1_ok & ~above_limit).sum())
+
+                    idx = np.flatnonzero(sell)
+                    if len(idx):
+                        price = np.fmax(opens[idx] * (1 - self.slippage), bars.down_limit[t, idx])
+                        amount = shares[idx] * price
+                        proceeds = amount - self._commission(amount) - amount * self.stamp_duty
+                        profit = proceeds - cost_basis[idx]
+                        cash += float(proceeds.sum())
+
+                        for j, k in enumerate(idx):
+                            trades.append({
+                                'stock': int(k), 'signal_bar': t - 1, 'bar': t, 'side': 'SELL',
+                                'price': float(price[j]), 'shares': float(shares[k]),
+                                'strength': float(previous[k]),
+                                'profit_loss': float(profit[j]),
+                                'profit_loss_pct': float(profit[j] / cost_basis[k] * 100),
+                                'holding_bars': int(t - entry_bar[k]),
+                                'holding_days': int(bars.bar_days[t] - bars.bar_days[entry_bar[k]])
+                            })
+
+                        shares[idx] = 0
+                        cost_basis[idx] = 0
+                        entry_bar[idx] = -1
+                        pending_sell[idx] = False
+
+                # 买入
+                wants = (previous > 0) & (shares == 0)
+                if wants.any():
+                    below_limit = ~(opens >= bars.up_limit[t] - eps)
+                    stats['blocked_suspended'] += int((wants & ~tradable).sum())
+                    stats['blocked_limit_up'] += int((wants & tradable & ~below_limit).sum())
+
+                    candidates = np.flatnonzero(wants & tradable & below_limit)
+                    free_slots = self.max_positions - int((shares > 0).sum())
+                    # 信号强度高的优先
+                    candidates = candidates[np.argsort(-previous[candidates], kind='stable')]
+                    stats['skipped_no_slot'] += max(len(candidates) - max(free_slots, 0), 0)
+                    candidates = candidates[:max(free_slots, 0)]
+
+                    if len(candidates):
+                        portfolio = cash + float(np.nansum(shares * last_close))
+                        budget = portfolio / self.max_positions
+                        price = np.fmin(opens[candidates] * (1 + self.slippage), bars.up_limit[t, candidates])
+                        lots = np.floor(budget / (price * self.lot_size * (1 + self.commission_rate)))
+                        amount = lots * self.lot_size * price
+                        cost = amount + self._commission(amount)
+
+                        # 按优先级依次占用现金，不足一手或现金不足的跳过
+                        affordable = (lots > 0) & (np.cumsum(np.where(lots > 0, cost, 0.0)) <= cash)
+                        stats['skipped_no_cash'] += int((~affordable).sum())
+
+                        idx = candidates[affordable]
+                        shares[idx] = lots[affordable] * self.lot_size
+                        cost_basis[idx] = cost[affordable]
+                        entry_bar[idx] = t
+                        cash -= float(cost[affordable].sum())
+
+                        for j, k in zip(np.flatnonzero(affordable), idx):
+                            trades.append({
+                                'stock': int(k), 'signal_bar': t - 1, 'bar': t, 'side': 'BUY',
+                                'price': float(price[j]), 'shares': float(shares[k]),
+                                'strength': float(previous[k])
+                            })
+
+            closes = bars.close[t]
+            last_close = np.where(np.isnan(closes), last_close, closes)
+            equity[t] = cash + float(np.nansum(shares * last_close))
+
+        positions = [{
+            'ts_code': bars.ts_codes[k],
+            'shares': float(shares[k]),
+            'cost': float(cost_basis[k]),
+            'market_value': float(shares[k] * last_close[k]),
+            'entry_time': bars.times[entry_bar[k]].isoformat()
+        } for k in np.flatnonzero(shares > 0)]
+
+        return {'equity': equity, 'trades': trades, 'positions': positions, 'cash': cash, 'stats': stats}
+
+    # ---------- 绩效 ----------
+
+    def performance(self, bars: BarPanel, equity: np.ndarray, trades: List[Dict[str, Any]]) -> Dict[str, Any]:
+        periods_per_year = self.TRADING_DAYS_PER_YEAR * self.PERIODS_PER_DAY.get(bars.period_type, 1)
+        returns = np.diff(equity) / equity[:-1]
+
+        total_return = equity[-1] / self.initial_capital - 1
+        annual_return = (1 + total_return) ** (periods_per_year / max(len(equity), 1)) - 1
+        drawdown = 1 - equity / np.maximum.accumulate(equity)
+        volatility = returns.std(ddof=1) if len(returns) > 1 else 0.0
+
+        closed = [trade for trade in trades if trade['side'] == 'SELL']
+        profits = np.array([trade['profit_loss'] for trade in closed])
+
+        return {
+            'initial_capital': self.initial_capital,
+            'final_equity': float(equity[-1]),
+            'total_return': float(total_return * 100),
+            'annual_return': float(annual_return * 100),
+            'max_drawdown': float(drawdown.max() * 100),
+            'sharpe_ratio': float(returns.mean() / volatility * np.sqrt(periods_per_year)) if volatility > 0 else 0.0,
+            'trade_count': len(trades),
+            'closed_trades': len(closed),
+            'win_rate': float((profits > 0).mean() * 100) if len(profits) else 0.0,
+            'total_profit_loss': float(profits.sum()) if len(profits) else 0.0,
+            'avg_holding_days': float(np.mean([trade['holding_days'] for trade in closed])) if closed else 0.0
+        }
+
+    # ---------- 结果写入 ----------
+
+    def to_signal_rows(self, bars: BarPanel, strategy: BacktestStrategy, trades: List[Dict[str, Any]],
+                       run_id: str) -> List[Dict[str, Any]]:
+        """成交记录转为 TradingSignal 行（策略名加 backtest: 前缀，与实盘信号区分）"""
+        strategy_params = json.dumps({**strategy.params, 'backtest_id': run_id}, ensure_ascii=False)
+        indicators_used = json.dumps(strategy.indicators, ensure_ascii=False)
+        now = datetime.now()
+
+        rows = []
+        for trade in trades:
+            k = trade['stock']
+            signal_time = bars.times[trade['signal_bar']].to_pydatetime()
+            strength = float(np.clip(trade['strength'], -1.0, 1.0))
+            rows.append({
+                'ts_code': bars.ts_codes[k],
+                'datetime': signal_time,
+                'period_type': bars.period_type,
+                'strategy_name': f"backtest:{strategy.name}",
+                'signal_type': trade['side'],
+                'signal_strength': strength,
+                'confidence': abs(strength),
+                'trigger_price': float(bars.close[trade['signal_bar'], k]),
+                'strategy_params': strategy_params,
+                'indicators_used': indicators_used,
+                'status': 'EXECUTED',
+                'executed_price': trade['price'],
+                'executed_time': bars.times[trade['bar']].to_pydatetime(),
+                'profit_loss': trade.get('profit_loss'),
+                'profit_loss_pct': trade.get('profit_loss_pct'),
+                'created_at': now,
+                'updated_at': now
+            })
+        return rows
+
+    def save_signals(self, rows: List[Dict[str, Any]]) -> int:
+        """分批写入交易信号表"""
+        batch_size = Config.BACKTEST_INSERT_BATCH_SIZE
+        saved = 0
+        for start in range(0, len(rows), batch_size):
+            success, message = TradingSignal.batch_insert(rows[start:start + batch_size])
+            if not success:
+                logger.error(f"回测信号写入失败: {message}")
+                break
+            saved += len(rows[start:start + batch_size])
+        return saved
+
+    # ---------- 入口 ----------
+
+    def run(self, strategy: BacktestStrategy, start_date: date, end_date: date,
+            ts_codes: Optional[List[str]] = None, period_type: str = 'daily',
+            persist: bool = False) -> Dict[str, Any]:
+        """
+        运行回测
+
+        Args:
+            strategy: 策略实例
+            start_date / end_date: 回测区间
+            ts_codes: 股票范围，默认全市场
+            period_type: 'daily' 使用日线，其余为分钟线周期（1min、5min等）
+            persist: 是否把成交写入交易信号表
+        """
+        run_id = uuid.uuid4().hex[:12]
+        timings = {}
+
+        start = time.perf_counter()
+        bars = self.load_bars(start_date, end_date, ts_codes, period_type)
+        timings['load'] = time.perf_counter() - start
+        if bars is None:
+            return {'success': False, 'message': '回测区间内没有行情数据'}
+
+        start = time.perf_counter()
+        signals = strategy.generate_signals(bars)
+        timings['signals'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = self.simulate(bars, signals)
+        timings['simulate'] = time.perf_counter() - start
+
+        saved = 0
+        if persist and result['trades']:
+            start = time.perf_counter()
+            saved = self.save_signals(self.to_signal_rows(bars, strategy, result['trades'], run_id))
+            timings['persist'] = time.perf_counter() - start
+
+        logger.info(f"回测完成 {run_id}: {strategy.name}, {bars.shape[0]} 根K线 x {bars.shape[1]} 只股票, "
+                    f"成交 {len(result['trades'])} 笔, 耗时 "
+                    + ', '.join(f"{key} {value:.2f}s" for key, value in timings.items()))
+
+        return {
+            'success': True,
+            'backtest_id': run_id,
+            'strategy': strategy.name,
+            'params': strategy.params,
+            'period_type': period_type,
+            'start_date': str(bars.trade_dates[0].date()),
+            'end_date': str(bars.trade_dates[-1].date()),
+            'bars': bars.shape[0],
+            'stocks': bars.shape[1],
+            'performance': self.performance(bars, result['equity'], result['trades']),
+            'execution_stats': result['stats'],
+            'positions': result['positions'],
+            'equity_curve': [
+                {'time': bar_time.isoformat(), 'equity': float(value)}
+                for bar_time, value in zip(bars.times, result['equity'])
+            ],
+            'saved_signals': saved,
+            'timings': {key: round(value, 3) for key, value in timings.items()}
+        }
+
+
+def create_backtest_engine(**overrides) -> BacktestEngine:
+    """按配置创建回测引擎"""
+    params = {
+        'initial_capital': Config.BACKTEST_INITIAL_CAPITAL,
+        'max_positions': Config.BACKTEST_MAX_POSITIONS,
+        'commission_rate': Config.BACKTEST_COMMISSION_RATE,
+        'min_commission': Config.BACKTEST_MIN_COMMISSION,
+        'stamp_duty': Config.BACKTEST_STAMP_DUTY,
+        'slippage': Config.BACKTEST_SLIPPAGE,
+        'lot_size': Config.BACKTEST_LOT_SIZE
+    }
+    params.update({key: value for key, value in overrides.items() if value is not None})
+    return BacktestEngine(**params)
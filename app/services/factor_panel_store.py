@@ -0,0 +1,242 @@
+"""
+因子面板
+FactorValues 的Z分数与日收益率按交易日追加到内存映射面板，
+多日打分和滚动Rank IC直接切片面板计算，不再逐日查询数据库。
+首次回填由 `python sync_stock_data.py --factor-panel` 完成，之后打分遇到新交易日时自动追加
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.extensions import db
+from app.models.stock_daily_history import StockDailyHistory
+from app.services.panel_store import DateLike, PanelStore, compound_forward_returns, date_key
+from config import Config
+
+
+class FactorPanelStore(PanelStore):
+    """因子面板：每个因子一个字段，另有日收益率字段用于计算远期收益"""
+
+    RETURN_FIELD = 'daily_return'
+
+    def __init__(self, root_dir: str, history_days: int = 250, min_stocks: int = 30):
+        """
+        Args:
+            root_dir: 存储目录
+            history_days: 面板为空时首次同步的交易日数
+            min_stocks: 计算单日IC所需的最少有效股票数
+        """
+        # 使用float64，与数据库路径的打分结果保持一致
+        super().__init__(root_dir, dtype='float64')
+        self.history_days = history_days
+        self.min_stocks = min_stocks
+        self._sync_lock = threading.Lock()
+
+    @property
+    def factor_ids(self) -> List[str]:
+        return [field for field in self.fields if field != self.RETURN_FIELD]
+
+    # ---------- 同步 ----------
+
+    def sync(self, start_date: Optional[DateLike] = None, end_date: Optional[DateLike] = None) -> int:
+        """
+        追加面板中尚未包含的交易日
+
+        因子数据来自 FactorValues 模型，该模型需在 app.models 中导出后才能同步；
+        面板的读取和IC计算不依赖它
+
+        Returns:
+            新写入的交易日数
+        """
+        from app.models import FactorValues
+
+        query = db.session.query(FactorValues.trade_date).distinct()
+
+        last_date = self.last_date()
+        if last_date:
+            query = query.filter(FactorValues.trade_date > last_date)
+        elif start_date:
+            query = query.filter(FactorValues.trade_date >= date_key(start_date))
+        if end_date:
+            query = query.filter(FactorValues.trade_date <= date_key(end_date))
+
+        if last_date or start_date:
+            trade_dates = [row[0] for row in query.order_by(FactorValues.trade_date).all()]
+        else:
+            # 首次同步只取最近 history_days 个交易日
+            rows = query.order_by(FactorValues.trade_date.desc()).limit(self.history_days).all()
+            trade_dates = sorted(row[0] for row in rows)
+
+        for trade_date in trade_dates:
+            self.write(trade_date, self._load_cross_section(trade_date))
+
+        if trade_dates:
+            logger.info(f"因子面板同步完成: 新增 {len(trade_dates)} 个交易日, "
+                        f"最新 {self.last_date()}, {len(self.codes)} 只股票, {len(self.factor_ids)} 个因子")
+        return len(trade_dates)
+
+    @staticmethod
+    def source_available() -> bool:
+        """FactorValues 模型是否可用"""
+        try:
+            from app.models import FactorValues
+        except ImportError:
+            return False
+        return FactorValues is not None
+
+    def sync_if_available(self, start_date: Optional[DateLike] = None,
+                          end_date: Optional[DateLike] = None) -> Optional[int]:
+        """FactorValues 模型可用时同步，否则记录日志并跳过（返回None）"""
+        if not self.source_available():
+            logger.warning("未找到 FactorValues 模型，跳过因子面板同步")
+            return None
+        return self.sync(start_date, end_date)
+
+    def catch_up(self, trade_date: DateLike) -> int:
+        """
+        面板已回填且 trade_date 晚于最新交易日时追加新交易日（只查询新增日期，不重复回填）
+
+        已有线程在同步时直接返回0，调用方继续走数据库路径
+        """
+        last_date = self.last_date()
+        if not last_date or date_key(trade_date) <= last_date:
+            return 0
+        if not self._sync_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self.sync_if_available(end_date=trade_date) or 0
+        except Exception as e:
+            logger.error(f"因子面板追加失败: {trade_date}, 错误: {e}")
+            return 0
+        finally:
+            self._sync_lock.release()
+
+    def _load_cross_section(self, trade_date) -> pd.DataFrame:
+        """读取一个交易日的因子Z分数和日收益率"""
+        from app.models import FactorValues
+
+        factor_query = FactorValues.query.with_entities(
+            FactorValues.ts_code, FactorValues.factor_id, FactorValues.z_score
+        ).filter(FactorValues.trade_date == trade_date)
+        factor_data = pd.read_sql(factor_query.statement, db.engine)
+
+        # 同一格有多条记录时取第一条非空值
+        factor_data = factor_data.dropna(subset=['z_score']).drop_duplicates(['ts_code', 'factor_id'])
+        frame = factor_data.pivot(index='ts_code', columns='factor_id', values='z_score').astype(float)
+
+        return_query = StockDailyHistory.query.with_entities(
+            StockDailyHistory.ts_code, StockDailyHistory.pct_chg
+        ).filter(StockDailyHistory.trade_date == trade_date)
+        returns = pd.read_sql(return_query.statement, db.engine).set_index('ts_code')['pct_chg']
+
+        frame = frame.reindex(frame.index.union(returns.index))
+        frame[self.RETURN_FIELD] = returns.astype(float) / 100
+        return frame
+
+    # ---------- 截面 ----------
+
+    def get_factor_cross_section(self, trade_date: DateLike, factor_ids: Optional[List[str]] = None,
+                                 ts_codes: Optional[List[str]] = None) -> pd.DataFrame:
+        """某个交易日的 股票×因子 截面（按代码和因子排序，全空的行和列被去掉）"""
+        frame = self.get_cross_section(trade_date, factor_ids or self.factor_ids)
+        if frame.empty:
+            return frame
+        if ts_codes:
+            frame = frame[frame.index.isin(ts_codes)]
+        return frame.dropna(how='all').sort_index().sort_index(axis=1)
+
+    # ---------- Rank IC ----------
+
+    def forward_returns(self, row_start: int, row_end: int, horizon: int = 1) -> np.ndarray:
+        """
+        行号区间内每个交易日之后 horizon 日的累计收益（T日因子对应 T+1..T+horizon 的收益），
+        区间内任一日收益缺失或超出面板末尾时为NaN
+        """
+        available_end = min(row_end + horizon, len(self.dates))
+        returns = self.get_rows(self.RETURN_FIELD, row_start, available_end)
+        result = np.full((row_end - row_start, returns.shape[1]), np.nan)
+        forward = compound_forward_returns(returns, horizon)
+        result[:len(forward)] = forward[:row_end - row_start]
+        return result
+
+    def rank_correlation(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """逐行Spearman秩相关（只用两者都有效的股票，有效数不足 min_stocks 时为NaN）"""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        valid = ~np.isnan(x) & ~np.isnan(y)
+        x = np.where(valid, x, np.nan)
+        y = np.where(valid, y, np.nan)
+
+        x_rank = pd.DataFrame(x).rank(axis=1).to_numpy()
+        y_rank = pd.DataFrame(y).rank(axis=1).to_numpy()
+
+        counts = valid.sum(axis=1, keepdims=True)
+        with np.errstate(all='ignore'):
+            x_centered = x_rank - np.nansum(x_rank, axis=1, keepdims=True) / counts
+            y_centered = y_rank - np.nansum(y_rank, axis=1, keepdims=True) / counts
+            covariance = np.nansum(x_centered * y_centered, axis=1)
+            scale = np.sqrt(np.nansum(x_centered ** 2, axis=1) * np.nansum(y_centered ** 2, axis=1))
+            ic = covariance / scale
+
+        ic[(counts[:, 0] < self.min_stocks) | ~np.isfinite(ic)] = np.nan
+        return ic
+
+    def _rank_ic_rows(self, factor_id: str, row_start: int, row_end: int, horizon: int) -> np.ndarray:
+        factors = self.get_rows(factor_id, row_start, row_end)
+        return self.rank_correlation(factors, self.forward_returns(row_start, row_end, horizon))
+
+    def rank_ic(self, factor_id: str, start: Optional[DateLike] = None, end: Optional[DateLike] = None,
+                horizon: int = 1) -> pd.Series:
+        """因子在日期区间内每日的Rank IC（远期收益尚未实现的交易日为NaN）"""
+        row_start, row_end = self.date_range(start, end)
+        ic = self._rank_ic_rows(factor_id, row_start, row_end, horizon)
+        return pd.Series(ic, index=pd.Index(self.dates[row_start:row_end], name='trade_date'), name=factor_id)
+
+    def ic_weights(self, factor_ids: List[str], trade_date: DateLike, window: int = 20,
+                   horizon: int = 1, method: str = 'ic') -> Dict[str, float]:
+        """
+        截至 trade_date 的滚动Rank IC权重
+
+        只使用远期收益在 trade_date 当日或之前已经实现的IC，避免未来数据；
+        method 为 'ic' 时权重为IC均值，'icir' 时为IC均值/IC标准差。
+        权重带符号（负IC因子反向使用），按绝对值之和归一化；数据不足时返回空字典
+        """
+        _, end_row = self.date_range(None, trade_date)
+        row_end = end_row - horizon
+        row_start = max(0, row_end - window)
+        if row_end - row_start < 2:
+            return {}
+
+        raw_weights = {}
+        for factor_id in factor_ids:
+            if factor_id not in self.fields:
+                continue
+            ic = self._rank_ic_rows(factor_id, row_start, row_end, horizon)
+            ic = ic[~np.isnan(ic)]
+            if len(ic) < 2:
+                continue
+
+            if method == 'icir':
+                std = ic.std(ddof=1)
+                if not std > 0:
+                    continue
+                raw_weights[factor_id] = float(ic.mean() / std)
+            else:
+                raw_weights[factor_id] = float(ic.mean())
+
+        total = sum(abs(weight) for weight in raw_weights.values())
+        if not total > 0:
+            return {}
+        return {factor_id: weight / total for factor_id, weight in raw_weights.items()}
+
+
+# 全局因子面板实例
+factor_panel_store = FactorPanelStore(
+    Config.FACTOR_PANEL_DIR,
+    history_days=Config.FACTOR_PANEL_HISTORY_DAYS,
+    min_stocks=Config.FACTOR_IC_MIN_STOCKS
+)
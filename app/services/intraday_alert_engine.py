@@ -0,0 +1,406 @@
+"""
+盘中预警引擎
+消费新同步的分钟K线，增量维护每只股票的盘中状态（累计成交量、VWAP、相对昨收涨跌幅），
+每根K线只评估该股票自身的规则
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time as dt_time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func
+
+from app.extensions import db
+from app.models.stock_basic import StockBasic
+from app.models.stock_daily_basic import StockDailyBasic
+from app.models.stock_daily_history import StockDailyHistory
+from app.services.alert_trigger_engine import AlertSweepBatch, alert_trigger_engine
+
+logger = logging.getLogger(__name__)
+
+
+# A股连续竞价时段
+MORNING_OPEN = dt_time(9, 30)
+MORNING_CLOSE = dt_time(11, 30)
+AFTERNOON_OPEN = dt_time(13, 0)
+AFTERNOON_CLOSE = dt_time(15, 0)
+TRADING_MINUTES = 240
+
+
+def trading_minutes_elapsed(bar_time: datetime) -> int:
+    """开盘到bar_time为止的连续竞价分钟数"""
+    minutes = bar_time.hour * 60 + bar_time.minute
+
+    morning_open = MORNING_OPEN.hour * 60 + MORNING_OPEN.minute
+    morning_close = MORNING_CLOSE.hour * 60 + MORNING_CLOSE.minute
+    afternoon_open = AFTERNOON_OPEN.hour * 60 + AFTERNOON_OPEN.minute
+    afternoon_close = AFTERNOON_CLOSE.hour * 60 + AFTERNOON_CLOSE.minute
+
+    if minutes <= morning_open:
+        return 0
+    if minutes <= morning_close:
+        return minutes - morning_open
+    if minutes <= afternoon_open:
+        return morning_close - morning_open
+    return (morning_close - morning_open) + (min(minutes, afternoon_close) - afternoon_open)
+
+
+def _get_anomaly_value(ts_code: str, metric: str) -> Optional[float]:
+    """盘中异动指标（需先开始盘中异动检测会话）"""
+    # 延迟导入避免循环依赖
+    from app.services.anomaly_detection_engine import anomaly_detection_engine
+    return anomaly_detection_engine.get_value(ts_code, metric)
+
+
+class IntradayState:
+    """单只股票的盘中累计状态，每根K线O(1)更新"""
+
+    __slots__ = (
+        'ts_code', 'pre_close', 'avg_daily_volume', 'float_share', 'total_mv', 'basic_close',
+        'open', 'high', 'low', 'last_price', 'cum_volume', 'cum_amount',
+        'bar_count', 'last_bar_time'
+    )
+
+    def __init__(self, ts_code: str, pre_close: Optional[float] = None,
+                 avg_daily_volume: Optional[float] = None, float_share: Optional[float] = None,
+                 total_mv: Optional[float] = None, basic_close: Optional[float] = None):
+        self.ts_code = ts_code
+        self.pre_close = pre_close
+        self.avg_daily_volume = avg_daily_volume  # 近5日平均成交量（股）
+        self.float_share = float_share            # 流通股本（股）
+        self.total_mv = total_mv                  # 上一交易日总市值（万元）
+        self.basic_close = basic_close            # 总市值对应的收盘价
+
+        self.open = None
+        self.high = None
+        self.low = None
+        self.last_price = None
+        self.cum_volume = 0.0
+        self.cum_amount = 0.0
+        self.bar_count = 0
+        self.last_bar_time = None
+
+    def update(self, bar: Dict[str, Any]):
+        """累加一根K线"""
+        close = float(bar['close'])
+        high = float(bar.get('high') or close)
+        low = float(bar.get('low') or close)
+
+        if self.open is None:
+            self.open = float(bar.get('open') or close)
+            self.high = high
+            self.low = low
+        else:
+            self.high = max(self.high, high)
+            self.low = min(self.low, low)
+
+        self.last_price = close
+        self.cum_volume += float(bar.get('volume') or 0)
+        self.cum_amount += float(bar.get('amount') or 0)
+        self.bar_count += 1
+        self.last_bar_time = bar['datetime']
+
+    @property
+    def vwap(self) -> Optional[float]:
+        """成交量加权均价"""
+        if self.cum_volume > 0:
+            return self.cum_amount / self.cum_volume
+        return None
+
+    @property
+    def pct_change(self) -> Optional[float]:
+        """相对昨收的涨跌幅(%)"""
+        if self.pre_close and self.last_price is not None:
+            return round((self.last_price - self.pre_close) / self.pre_close * 100, 4)
+        return None
+
+    @property
+    def volume_ratio(self) -> Optional[float]:
+        """量比：当前每分钟成交量 / 近5日每分钟平均成交量"""
+        minutes = trading_minutes_elapsed(self.last_bar_time) if self.last_bar_time else 0
+        if minutes <= 0 or not self.avg_daily_volume:
+            return None
+        return round((self.cum_volume / minutes) / (self.avg_daily_volume / TRADING_MINUTES), 4)
+
+    @property
+    def turnover_rate(self) -> Optional[float]:
+        """换手率(%)"""
+        if not self.float_share:
+            return None
+        return round(self.cum_volume / self.float_share * 100, 4)
+
+    @property
+    def market_value(self) -> Optional[float]:
+        """按最新价估算的总市值（万元）"""
+        if not self.total_mv or not self.basic_close or self.last_price is None:
+            return None
+        return round(self.total_mv * self.last_price / self.basic_close, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'ts_code': self.ts_code,
+            'pre_close': self.pre_close,
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'last_price': self.last_price,
+            'cum_volume': self.cum_volume,
+            'cum_amount': self.cum_amount,
+            'vwap': self.vwap,
+            'pct_change': self.pct_change,
+            'volume_ratio': self.volume_ratio,
+            'turnover_rate': self.turnover_rate,
+            'bar_count': self.bar_count,
+            'last_bar_time': self.last_bar_time.isoformat() if self.last_bar_time else None
+        }
+
+
+class IntradayAlertEngine:
+    """盘中预警引擎"""
+
+    # 规则类型 -> 盘中状态取值（PE、资金流向等只有日终数据的规则不在盘中评估）
+    VALUE_GETTERS = {
+        'price_threshold': lambda state: state.last_price,
+        'price_change_pct': lambda state: state.pct_change,
+        'volume_ratio': lambda state: state.volume_ratio,
+        'turnover_rate': lambda state: state.turnover_rate,
+        'market_value': lambda state: state.market_value,
+        'price_zscore': lambda state: _get_anomaly_value(state.ts_code, 'zscore'),
+        'volume_spike': lambda state: _get_anomaly_value(state.ts_code, 'volume_spike')
+    }
+
+    # 近N日平均成交量用于计算量比
+    VOLUME_LOOKBACK_DAYS = 5
+
+    def __init__(self, trigger_engine=alert_trigger_engine):
+        self.trigger_engine = trigger_engine
+
+        self.is_active = False
+        self.trade_date = None
+        self.period_type = None
+
+        self.states: Dict[str, IntradayState] = {}
+        self.ts_codes: Set[str] = set()
+        self.stock_names: Dict[str, str] = {}
+
+        self.stats = defaultdict(int)
+
+    def start_session(self, trade_date: Optional[date] = None, period_type: str = '5min') -> Dict[str, Any]:
+        """
+        开始一个交易日的盘中评估，批量加载规则和昨日基准数据
+
+        Args:
+            trade_date: 交易日，默认今天
+            period_type: 消费的K线周期（只消费一种周期，避免重复累计成交量）
+        """
+        self.trade_date = trade_date or datetime.now().date()
+        self.period_type = period_type
+        self.states = {}
+        self.stats = defaultdict(int)
+
+        self.reload_rules()
+        self._load_baselines(list(self.ts_codes))
+        self.trigger_engine.dedup_index.warm(list(self.ts_codes))
+
+        self.is_active = True
+        logger.info(f"盘中预警会话开始: {self.trade_date} {period_type}, "
+                    f"股票 {len(self.ts_codes)} 只")
+        return self.get_status()
+
+    def stop_session(self):
+        """结束盘中评估"""
+        self.is_active = False
+        logger.info(f"盘中预警会话结束: {self.trade_date}, 统计: {dict(self.stats)}")
+
+    def reload_rules(self):
+        """刷新规则索引，更新存在盘中可评估规则的股票"""
+        rule_index = self.trigger_engine.rule_index
+        rule_index.ensure_fresh()
+        self.ts_codes = set(rule_index.get_ts_codes(rule_types=self.VALUE_GETTERS.keys()))
+
+        new_codes = [ts_code for ts_code in self.ts_codes if ts_code not in self.stock_names]
+        if new_codes:
+            self.stock_names.update(dict(
+                db.session.query(StockBasic.ts_code, StockBasic.name)
+                .filter(StockBasic.ts_code.in_(new_codes)).all()
+            ))
+
+        # 会话中途新增规则的股票补充基准数据
+        if self.is_active:
+            missing = [ts_code for ts_code in self.ts_codes if ts_code not in self.states]
+            if missing:
+                self._load_baselines(missing)
+
+    def _load_baselines(self, ts_codes: List[str]):
+        """批量加载昨收、近5日均量、流通股本和总市值"""
+        if not ts_codes:
+            return
+
+        # 最近N个交易日
+        trade_dates = [
+            row[0] for row in db.session.query(StockDailyHistory.trade_date)
+            .filter(StockDailyHistory.trade_date < self.trade_date)
+            .distinct()
+            .order_by(StockDailyHistory.trade_date.desc())
+            .limit(self.VOLUME_LOOKBACK_DAYS)
+            .all()
+        ]
+
+        pre_close = {}
+        volumes = defaultdict(list)
+        if trade_dates:
+            latest_date = trade_dates[0]
+            rows = db.session.query(
+                StockDailyHistory.ts_code,
+                StockDailyHistory.trade_date,
+                StockDailyHistory.close,
+                StockDailyHistory.vol
+            ).filter(
+                StockDailyHistory.ts_code.in_(ts_codes),
+                StockDailyHistory.trade_date.in_(trade_dates)
+            ).all()
+
+            for row in rows:
+                if row.trade_date == latest_date and row.close is not None:
+                    pre_close[row.ts_code] = float(row.close)
+                if row.vol:
+                    # 日线成交量单位为手，分钟线为股
+                    volumes[row.ts_code].append(float(row.vol) * 100)
+
+        basics = {}
+        latest_basic_date = db.session.query(func.max(StockDailyBasic.trade_date)).filter(
+            StockDailyBasic.trade_date < self.trade_date
+        ).scalar()
+        if latest_basic_date:
+            rows = db.session.query(
+                StockDailyBasic.ts_code,
+                StockDailyBasic.close,
+                StockDailyBasic.float_share,
+                StockDailyBasic.total_mv
+            ).filter(
+                StockDailyBasic.ts_code.in_(ts_codes),
+                StockDailyBasic.trade_date == latest_basic_date
+            ).all()
+            basics = {row.ts_code: row for row in rows}
+
+        for ts_code in ts_codes:
+            basic = basics.get(ts_code)
+            vols = volumes.get(ts_code)
+            self.states[ts_code] = IntradayState(
+                ts_code,
+                pre_close=pre_close.get(ts_code),
+                avg_daily_volume=sum(vols) / len(vols) if vols else None,
+                # 流通股本单位为万股
+                float_share=float(basic.float_share) * 10000 if basic and basic.float_share else None,
+                total_mv=float(basic.total_mv) if basic and basic.total_mv else None,
+                basic_close=float(basic.close) if basic and basic.close else None
+            )
+
+    def on_bar(self, bar: Dict[str, Any], batch: AlertSweepBatch) -> int:
+        """
+        处理一根新K线：更新该股票的盘中状态并评估其规则
+
+        Returns:
+            新产生的预警数量
+        """
+        ts_code = bar.get('ts_code')
+        if ts_code not in self.ts_codes:
+            return 0
+
+        bar_time = bar.get('datetime')
+        if not bar_time or bar_time.date() != self.trade_date:
+            return 0
+        if self.period_type and bar.get('period_type', self.period_type) != self.period_type:
+            return 0
+
+        state = self.states.get(ts_code)
+        if state is None:
+            state = self.states[ts_code] = IntradayState(ts_code)
+
+        # 同步服务会重复提交已处理过的K线，只消费更新的K线
+        if state.last_bar_time is not None and bar_time <= state.last_bar_time:
+            return 0
+
+        state.update(bar)
+        self.stats['bars'] += 1
+
+        stock_data = {
+            'ts_code': ts_code,
+            'name': self.stock_names.get(ts_code),
+            'intraday_state': state
+        }
+
+        rule_index = self.trigger_engine.rule_index
+        new_alerts = 0
+        for rule_type in rule_index.get_rule_types(ts_code):
+            value_getter = self.VALUE_GETTERS.get(rule_type)
+            if value_getter is None:
+                continue
+
+            current_value = value_getter(state)
+            if current_value is None:
+                continue
+
+            self.stats['evaluations'] += rule_index.count_rules(ts_code, [rule_type])
+
+            for rule in rule_index.match(ts_code, rule_type, current_value):
+                self.stats['triggered'] += 1
+                if not self.trigger_engine._should_create_alert(rule, current_value):
+                    continue
+
+                result = {'triggered': True, 'current_value': current_value}
+                alert_data = self.trigger_engine._create_alert_record(
+                    rule, result, stock_data, batch, current_price=state.last_price
+                )
+                if alert_data:
+                    new_alerts += 1
+                    logger.info(f"盘中触发预警: {rule.rule_name} - {alert_data['alert_message']}")
+
+        self.stats['new_alerts'] += new_alerts
+        return new_alerts
+
+    def on_bars(self, bars: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """按时间顺序处理一批新K线，产生的预警在批次结束时统一写入"""
+        if not self.is_active:
+            return {'bars': 0, 'new_alerts': 0}
+
+        batch = AlertSweepBatch()
+        processed = 0
+        new_alerts = 0
+
+        for bar in sorted(bars, key=lambda item: item['datetime']):
+            try:
+                before = self.stats['bars']
+                new_alerts += self.on_bar(bar, batch)
+                processed += self.stats['bars'] - before
+            except Exception as e:
+                logger.error(f"盘中预警处理K线失败: {bar.get('ts_code')} {bar.get('datetime')} - {e}")
+
+        if len(batch):
+            batch.flush()
+
+        return {'bars': processed, 'new_alerts': new_alerts}
+
+    def get_state(self, ts_code: str) -> Optional[Dict[str, Any]]:
+        """获取单只股票的盘中状态"""
+        state = self.states.get(ts_code)
+        return state.to_dict() if state else None
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取引擎状态"""
+        return {
+            'is_active': self.is_active,
+            'trade_date': self.trade_date.isoformat() if self.trade_date else None,
+            'period_type': self.period_type,
+            'stock_count': len(self.ts_codes),
+            'rule_count': sum(
+                self.trigger_engine.rule_index.count_rules(ts_code, self.VALUE_GETTERS.keys())
+                for ts_code in self.ts_codes
+            ),
+            'stats': dict(self.stats)
+        }
+
+
+# 全局实例
+intraday_alert_engine = IntradayAlertEngine()
@@ -3,31 +3,191 @@
 支持本地ollama和OpenAI等多种大模型提供商
 """
 
+import hashlib
 import json
+import os
+import threading
+import time
 import requests
 import logging
 from typing import Dict, List, Any, Optional
 from flask import current_app
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
 
+class LLMResponseCache:
+    """大模型回复缓存（磁盘或Redis）"""
+    
+    def __init__(self, backend: str = 'disk', cache_dir: Optional[str] = None, ttl: int = 7 * 24 * 3600):
+        """
+        Args:
+            backend: 'disk' 每个键一个JSON文件；'redis' 使用全局CacheManager；'none' 不缓存
+            cache_dir: 磁盘缓存目录
+            ttl: 过期时间（秒）
+        """
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        
+        if self.backend == 'disk':
+            os.makedirs(self.cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """请求内容的稳定哈希"""
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            if self.backend == 'disk':
+                path = self._path(key)
+                if not os.path.exists(path):
+                    return None
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                if self.ttl and time.time() - entry.get('created_at', 0) > self.ttl:
+                    os.remove(path)
+                    return None
+                return entry.get('result')
+            
+            if self.backend == 'redis':
+                from app.utils.cache import cache
+                return cache.get(f"llm:completion:{key}")
+        
+        except Exception as e:
+            logger.warning(f"读取大模型缓存失败: {e}")
+        return None
+    
+    def set(self, key: str, result: Dict[str, Any]):
+        try:
+            if self.backend == 'disk':
+                path = self._path(key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # 先写临时文件再原子替换，避免并发读到半个文件
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'created_at': time.time(), 'result': result}, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            
+            elif self.backend == 'redis':
+                from app.utils.cache import cache
+                cache.set(f"llm:completion:{key}", result, expire=self.ttl)
+        
+        except Exception as e:
+            logger.warning(f"写入大模型缓存失败: {e}")
+
+
+class _InFlightCall:
+    """正在进行的上游调用，相同请求的并发调用者等待其结果"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
 class LLMService:
     """大模型服务"""
     
-    def __init__(self):
-        self.config = current_app.config.get('LLM_CONFIG', {})
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            config: 大模型配置，默认取应用配置LLM_CONFIG（测试时可直接传入指向本地桩服务的配置）
+        """
+        self.config = config if config is not None else current_app.config.get('LLM_CONFIG', {})
         self.provider = self.config.get('provider', 'ollama')
+        
+        # 连接池复用到上游的长连接
+        pool_size = self.config.get('pool_size', 10)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        cache_config = self.config.get('cache', {})
+        self.cache = LLMResponseCache(
+            backend=cache_config.get('backend', 'none'),
+            cache_dir=cache_config.get('dir'),
+            ttl=cache_config.get('ttl', 7 * 24 * 3600)
+        )
+        
+        self._inflight: Dict[str, _InFlightCall] = {}
+        self._inflight_lock = threading.Lock()
+        self.stats = {'upstream_calls': 0, 'cache_hits': 0, 'coalesced': 0}
+        
+        # 服务状态缓存，避免每次调用前都请求一次上游
+        self.status_ttl = self.config.get('status_ttl', 30)
+        self._status = None
+        self._status_checked_at = 0.0
     
     def chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
-        """聊天完成接口"""
+        """聊天完成接口（先查缓存，相同请求并发时只调用一次上游）"""
         try:
-            if self.provider == 'ollama':
-                return self._ollama_chat(messages, **kwargs)
-            elif self.provider == 'openai':
-                return self._openai_chat(messages, **kwargs)
-            else:
+            if self.provider not in ('ollama', 'openai'):
                 raise ValueError(f"不支持的大模型提供商: {self.provider}")
+            
+            provider_config = self.config.get(self.provider, {})
+            key = LLMResponseCache.make_key({
+                'provider': self.provider,
+                'base_url': provider_config.get('base_url'),
+                'model': provider_config.get('model'),
+                'messages': messages,
+                'temperature': kwargs.get('temperature', provider_config.get('temperature')),
+                'max_tokens': kwargs.get('max_tokens', provider_config.get('max_tokens'))
+            })
+            
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.stats['cache_hits'] += 1
+                return {**cached, 'cached': True}
+            
+            with self._inflight_lock:
+                call = self._inflight.get(key)
+                is_leader = call is None
+                if is_leader:
+                    call = _InFlightCall()
+                    self._inflight[key] = call
+                    self.stats['upstream_calls'] += 1
+                else:
+                    self.stats['coalesced'] += 1
+            
+            if not is_leader:
+                if not call.done.wait(timeout=provider_config.get('timeout', 60) + 5):
+                    return {
+                        'success': False,
+                        'error': "等待相同请求的大模型结果超时",
+                        'content': None
+                    }
+                return call.result
+            
+            try:
+                if self.provider == 'ollama':
+                    result = self._ollama_chat(messages, **kwargs)
+                else:
+                    result = self._openai_chat(messages, **kwargs)
+                
+                # 只缓存成功的回复，失败的下次重试
+                if result.get('success'):
+                    self.cache.set(key, result)
+                call.result = result
+            except Exception as e:
+                call.result = {
+                    'success': False,
+                    'error': str(e),
+                    'content': None
+                }
+                raise
+            finally:
+                with self._inflight_lock:
+                    self._inflight.pop(key, None)
+                call.done.set()
+            
+            return result
         
         except Exception as e:
             logger.error(f"大模型调用失败: {e}")
@@ -55,7 +215,7 @@ class LLMService:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{base_url}/api/chat",
                 json=data,
                 timeout=ollama_config.get('timeout', 60)
@@ -123,7 +283,7 @@ class LLMService:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{base_url}/chat/completions",
                 headers=headers,
                 json=data,
@@ -266,17 +426,24 @@ stock_moneyflow表 (资金流向):
         
         return sql
     
-    def check_service_status(self) -> Dict[str, Any]:
-        """检查大模型服务状态"""
+    def check_service_status(self, force: bool = False) -> Dict[str, Any]:
+        """检查大模型服务状态（结果缓存 status_ttl 秒，force 时重新检查）"""
+        if not force and self._status is not None and time.monotonic() - self._status_checked_at < self.status_ttl:
+            return self._status
+        
         if self.provider == 'ollama':
-            return self._check_ollama_status()
+            status = self._check_ollama_status()
         elif self.provider == 'openai':
-            return self._check_openai_status()
+            status = self._check_openai_status()
         else:
-            return {
+            status = {
                 'status': 'error',
                 'message': f'不支持的提供商: {self.provider}'
             }
+        
+        self._status = status
+        self._status_checked_at = time.monotonic()
+        return status
     
     def _check_ollama_status(self) -> Dict[str, Any]:
         """检查Ollama服务状态"""
@@ -284,7 +451,7 @@ stock_moneyflow表 (资金流向):
             ollama_config = self.config.get('ollama', {})
             base_url = ollama_config.get('base_url', 'http://localhost:11434')
             
-            response = requests.get(f"{base_url}/api/tags", timeout=5)
+            response = self.session.get(f"{base_url}/api/tags", timeout=5)
             
             if response.status_code == 200:
                 models = response.json().get('models', [])
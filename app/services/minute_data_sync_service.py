@@ -12,6 +12,8 @@ from typing import List, Dict, Optional
 from app.extensions import db
 from app.models.stock_minute_data import StockMinuteData
 from app.utils.db_utils import DatabaseUtils
+from app.services.intraday_alert_engine import intraday_alert_engine
+from app.services.anomaly_detection_engine import anomaly_detection_engine
 from sqlalchemy import text
 import time
 
@@ -318,6 +320,19 @@ class MinuteDataSyncService:
             
             logger.info(f"同步{ts_code}的{period_type}数据完成，成功: {success_count}, 失败: {error_count}")
             
+            # 新K线先更新异动检测状态，再交给盘中预警引擎增量评估
+            if anomaly_detection_engine.is_active:
+                try:
+                    anomaly_detection_engine.on_bars(data_list)
+                except Exception as e:
+                    logger.error(f"盘中异动检测{ts_code}失败: {e}")
+            
+            if intraday_alert_engine.is_active:
+                try:
+                    intraday_alert_engine.on_bars(data_list)
+                except Exception as e:
+                    logger.error(f"盘中预警评估{ts_code}失败: {e}")
+            
             return {
                 'success': True,
                 'message': f'同步完成',
@@ -3,38 +3,158 @@
 负责解析用户的自然语言查询，识别意图和提取实体
 """
 
+import os
 import re
+import threading
 import jieba
 import jieba.posseg as pseg
-from typing import Dict, List, Any, Optional
+from collections import deque
+from typing import Dict, Iterable, List, Any, Optional, Set, Tuple
 from app.models.text2sql_metadata import BusinessDictionary
 from app.extensions import db
+from config import Config
+
+
+# 股票相关词汇（加入jieba词典）
+STOCK_TERMS = [
+    '股票', '涨幅', '跌幅', '收盘价', '开盘价', '最高价', '最低价',
+    '成交量', '成交额', '换手率', '市盈率', '市净率', '总市值',
+    'MACD', 'KDJ', 'RSI', '布林带', '均线', '金叉', '死叉',
+    '主力', '资金流', '净流入', '净流出', '大单', '中单', '小单',
+    'ROE', 'ROA', '营收', '利润', '负债率', '现金流'
+]
+
+_jieba_lock = threading.Lock()
+_jieba_ready = False
+
+
+def ensure_jieba():
+    """首次分词时才加载jieba词典（进程内只加载一次）
+    
+    词典前缀表缓存到 NLP_JIEBA_CACHE_FILE，之后的进程直接读取缓存文件，
+    不再从原始词典重新构建
+    """
+    global _jieba_ready
+    if _jieba_ready:
+        return
+    
+    with _jieba_lock:
+        if _jieba_ready:
+            return
+        
+        cache_file = Config.NLP_JIEBA_CACHE_FILE
+        if cache_file:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            jieba.dt.cache_file = cache_file
+        jieba.initialize()
+        
+        for term in STOCK_TERMS:
+            jieba.add_word(term)
+        
+        _jieba_ready = True
+
+
+def compile_presence_pattern(items: List[Tuple[str, bool]]) -> re.Pattern:
+    """把多个模式合并为一个正则
+    
+    每个模式对应一个可选前瞻分组，一次match即可得知每个模式是否出现在文本中
+    （与逐个re.search等价，包括相互重叠的模式）
+    
+    Args:
+        items: (模式, 是否忽略大小写) 列表，分组名依次为 p0, p1, ...
+    """
+    parts = []
+    for i, (pattern, ignore_case) in enumerate(items):
+        flags = 'i' if ignore_case else '-i'
+        parts.append(f'(?=(?:(?s:.*?)(?{flags}:(?P<p{i}>{pattern})))?)')
+    return re.compile(''.join(parts))
+
+
+def matched_indexes(compiled: re.Pattern, text: str) -> List[int]:
+    """返回 compile_presence_pattern 中出现在文本里的模式序号"""
+    match = compiled.match(text)
+    return [i for i, value in enumerate(match.groups()) if value is not None]
+
+
+class TermAutomaton:
+    """Aho–Corasick多模式匹配自动机
+    
+    由词条集合一次构建，之后对任意文本线性扫描一遍即可找出出现的全部词条，
+    耗时与词条数量无关
+    """
+    
+    def __init__(self, terms: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[str, ...]] = [()]
+        
+        for term in terms:
+            if term:
+                self._add(term)
+        self._build_fail_links()
+    
+    def _add(self, term: str):
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        if term not in self._output[state]:
+            self._output[state] += (term,)
+    
+    def _build_fail_links(self):
+        """按层次遍历计算失败指针，并把失败链上的输出合并到当前状态"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+    
+    def find_all(self, text: str) -> Set[str]:
+        """返回文本中出现的全部词条"""
+        found = set()
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
 
 
 class NLPProcessor:
     """自然语言处理器"""
     
+    WHITESPACE_PATTERN = re.compile(r'\s+')
+    PERCENT_PATTERN = re.compile(r'(\d+)%')
+    YUAN_PATTERN = re.compile(r'(\d+)元')
+    
     def __init__(self):
         self.intent_classifier = IntentClassifier()
         self.entity_extractor = EntityExtractor()
         self.business_dict = BusinessDictionaryManager()
-        
-        # 初始化jieba分词
-        self._init_jieba()
-    
-    def _init_jieba(self):
-        """初始化jieba分词器"""
-        # 添加股票相关词汇
-        stock_terms = [
-            '股票', '涨幅', '跌幅', '收盘价', '开盘价', '最高价', '最低价',
-            '成交量', '成交额', '换手率', '市盈率', '市净率', '总市值',
-            'MACD', 'KDJ', 'RSI', '布林带', '均线', '金叉', '死叉',
-            '主力', '资金流', '净流入', '净流出', '大单', '中单', '小单',
-            'ROE', 'ROA', '营收', '利润', '负债率', '现金流'
-        ]
-        
-        for term in stock_terms:
-            jieba.add_word(term)
+    
+    def tokenize(self, text: str) -> List[str]:
+        """分词（首次调用时加载jieba词典）"""
+        ensure_jieba()
+        return jieba.lcut(text)
+    
+    def tokenize_with_pos(self, text: str) -> List[Tuple[str, str]]:
+        """带词性的分词"""
+        ensure_jieba()
+        return [(word.word, word.flag) for word in pseg.cut(text)]
     
     def parse_intent(self, user_query: str) -> Dict[str, Any]:
         """解析用户意图"""
@@ -72,14 +192,14 @@ class NLPProcessor:
     def _preprocess(self, query: str) -> str:
         """预处理查询文本"""
         # 去除多余空格
-        query = re.sub(r'\s+', ' ', query.strip())
+        query = self.WHITESPACE_PATTERN.sub(' ', query.strip())
         
         # 统一标点符号
         query = query.replace('，', ',').replace('。', '.').replace('？', '?')
         
         # 统一数字格式
-        query = re.sub(r'(\d+)%', r'\1百分比', query)
-        query = re.sub(r'(\d+)元', r'\1', query)
+        query = self.PERCENT_PATTERN.sub(r'\1百分比', query)
+        query = self.YUAN_PATTERN.sub(r'\1', query)
         
         return query
 
@@ -133,25 +253,22 @@ class IntentClassifier:
                 'keywords': ['排名', '排序', '前', '最', 'top', '最高', '最低', '最大', '最小']
             }
         }
+        
+        # 每个意图的模式（忽略大小写，得2分）和关键词（区分大小写，得1分）合并为一个正则
+        self._compiled_intents = {}
+        for intent_name, intent_config in self.intent_patterns.items():
+            items = [(pattern, True) for pattern in intent_config['patterns']]
+            items += [(re.escape(keyword), False) for keyword in intent_config['keywords']]
+            weights = [2] * len(intent_config['patterns']) + [1] * len(intent_config['keywords'])
+            self._compiled_intents[intent_name] = (compile_presence_pattern(items), weights)
     
     def classify(self, query: str) -> Dict[str, Any]:
         """分类用户意图"""
         scores = {}
         
-        for intent_name, intent_config in self.intent_patterns.items():
-            score = 0
-            
-            # 模式匹配得分
-            for pattern in intent_config['patterns']:
-                if re.search(pattern, query, re.IGNORECASE):
-                    score += 2
-            
-            # 关键词匹配得分
-            for keyword in intent_config['keywords']:
-                if keyword in query:
-                    score += 1
-            
-            scores[intent_name] = score
+        for intent_name, (compiled, weights) in self._compiled_intents.items():
+            # 模式匹配和关键词匹配得分
+            scores[intent_name] = sum(weights[i] for i in matched_indexes(compiled, query))
         
         # 找到最高得分的意图
         if scores:
@@ -177,6 +294,41 @@ class IntentClassifier:
 class EntityExtractor:
     """实体抽取器"""
     
+    # 技术指标条件
+    TECHNICAL_PATTERNS = [
+        r'MACD.*金叉', r'MACD.*死叉', r'MACD.*向上', r'MACD.*向下',
+        r'RSI.*超买', r'RSI.*超卖', r'RSI.*大于', r'RSI.*小于',
+        r'KDJ.*金叉', r'KDJ.*死叉',
+        r'均线.*金叉', r'均线.*死叉', r'均线.*多头', r'均线.*空头'
+    ]
+    
+    # 字段同义词 -> 标准字段名
+    FIELD_SYNONYMS = {
+        'pe_ttm': '市盈率',
+        'PE': '市盈率',
+        'pe': '市盈率',
+        'PB': '市净率',
+        'pb': '市净率',
+        'volume_ratio': '量比',
+        'turnover_rate': '换手率',
+        'turnover_rate_f': '换手率',
+        'daily_close': '收盘价',
+        'factor_pct_change': '涨跌幅',
+        'factor_vol': '成交量',
+        'amount': '成交额',
+        '价格': '收盘价',
+        '涨幅': '涨跌幅',
+        '跌幅': '涨跌幅'
+    }
+    
+    SPLIT_PATTERN = re.compile(r'[，,]|且|和|并且|同时|以及')
+    NUMBER_PATTERN = re.compile(r'(\d+(?:\.\d+)?)')
+    SORT_PATTERN = re.compile(r'排名|排序|排列')
+    ASC_PATTERN = re.compile(r'升序|从小到大|asc')
+    DESC_PATTERN = re.compile(r'降序|从大到小|desc')
+    TOP_N_PATTERN = re.compile(r'前(\d+)(?:名|个|只|支)?')
+    TOP_EN_PATTERN = re.compile(r'top\s*(\d+)', re.IGNORECASE)
+    
     def __init__(self):
         # 数值模式
         self.number_patterns = {
@@ -219,6 +371,40 @@ class EntityExtractor:
             '成交量': 'factor_vol',
             '成交额': 'amount'
         }
+        
+        self._compile_patterns()
+    
+    def _compile_patterns(self):
+        """预编译正则"""
+        self._number_regexes = {num_type: re.compile(pattern) for num_type, pattern in self.number_patterns.items()}
+        self._comparison_types = list(self.comparison_patterns.keys())
+        self._comparison_regex = compile_presence_pattern(
+            [(pattern, False) for pattern in self.comparison_patterns.values()]
+        )
+        self._technical_regex = re.compile('|'.join(self.TECHNICAL_PATTERNS), re.IGNORECASE)
+        
+        # 字段词条 -> [(优先级, 类别)]，优先级即在 field_patterns 中的定义顺序
+        self._field_entries: Dict[str, List[Tuple[int, str]]] = {}
+        priority = 0
+        for field_category, field_list in self.field_patterns.items():
+            for field in field_list:
+                self._field_entries.setdefault(field, []).append((priority, field_category))
+                priority += 1
+        self._field_automaton = TermAutomaton(self._field_entries.keys())
+        
+        # 数据库字段 -> 标准字段名（取最先定义的）
+        self._standard_by_db_field: Dict[str, str] = {}
+        for standard_field, db_field in self.field_db_mapping.items():
+            self._standard_by_db_field.setdefault(db_field, standard_field)
+    
+    def _match_fields(self, text: str) -> List[Tuple[str, str]]:
+        """一次扫描找出文本中的字段，按定义顺序返回 (字段, 类别)"""
+        matched = []
+        for field in self._field_automaton.find_all(text):
+            for priority, field_category in self._field_entries[field]:
+                matched.append((priority, field, field_category))
+        matched.sort()
+        return [(field, field_category) for _, field, field_category in matched]
     
     def extract(self, query: str) -> Dict[str, Any]:
         """提取实体 - 支持复杂多条件查询"""
@@ -257,8 +443,7 @@ class EntityExtractor:
     def _split_conditions(self, query: str) -> List[str]:
         """分割查询条件"""
         # 使用正则表达式分割条件
-        separators = r'[，,]|且|和|并且|同时|以及'
-        conditions = re.split(separators, query)
+        conditions = self.SPLIT_PATTERN.split(query)
         
         # 清理条件
         cleaned_conditions = []
@@ -298,18 +483,7 @@ class EntityExtractor:
     
     def _is_technical_indicator_condition(self, condition: str) -> bool:
         """判断是否为技术指标条件"""
-        technical_patterns = [
-            r'MACD.*金叉', r'MACD.*死叉', r'MACD.*向上', r'MACD.*向下',
-            r'RSI.*超买', r'RSI.*超卖', r'RSI.*大于', r'RSI.*小于',
-            r'KDJ.*金叉', r'KDJ.*死叉',
-            r'均线.*金叉', r'均线.*死叉', r'均线.*多头', r'均线.*空头'
-        ]
-        
-        for pattern in technical_patterns:
-            if re.search(pattern, condition, re.IGNORECASE):
-                return True
-        
-        return False
+        return self._technical_regex.search(condition) is not None
     
     def _extract_technical_condition(self, condition: str) -> Dict[str, Any]:
         """提取技术指标条件"""
@@ -356,40 +530,40 @@ class EntityExtractor:
     
     def _extract_field_from_condition(self, condition: str) -> Optional[Dict[str, Any]]:
         """从条件中提取字段"""
-        for field_category, field_list in self.field_patterns.items():
-            for field in field_list:
-                if field in condition:
-                    # 标准化字段名
-                    standard_field = self._standardize_field_name(field)
-                    db_field = self.field_db_mapping.get(standard_field, field)
-                    
-                    return {
-                        'name': standard_field,
-                        'original': field,
-                        'category': field_category,
-                        'db_field': db_field
-                    }
-        return None
+        matched = self._match_fields(condition)
+        if not matched:
+            return None
+        
+        field, field_category = matched[0]
+        
+        # 标准化字段名
+        standard_field = self._standardize_field_name(field)
+        db_field = self.field_db_mapping.get(standard_field, field)
+        
+        return {
+            'name': standard_field,
+            'original': field,
+            'category': field_category,
+            'db_field': db_field
+        }
     
     def _extract_comparison_from_condition(self, condition: str) -> Optional[str]:
-        """从条件中提取比较操作符"""
-        for comp_type, pattern in self.comparison_patterns.items():
-            if re.search(pattern, condition):
-                return comp_type
-        return None
+        """从条件中提取比较操作符（按定义顺序取第一个出现的类型）"""
+        indexes = matched_indexes(self._comparison_regex, condition)
+        return self._comparison_types[indexes[0]] if indexes else None
     
     def _extract_value_from_condition(self, condition: str, field_category: str) -> Optional[float]:
         """从条件中提取数值"""
         # 根据字段类别选择合适的数值模式
         if field_category in ['ratio_fields', 'valuation_fields']:
             # 对于比率和估值字段，优先匹配纯数字
-            number_match = re.search(r'(\d+(?:\.\d+)?)', condition)
+            number_match = self.NUMBER_PATTERN.search(condition)
             if number_match:
                 return float(number_match.group(1))
         
         # 尝试所有数值模式
-        for num_type, pattern in self.number_patterns.items():
-            matches = re.findall(pattern, condition)
+        for num_type, regex in self._number_regexes.items():
+            matches = regex.findall(condition)
             if matches:
                 return float(matches[0])
         
@@ -402,30 +576,12 @@ class EntityExtractor:
             return field
         
         # 反向查找标准字段名
-        for standard_field, db_field in self.field_db_mapping.items():
-            if field == db_field:
-                return standard_field
+        standard_field = self._standard_by_db_field.get(field)
+        if standard_field is not None:
+            return standard_field
         
         # 同义词映射
-        field_mapping = {
-            'pe_ttm': '市盈率',
-            'PE': '市盈率',
-            'pe': '市盈率',
-            'PB': '市净率',
-            'pb': '市净率',
-            'volume_ratio': '量比',
-            'turnover_rate': '换手率',
-            'turnover_rate_f': '换手率',
-            'daily_close': '收盘价',
-            'factor_pct_change': '涨跌幅',
-            'factor_vol': '成交量',
-            'amount': '成交额',
-            '价格': '收盘价',
-            '涨幅': '涨跌幅',
-            '跌幅': '涨跌幅'
-        }
-        
-        return field_mapping.get(field, field)
+        return self.FIELD_SYNONYMS.get(field, field)
     
     def _extract_global_info(self, query: str) -> Dict[str, Any]:
         """提取全局信息（为了兼容性）"""
@@ -446,8 +602,8 @@ class EntityExtractor:
         """提取数值"""
         numbers = {}
         
-        for num_type, pattern in self.number_patterns.items():
-            matches = re.findall(pattern, query)
+        for num_type, regex in self._number_regexes.items():
+            matches = regex.findall(query)
             if matches:
                 numbers[num_type] = [float(match) for match in matches]
         
@@ -457,10 +613,9 @@ class EntityExtractor:
         """提取比较操作符"""
         comparisons = {}
         
-        for comp_type, pattern in self.comparison_patterns.items():
-            if re.search(pattern, query):
-                comparisons['comparison'] = comp_type
-                break
+        comparison = self._extract_comparison_from_condition(query)
+        if comparison:
+            comparisons['comparison'] = comparison
         
         return comparisons
     
@@ -468,15 +623,12 @@ class EntityExtractor:
         """提取字段名"""
         fields = {}
         
-        for field_category, field_list in self.field_patterns.items():
-            for field in field_list:
-                if field in query:
-                    if 'fields' not in fields:
-                        fields['fields'] = []
-                    fields['fields'].append({
-                        'name': field,
-                        'category': field_category
-                    })
+        matched = self._match_fields(query)
+        if matched:
+            fields['fields'] = [
+                {'name': field, 'category': field_category}
+                for field, field_category in matched
+            ]
         
         return fields
     
@@ -484,12 +636,12 @@ class EntityExtractor:
         """提取排序信息"""
         sorting = {}
         
-        if re.search(r'排名|排序|排列', query):
+        if self.SORT_PATTERN.search(query):
             sorting['sort'] = True
             
-            if re.search(r'升序|从小到大|asc', query):
+            if self.ASC_PATTERN.search(query):
                 sorting['order'] = 'asc'
-            elif re.search(r'降序|从大到小|desc', query):
+            elif self.DESC_PATTERN.search(query):
                 sorting['order'] = 'desc'
             else:
                 sorting['order'] = 'desc'  # 默认降序
@@ -501,12 +653,12 @@ class EntityExtractor:
         limits = {}
         
         # 提取前N名
-        top_match = re.search(r'前(\d+)(?:名|个|只|支)?', query)
+        top_match = self.TOP_N_PATTERN.search(query)
         if top_match:
             limits['limit'] = int(top_match.group(1))
         
         # 提取top N
-        top_match = re.search(r'top\s*(\d+)', query, re.IGNORECASE)
+        top_match = self.TOP_EN_PATTERN.search(query)
         if top_match:
             limits['limit'] = int(top_match.group(1))
         
@@ -522,7 +674,37 @@ class BusinessDictionaryManager:
     
     def __init__(self):
         self.synonyms_cache = {}
-        self._load_synonyms()
+        self._synonym_index: Dict[str, str] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+    
+    def _ensure_loaded(self):
+        """首次使用时加载词典（构造时可能还没有应用上下文）"""
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load_synonyms()
+                self._build_synonym_index()
+                self._loaded = True
+    
+    def reload(self):
+        """业务词典修改后重新加载"""
+        with self._lock:
+            self.synonyms_cache = {}
+            self._load_synonyms()
+            self._build_synonym_index()
+            self._loaded = True
+    
+    def _build_synonym_index(self):
+        """同义词/标准词 -> 标准词 的反向索引，同一个词取最先定义的标准词"""
+        index = {}
+        for category, synonyms_dict in self.synonyms_cache.items():
+            for standard_term, synonyms in synonyms_dict.items():
+                index.setdefault(standard_term, standard_term)
+                for synonym in synonyms:
+                    index.setdefault(synonym, standard_term)
+        self._synonym_index = index
     
     def _load_synonyms(self):
         """加载同义词词典"""
@@ -591,12 +773,8 @@ class BusinessDictionaryManager:
     
     def _normalize_field(self, field_name: str) -> str:
         """标准化字段名"""
-        for category, synonyms_dict in self.synonyms_cache.items():
-            for standard_term, synonyms in synonyms_dict.items():
-                if field_name in synonyms or field_name == standard_term:
-                    return standard_term
-        
-        return field_name
+        self._ensure_loaded()
+        return self._synonym_index.get(field_name, field_name)
     
     def get_field_mapping(self, field_name: str) -> Optional[Dict[str, str]]:
         """获取字段映射"""
@@ -613,4 +791,18 @@ class BusinessDictionaryManager:
             '均线': {'table': 'stock_ma_data', 'field': 'ma5'}
         }
         
-        return field_mappings.get(field_name) 
\ No newline at end of file
+        return field_mappings.get(field_name) 
+
+
+# 全局NLP处理器实例
+_nlp_processor = None
+_nlp_processor_lock = threading.Lock()
+
+def get_nlp_processor() -> NLPProcessor:
+    """获取NLP处理器实例（进程内共享，正则表只编译一次）"""
+    global _nlp_processor
+    if _nlp_processor is None:
+        with _nlp_processor_lock:
+            if _nlp_processor is None:
+                _nlp_processor = NLPProcessor()
+    return _nlp_processor
@@ -0,0 +1,290 @@
+"""
+K线降采样
+日线聚合为周/月/季/年K，分钟线聚合为5/15/30/60分钟或日K，也可按目标点数等分聚合，
+缩小时间轴的图表只传输和渲染几百根K线：
+- 分组键整列计算，各组的开高低收和成交量用 np.*.reduceat 一次聚合
+- 聚合结果按参数缓存
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.extensions import db
+from app.models.stock_daily_history import StockDailyHistory
+from app.models.stock_minute_data import StockMinuteData
+from app.utils.cache import TTLCache
+from config import Config
+
+# 日线可聚合的周期
+DAILY_PERIODS = ('W', 'M', 'Q', 'Y')
+
+# 分钟线可聚合的周期 -> 每根K线包含的连续竞价分钟数（D为整个交易日）
+TRADING_MINUTES = 240
+MINUTE_PERIODS = {'5min': 5, '15min': 15, '30min': 30, '60min': 60, 'D': TRADING_MINUTES}
+
+# 连续竞价时段（当日分钟数）：9:30-11:30, 13:00-15:00
+MORNING_OPEN_MINUTE = 9 * 60 + 30
+AFTERNOON_OPEN_MINUTE = 13 * 60
+SESSION_MINUTES = 120
+
+
+def daily_period_keys(dates: np.ndarray, period: str) -> np.ndarray:
+    """交易日所属的周/月/季/年编号"""
+    if period not in DAILY_PERIODS:
+        raise ValueError(f"不支持的日线聚合周期: {period}，可选 {', '.join(DAILY_PERIODS)}")
+
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    if period == 'W':
+        # 1970-01-01为周四，偏移3天后按周一分周
+        return (dates.astype(np.int64) + 3) // 7
+
+    months = dates.astype('datetime64[M]').astype(np.int64)
+    if period == 'M':
+        return months
+    if period == 'Q':
+        return months // 3
+    return months // 12
+
+
+def minute_period_keys(times: np.ndarray, minutes: int) -> np.ndarray:
+    """
+    分钟K线所属的聚合区间编号
+
+    按当日连续竞价分钟数分桶，午休不占区间，60分钟K线为
+    9:31-10:30、10:31-11:30、13:01-14:00、14:01-15:00 四根
+    """
+    times = np.asarray(times, dtype='datetime64[m]')
+    days = times.astype('datetime64[D]')
+    minute_of_day = (times - days).astype(np.int64)
+
+    elapsed = (np.clip(minute_of_day - MORNING_OPEN_MINUTE, 0, SESSION_MINUTES)
+               + np.clip(minute_of_day - AFTERNOON_OPEN_MINUTE, 0, SESSION_MINUTES))
+    # 9:30集合竞价K线并入第一个区间
+    bucket = np.maximum(elapsed - 1, 0) // minutes
+    return days.astype(np.int64) * (TRADING_MINUTES + 1) + bucket
+
+
+def point_count_keys(n: int, points: int) -> np.ndarray:
+    """n根K线等分为不超过points组，从最新一根向前对齐（只有最早一组可能不满）"""
+    size = max(1, -(-n // max(points, 1)))
+    return (np.arange(n) + (-n) % size) // size
+
+
+def aggregate_ohlc(frame: pd.DataFrame, keys: np.ndarray, time_column: str) -> pd.DataFrame:
+    """
+    按分组键聚合K线
+
+    Args:
+        frame: 按时间升序的K线，含 open/high/low/close/pre_close/volume/amount 和时间列
+        keys: 与frame等长的非递减分组键
+        time_column: 时间列，聚合后取每组最后一根的时间，start_<time_column> 为第一根的时间
+
+    Returns:
+        每组一行的K线；pre_close 为上一组收盘价（第一组取其第一根的昨收），bars 为包含的K线数
+    """
+    if frame.empty:
+        return pd.DataFrame(columns=[f'start_{time_column}', time_column, 'open', 'high', 'low', 'close',
+                                     'pre_close', 'change', 'pct_chg', 'volume', 'amount', 'bars'])
+
+    keys = np.asarray(keys)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+
+    def column(name):
+        return frame[name].to_numpy(dtype=float)
+
+    close = column('close')[ends]
+    pre_close = np.r_[column('pre_close')[starts[:1]], close[:-1]]
+
+    with np.errstate(all='ignore'):
+        change = close - pre_close
+        pct_chg = np.round(change / pre_close * 100, 2)
+
+    times = frame[time_column].to_numpy()
+    return pd.DataFrame({
+        f'start_{time_column}': times[starts],
+        time_column: times[ends],
+        'open': column('open')[starts],
+        'high': np.fmax.reduceat(column('high'), starts),
+        'low': np.fmin.reduceat(column('low'), starts),
+        'close': close,
+        'pre_close': pre_close,
+        'change': change,
+        'pct_chg': np.where(np.isfinite(pct_chg), pct_chg, np.nan),
+        'volume': np.add.reduceat(np.nan_to_num(column('volume')), starts),
+        'amount': np.add.reduceat(np.nan_to_num(column('amount')), starts),
+        'bars': ends - starts + 1
+    })
+
+
+def _clean(value: Any) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else float(value)
+
+
+class OHLCResampler:
+    """K线降采样服务"""
+
+    def __init__(self, cache_size: int = 256, cache_ttl: int = 300):
+        self._cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+
+    @staticmethod
+    def _resample(frame: pd.DataFrame, time_column: str, period_keys, points: Optional[int]) -> pd.DataFrame:
+        """
+        先按周期聚合，仍多于points根时再等分聚合；
+        无需聚合时逐根成组，返回的列与聚合结果一致
+        """
+        if period_keys is not None:
+            keys = period_keys(frame[time_column].to_numpy())
+        else:
+            keys = np.arange(len(frame))
+        frame = aggregate_ohlc(frame, keys, time_column)
+
+        if points and len(frame) > points:
+            start_column = f'start_{time_column}'
+            starts = frame[start_column].to_numpy()
+            bars = frame['bars'].to_numpy()
+
+            keys = point_count_keys(len(frame), points)
+            aggregated = aggregate_ohlc(frame, keys, time_column)
+            group_starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            aggregated[start_column] = starts[group_starts]
+            aggregated['bars'] = np.add.reduceat(bars, group_starts)
+            frame = aggregated
+
+        return frame
+
+    # ---------- 日线 ----------
+
+    def resample_daily(self, ts_code: str, period: Optional[str] = None, points: Optional[int] = None,
+                       start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        日线降采样（最新的在前，字段与 StockDailyHistory.to_dict 一致，另有 start_date 和 bars）
+
+        Args:
+            period: W/M/Q/Y
+            points: 目标K线数
+            limit: 只返回最新的limit根聚合K线
+        """
+        if period is None and not points:
+            raise ValueError("请指定聚合周期 period 或目标点数 points")
+        if period is not None and period not in DAILY_PERIODS:
+            raise ValueError(f"不支持的日线聚合周期: {period}，可选 {', '.join(DAILY_PERIODS)}")
+
+        cache_key = ('daily', ts_code, period, points, start_date, end_date, limit)
+        result = self._cache.get(cache_key)
+        if result is not None:
+            return result
+
+        query = StockDailyHistory.query.with_entities(
+            StockDailyHistory.trade_date, StockDailyHistory.open, StockDailyHistory.high,
+            StockDailyHistory.low, StockDailyHistory.close, StockDailyHistory.pre_close,
+            StockDailyHistory.vol.label('volume'), StockDailyHistory.amount
+        ).filter(StockDailyHistory.ts_code == ts_code)
+        if start_date:
+            query = query.filter(StockDailyHistory.trade_date >= start_date)
+        if end_date:
+            query = query.filter(StockDailyHistory.trade_date <= end_date)
+
+        frame = pd.read_sql(query.order_by(StockDailyHistory.trade_date).statement, db.engine)
+        frame['trade_date'] = pd.to_datetime(frame['trade_date'])
+
+        period_keys = (lambda dates: daily_period_keys(dates, period)) if period else None
+        resampled = self._resample(frame, 'trade_date', period_keys, points)
+        if limit:
+            resampled = resampled.iloc[-limit:]
+
+        result = [{
+            'ts_code': ts_code,
+            'trade_date': pd.Timestamp(row.trade_date).strftime('%Y%m%d'),
+            'start_date': pd.Timestamp(row.start_trade_date).strftime('%Y%m%d'),
+            'open': _clean(row.open),
+            'high': _clean(row.high),
+            'low': _clean(row.low),
+            'close': _clean(row.close),
+            'pre_close': _clean(row.pre_close),
+            'change': _clean(row.change),
+            'pct_chg': _clean(row.pct_chg),
+            'vol': int(row.volume),
+            'amount': _clean(row.amount),
+            'bars': int(row.bars)
+        } for row in resampled.iloc[::-1].itertuples(index=False)]
+
+        logger.debug(f"日线降采样 {ts_code}: {len(frame)} -> {len(result)} 根 (period={period}, points={points})")
+        self._cache.set(cache_key, result)
+        return result
+
+    # ---------- 分钟线 ----------
+
+    def resample_minute(self, ts_code: str, period: Optional[str] = None, points: Optional[int] = None,
+                        period_type: str = '1min', start_time: Optional[str] = None,
+                        end_time: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        分钟线降采样（最新的在前，字段与 StockMinuteData.to_dict 一致，另有 start_datetime 和 bars）
+
+        Args:
+            period: 5min/15min/30min/60min/D
+            points: 目标K线数
+            period_type: 源数据周期
+            limit: 只返回最新的limit根聚合K线
+        """
+        if period is None and not points:
+            raise ValueError("请指定聚合周期 period 或目标点数 points")
+        if period is not None and period not in MINUTE_PERIODS:
+            raise ValueError(f"不支持的分钟线聚合周期: {period}，可选 {', '.join(MINUTE_PERIODS)}")
+
+        cache_key = ('minute', ts_code, period, points, period_type, start_time, end_time, limit)
+        result = self._cache.get(cache_key)
+        if result is not None:
+            return result
+
+        query = StockMinuteData.query.with_entities(
+            StockMinuteData.datetime, StockMinuteData.open, StockMinuteData.high, StockMinuteData.low,
+            StockMinuteData.close, StockMinuteData.pre_close, StockMinuteData.volume, StockMinuteData.amount
+        ).filter(StockMinuteData.ts_code == ts_code, StockMinuteData.period_type == period_type)
+        if start_time:
+            query = query.filter(StockMinuteData.datetime >= start_time)
+        if end_time:
+            query = query.filter(StockMinuteData.datetime <= end_time)
+
+        frame = pd.read_sql(query.order_by(StockMinuteData.datetime).statement, db.engine)
+        frame['datetime'] = pd.to_datetime(frame['datetime'])
+
+        period_keys = (lambda times: minute_period_keys(times, MINUTE_PERIODS[period])) if period else None
+        resampled = self._resample(frame, 'datetime', period_keys, points)
+        if limit:
+            resampled = resampled.iloc[-limit:]
+
+        result = [{
+            'ts_code': ts_code,
+            'datetime': pd.Timestamp(row.datetime).isoformat(),
+            'start_datetime': pd.Timestamp(row.start_datetime).isoformat(),
+            'period_type': period or period_type,
+            'open': _clean(row.open),
+            'high': _clean(row.high),
+            'low': _clean(row.low),
+            'close': _clean(row.close),
+            'volume': int(row.volume),
+            'amount': _clean(row.amount),
+            'pre_close': _clean(row.pre_close),
+            'change': _clean(row.change),
+            'pct_chg': _clean(row.pct_chg),
+            'bars': int(row.bars)
+        } for row in resampled.iloc[::-1].itertuples(index=False)]
+
+        logger.debug(f"分钟线降采样 {ts_code}: {len(frame)} -> {len(result)} 根 (period={period}, points={points})")
+        self._cache.set(cache_key, result)
+        return result
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self._cache.get_stats()
+
+
+# 全局降采样实例
+ohlc_resampler = OHLCResampler(cache_size=Config.OHLC_RESAMPLE_CACHE_SIZE, cache_ttl=Config.OHLC_RESAMPLE_CACHE_TTL)
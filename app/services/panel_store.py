@@ -0,0 +1,299 @@
+"""
+列式面板存储
+每个字段一个 交易日×股票 的NumPy .npy文件，以内存映射方式读写：
+- 按交易日追加截面，新股票追加到列尾，容量不足时按倍数扩容
+- 任意日期区间的读取是对映射文件的切片，不复制数据
+- 元数据（交易日、股票代码、字段列表）在数据写完后原子替换，读者不会看到未写完的行
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DateLike = Union[str, date, datetime]
+
+
+def date_key(value: DateLike) -> str:
+    """统一为 YYYY-MM-DD 字符串（支持 date、datetime、YYYYMMDD 和 YYYY-MM-DD）"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    value = str(value).strip()
+    if len(value) == 8 and value.isdigit():
+        return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return value[:10]
+
+
+def compound_forward_returns(returns: np.ndarray, horizon: int = 1) -> np.ndarray:
+    """
+    交易日×股票 的日收益率矩阵转为远期累计收益：第t行为 t+1..t+horizon 日收益的复利累计，
+    区间内任一日收益缺失或超出矩阵末尾时为NaN
+    """
+    returns = np.asarray(returns, dtype=float)
+    valid = ~np.isnan(returns)
+    log_returns = np.log1p(np.where(valid, returns, 0.0))
+
+    # 前缀和前补一行0，区间 (t, t+h] 的累计值为 cum[t+h+1] - cum[t+1]
+    zeros = np.zeros((1, returns.shape[1]))
+    cum_log = np.vstack([zeros, np.cumsum(log_returns, axis=0)])
+    cum_valid = np.vstack([zeros, np.cumsum(valid, axis=0)])
+
+    result = np.full(returns.shape, np.nan)
+    n = max(0, returns.shape[0] - horizon)
+    if n:
+        total = cum_log[horizon + 1:horizon + 1 + n] - cum_log[1:1 + n]
+        complete = (cum_valid[horizon + 1:horizon + 1 + n] - cum_valid[1:1 + n]) == horizon
+        result[:n] = np.where(complete, np.expm1(total), np.nan)
+    return result
+
+
+class PanelStore:
+    """按字段存储的 交易日×股票 内存映射面板"""
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, root_dir: str, dtype: str = 'float32',
+                 initial_dates: int = 256, initial_codes: int = 6000):
+        """
+        Args:
+            root_dir: 存储目录
+            dtype: 数值类型（float32足够保存因子和行情数据，体积减半）
+            initial_dates: 新建时的交易日容量
+            initial_codes: 新建时的股票容量
+        """
+        self.root_dir = root_dir
+        self.dtype = np.dtype(dtype)
+        self.initial_dates = initial_dates
+        self.initial_codes = initial_codes
+
+        self._lock = threading.RLock()
+        self._meta_mtime = None
+        self._arrays: Dict[str, np.ndarray] = {}
+
+        self.dates: List[str] = []
+        self.codes: List[str] = []
+        self.fields: List[str] = []
+        self.date_capacity = 0
+        self.code_capacity = 0
+        self._date_index: Dict[str, int] = {}
+        self._code_index: Dict[str, int] = {}
+
+        self.refresh()
+
+    # ---------- 元数据 ----------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root_dir, name)
+
+    def _field_path(self, field: str) -> str:
+        return self._path(f"{field}.npy")
+
+    def refresh(self):
+        """元数据文件在其他进程中被更新时重新加载"""
+        meta_path = self._path(self.META_FILE)
+        if not os.path.exists(meta_path):
+            return
+
+        mtime = os.path.getmtime(meta_path)
+        if mtime == self._meta_mtime:
+            return
+
+        with self._lock:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+            self.dates = meta['dates']
+            self.codes = meta['codes']
+            self.fields = meta['fields']
+            self.date_capacity = meta['date_capacity']
+            self.code_capacity = meta['code_capacity']
+            self._date_index = {value: i for i, value in enumerate(self.dates)}
+            self._code_index = {value: i for i, value in enumerate(self.codes)}
+            self._arrays = {}
+            self._meta_mtime = mtime
+
+    def _save_meta(self):
+        os.makedirs(self.root_dir, exist_ok=True)
+        meta_path = self._path(self.META_FILE)
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'dates': self.dates,
+                'codes': self.codes,
+                'fields': self.fields,
+                'date_capacity': self.date_capacity,
+                'code_capacity': self.code_capacity
+            }, f)
+        os.replace(tmp_path, meta_path)
+        self._meta_mtime = os.path.getmtime(meta_path)
+
+    # ---------- 映射文件 ----------
+
+    def _array(self, field: str, writable: bool = False) -> np.ndarray:
+        """打开字段的映射数组（只读映射按需升级为读写）"""
+        key = (field, writable)
+        array = self._arrays.get(key)
+        if array is None:
+            array = np.load(self._field_path(field), mmap_mode='r+' if writable else 'r')
+            self._arrays[key] = array
+        return array
+
+    def _create_field(self, field: str):
+        os.makedirs(self.root_dir, exist_ok=True)
+        array = np.lib.format.open_memmap(
+            self._field_path(field), mode='w+', dtype=self.dtype,
+            shape=(self.date_capacity, self.code_capacity)
+        )
+        array[:] = np.nan
+        array.flush()
+        del array
+        self.fields.append(field)
+
+    def _grow(self, date_capacity: int, code_capacity: int):
+        """扩容：逐个字段写入更大的新文件后替换"""
+        self._arrays = {}
+        for field in self.fields:
+            path = self._field_path(field)
+            old = np.load(path, mmap_mode='r')
+            tmp_path = f"{path}.tmp.npy"
+            new = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=self.dtype,
+                                            shape=(date_capacity, code_capacity))
+            new[:] = np.nan
+            new[:old.shape[0], :old.shape[1]] = old
+            new.flush()
+            del new, old
+            os.replace(tmp_path, path)
+
+        logger.info(f"面板扩容 {self.root_dir}: {self.date_capacity}x{self.code_capacity} -> "
+                    f"{date_capacity}x{code_capacity}")
+        self.date_capacity = date_capacity
+        self.code_capacity = code_capacity
+
+    # ---------- 写入 ----------
+
+    def write(self, trade_date: DateLike, frame: pd.DataFrame):
+        """
+        写入一个交易日截面
+
+        Args:
+            trade_date: 交易日，只能是已有交易日（覆盖）或晚于最后一个交易日（追加）
+            frame: 行索引为ts_code、列为字段的截面
+        """
+        key = date_key(trade_date)
+
+        with self._lock:
+            self.refresh()
+
+            row = self._date_index.get(key)
+            if row is None and self.dates and key < self.dates[-1]:
+                raise ValueError(f"面板只能按日期顺序追加: {key} 早于 {self.dates[-1]}")
+
+            if not self.date_capacity:
+                self.date_capacity = self.initial_dates
+                self.code_capacity = max(self.initial_codes, len(frame.index))
+
+            new_codes = [code for code in frame.index if code not in self._code_index]
+            date_capacity = self.date_capacity
+            code_capacity = self.code_capacity
+            if row is None and len(self.dates) >= date_capacity:
+                date_capacity *= 2
+            while len(self.codes) + len(new_codes) > code_capacity:
+                code_capacity *= 2
+            if (date_capacity, code_capacity) != (self.date_capacity, self.code_capacity):
+                self._grow(date_capacity, code_capacity)
+
+            for field in frame.columns:
+                if field not in self.fields:
+                    self._create_field(field)
+
+            for code in new_codes:
+                self._code_index[code] = len(self.codes)
+                self.codes.append(code)
+
+            if row is None:
+                row = len(self.dates)
+
+            columns = np.array([self._code_index[code] for code in frame.index], dtype=np.int64)
+            for field in frame.columns:
+                array = self._array(field, writable=True)
+                array[row, :] = np.nan
+                array[row, columns] = frame[field].to_numpy(dtype=self.dtype)
+                array.flush()
+
+            # 数据落盘后再更新元数据
+            if row == len(self.dates):
+                self.dates.append(key)
+                self._date_index[key] = row
+            self._save_meta()
+
+    # ---------- 读取 ----------
+
+    def has_date(self, trade_date: DateLike) -> bool:
+        self.refresh()
+        return date_key(trade_date) in self._date_index
+
+    def last_date(self) -> Optional[str]:
+        self.refresh()
+        return self.dates[-1] if self.dates else None
+
+    def date_range(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> Tuple[int, int]:
+        """日期区间对应的行号范围 [i, j)"""
+        self.refresh()
+        i = 0 if start is None else int(np.searchsorted(self.dates, date_key(start), side='left'))
+        j = len(self.dates) if end is None else int(np.searchsorted(self.dates, date_key(end), side='right'))
+        return i, j
+
+    def get(self, field: str, start: Optional[DateLike] = None,
+            end: Optional[DateLike] = None) -> Tuple[List[str], List[str], np.ndarray]:
+        """
+        读取字段在日期区间内的面板（映射文件的只读切片，不复制）
+
+        Returns:
+            (交易日列表, 股票代码列表, 交易日×股票数组)，字段不存在时数组全为NaN
+        """
+        i, j = self.date_range(start, end)
+        return self.dates[i:j], self.codes, self.get_rows(field, i, j)
+
+    def get_rows(self, field: str, row_start: int, row_end: int) -> np.ndarray:
+        """按行号区间 [row_start, row_end) 读取"""
+        self.refresh()
+        if field not in self.fields:
+            return np.full((row_end - row_start, len(self.codes)), np.nan, dtype=self.dtype)
+        return self._array(field)[row_start:row_end, :len(self.codes)]
+
+    def get_cross_section(self, trade_date: DateLike, fields: Optional[List[str]] = None) -> pd.DataFrame:
+        """读取某个交易日的截面（行为ts_code，列为字段；全空的行和列被去掉）"""
+        self.refresh()
+        row = self._date_index.get(date_key(trade_date))
+        if row is None:
+            return pd.DataFrame()
+
+        fields = [field for field in (fields or self.fields) if field in self.fields]
+        if not fields:
+            return pd.DataFrame()
+
+        matrix = np.column_stack([self._array(field)[row, :len(self.codes)] for field in fields])
+        frame = pd.DataFrame(matrix.astype(np.float64), index=pd.Index(self.codes, name='ts_code'),
+                             columns=pd.Index(fields))
+        return frame.dropna(how='all').dropna(axis=1, how='all')
+
+    def get_stats(self) -> Dict[str, object]:
+        self.refresh()
+        return {
+            'root_dir': self.root_dir,
+            'dates': len(self.dates),
+            'first_date': self.dates[0] if self.dates else None,
+            'last_date': self.dates[-1] if self.dates else None,
+            'codes': len(self.codes),
+            'fields': len(self.fields),
+            'capacity': [self.date_capacity, self.code_capacity]
+        }
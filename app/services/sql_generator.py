@@ -3,18 +3,61 @@ SQL生成引擎
 负责根据解析的意图和实体生成相应的SQL查询语句
 """
 
+import json
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from app.models.text2sql_metadata import QueryTemplate
 from app.extensions import db
+from app.utils.cache import TTLCache
+from config import Config
+
+
+# SQL文本中的绑定参数（与SQLAlchemy text()的识别规则一致）
+BIND_PARAM_PATTERN = re.compile(r'(?<![:\w\\]):(\w+)(?!:)')
+
+
+class SQLParam:
+    """SQL绑定参数占位符，拼进SQL文本时输出为 :name"""
+    
+    __slots__ = ('name',)
+    
+    def __init__(self, name: str):
+        self.name = name
+    
+    def __str__(self):
+        return f':{self.name}'
+    
+    __repr__ = __str__
+
+
+def render_sql(sql: str, params: Optional[Dict[str, Any]]) -> str:
+    """把绑定参数代入SQL文本，仅用于展示和记录历史"""
+    if not sql or not params:
+        return sql
+    
+    def replace(match):
+        name = match.group(1)
+        if name not in params:
+            return match.group(0)
+        value = params[name]
+        if isinstance(value, str):
+            return "'" + value.replace("'", "''") + "'"
+        return 'NULL' if value is None else str(value)
+    
+    return BIND_PARAM_PATTERN.sub(replace, sql)
 
 
 class SQLGenerator:
-    """SQL生成器"""
+    """SQL生成器
+    
+    生成的SQL中数值一律为绑定参数。执行计划按 (意图, 实体结构) 缓存：
+    结构相同、只有数值不同的问题直接复用已生成的SQL文本，只替换参数值
+    """
     
     def __init__(self):
         self.template_manager = TemplateManager()
         self.query_builder = QueryBuilder()
+        self.plan_cache = TTLCache(max_size=Config.TEXT2SQL_PLAN_CACHE_SIZE)
     
     def generate_sql(self, intent_result: Dict[str, Any]) -> Dict[str, Any]:
         """生成SQL查询"""
@@ -22,32 +65,30 @@ class SQLGenerator:
             intent = intent_result['intent']['name']
             entities = intent_result['entities']
             
-            # 检查是否有多条件查询
-            if 'conditions' in entities and len(entities['conditions']) > 1:
-                # 处理多条件查询
-                sql = self._build_multi_condition_sql(entities)
-                template_used = 'multi_condition_dynamic'
-            else:
-                # 1. 尝试使用模板生成
-                template_result = self.template_manager.generate_from_template(intent, entities)
-                
-                if template_result['success']:
-                    sql = template_result['sql']
-                    template_used = template_result['template_id']
-                else:
-                    # 2. 使用动态构建器生成
-                    sql = self.query_builder.build_dynamic_sql(intent, entities)
-                    template_used = None
+            # 数值替换为占位符，得到实体结构和对应的参数值
+            params = {}
+            shaped_entities = self._parameterize(entities, params)
+            plan_key = (intent, json.dumps(shaped_entities, sort_keys=True, ensure_ascii=False, default=str))
             
-            # 3. SQL优化和验证
-            optimized_sql = self._optimize_sql(sql)
-            validation_result = self._validate_sql(optimized_sql)
+            plan = self.plan_cache.get(plan_key)
+            plan_cached = plan is not None
+            if not plan_cached:
+                plan = self._build_plan(intent, entities, shaped_entities)
+                self.plan_cache.set(plan_key, plan)
+            
+            # 模板使用模板自己的参数名，其余使用占位符参数
+            if plan['template_id']:
+                params = self.template_manager.get_parameters(
+                    plan['template_id'], entities, record_usage=plan_cached
+                )
+            params = {name: params[name] for name in plan['bind_names'] if name in params}
             
             return {
-                'success': validation_result['valid'],
-                'sql': optimized_sql,
-                'template_used': template_used,
-                'error': validation_result.get('error'),
+                'success': plan['valid'],
+                'sql': plan['sql'],
+                'params': params,
+                'template_used': plan['template_used'],
+                'error': plan['error'],
                 'explanation': self._generate_explanation(intent, entities)
             }
             
@@ -55,11 +96,59 @@ class SQLGenerator:
             return {
                 'success': False,
                 'sql': None,
+                'params': {},
                 'template_used': None,
                 'error': str(e),
                 'explanation': None
             }
     
+    def _parameterize(self, value: Any, params: Dict[str, Any]) -> Any:
+        """按遍历顺序把实体中的数值替换为 :p0, :p1 ... 占位符"""
+        if isinstance(value, dict):
+            return {key: self._parameterize(item, params) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._parameterize(item, params) for item in value]
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = f'p{len(params)}'
+            params[name] = value
+            return SQLParam(name)
+        return value
+    
+    def _build_plan(self, intent: str, entities: Dict[str, Any],
+                    shaped_entities: Dict[str, Any]) -> Dict[str, Any]:
+        """生成参数化SQL"""
+        template_id = None
+        
+        # 检查是否有多条件查询
+        if 'conditions' in shaped_entities and len(shaped_entities['conditions']) > 1:
+            # 处理多条件查询
+            sql = self._build_multi_condition_sql(shaped_entities)
+            template_used = 'multi_condition_dynamic'
+        else:
+            # 1. 尝试使用模板生成
+            template_result = self.template_manager.generate_from_template(intent, entities)
+            
+            if template_result['success']:
+                sql = template_result['sql']
+                template_id = template_used = template_result['template_id']
+            else:
+                # 2. 使用动态构建器生成
+                sql = self.query_builder.build_dynamic_sql(intent, shaped_entities)
+                template_used = None
+        
+        # 3. SQL优化和验证
+        optimized_sql = self._optimize_sql(sql)
+        validation_result = self._validate_sql(optimized_sql)
+        
+        return {
+            'sql': optimized_sql,
+            'bind_names': list(dict.fromkeys(BIND_PARAM_PATTERN.findall(optimized_sql or ''))),
+            'template_id': template_id,
+            'template_used': template_used,
+            'valid': validation_result['valid'],
+            'error': validation_result.get('error')
+        }
+    
     def _optimize_sql(self, sql: str) -> str:
         """优化SQL查询"""
         if not sql:
@@ -300,8 +389,31 @@ class SQLGenerator:
 class TemplateManager:
     """模板管理器"""
     
+    TEMPLATE_PARAM_PATTERN = re.compile(r'\{(\w+)\}')
+    
     def __init__(self):
         self.templates = self._load_templates()
+        # 模板ID -> (参数化SQL, 参数名列表)
+        self._compiled: Dict[str, Tuple[str, List[str]]] = {}
+    
+    def compile_template(self, template_id: str) -> Tuple[str, List[str]]:
+        """把模板中的 {param} 编译为绑定参数 :param（按模板ID缓存）"""
+        compiled = self._compiled.get(template_id)
+        if compiled is None:
+            template_sql = self.templates[template_id]['sql']
+            compiled = (
+                self.TEMPLATE_PARAM_PATTERN.sub(r':\1', template_sql),
+                list(dict.fromkeys(self.TEMPLATE_PARAM_PATTERN.findall(template_sql)))
+            )
+            self._compiled[template_id] = compiled
+        return compiled
+    
+    def get_parameters(self, template_id: str, entities: Dict[str, Any],
+                       record_usage: bool = False) -> Dict[str, Any]:
+        """模板的参数值（复用缓存的执行计划时调用）"""
+        if record_usage:
+            self._update_template_usage(template_id)
+        return self._extract_parameters(self.templates[template_id], entities)
     
     def _load_templates(self) -> Dict[str, Dict[str, Any]]:
         """加载查询模板"""
@@ -426,10 +538,16 @@ class TemplateManager:
             # 提取参数
             parameters = self._extract_parameters(template, entities)
             
-            # 替换模板中的参数
-            sql = template['sql']
-            for param, value in parameters.items():
-                sql = sql.replace(f'{{{param}}}', str(value))
+            # 模板编译为绑定参数形式，参数值不拼入SQL
+            sql, param_names = self.compile_template(template_id)
+            missing = [name for name in param_names if name not in parameters]
+            if missing:
+                return {
+                    'success': False,
+                    'sql': None,
+                    'template_id': template_id,
+                    'error': f"缺少模板参数: {', '.join(missing)}"
+                }
             
             # 更新模板使用次数
             self._update_template_usage(template_id)
@@ -438,7 +556,7 @@ class TemplateManager:
                 'success': True,
                 'sql': sql,
                 'template_id': template_id,
-                'parameters': parameters
+                'parameters': {name: parameters[name] for name in param_names}
             }
             
         except Exception as e:
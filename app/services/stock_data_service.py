@@ -15,6 +15,7 @@ from app.models.stock_daily_basic import StockDailyBasic
 from app.models.stock_moneyflow import StockMoneyflow
 from app.models.data_source_config import DataSourceConfig
 from app.services.tushare_service import TushareService
+from app.utils.pagination import clear_count_cache, paginate
 
 
 class StockDataService:
@@ -123,6 +124,11 @@ class StockDataService:
             db.session.commit()
             logger.info(f"股票列表同步完成: 新增{added_count}只, 更新{updated_count}只")
             
+            # 重建股票搜索索引，列表总数重新统计
+            from app.services.stock_search_index import stock_search_index
+            stock_search_index.build()
+            clear_count_cache('stock_basic')
+            
             return {
                 'success': True,
                 'message': f'同步成功',
@@ -141,13 +147,14 @@ class StockDataService:
             }
     
     @staticmethod
-    def get_stock_list(industry=None, area=None, page=1, page_size=50) -> Dict:
+    def get_stock_list(industry=None, area=None, page=None, page_size=50, cursor=None) -> Dict:
         """
         获取股票列表（优先从数据库）
         :param industry: 行业筛选
         :param area: 地域筛选
-        :param page: 页码
+        :param page: 页码（不传时按ts_code键集分页）
         :param page_size: 每页数量
+        :param cursor: 上一页返回的 next_cursor
         """
         try:
             # 构建查询
@@ -158,35 +165,37 @@ class StockDataService:
             if area:
                 query = query.filter(StockBasic.area == area)
             
-            # 总数
-            total = query.count()
+            def fetch():
+                return paginate(
+                    query, [StockBasic.ts_code], count_key=('stock_basic', industry, area),
+                    per_page=page_size, page=page, cursor=cursor
+                )
+            
+            pagination = fetch()
             
             # 如果数据库没有数据，尝试同步
-            if total == 0:
+            if pagination['total'] == 0:
                 logger.info("数据库无股票数据，尝试同步...")
                 sync_result = StockDataService.sync_stock_list()
                 if sync_result['success']:
                     # 重新查询
-                    query = StockBasic.query
-                    if industry:
-                        query = query.filter(StockBasic.industry == industry)
-                    if area:
-                        query = query.filter(StockBasic.area == area)
-                    total = query.count()
-            
-            # 分页
-            stocks = query.offset((page - 1) * page_size).limit(page_size).all()
+                    pagination = fetch()
             
             return {
                 'success': True,
-                'data': [stock.to_dict() for stock in stocks],
-                'total': total,
-                'page': page,
+                'data': [stock.to_dict() for stock in pagination['items']],
+                'total': pagination['total'],
+                'page': pagination['page'],
                 'page_size': page_size,
-                'total_pages': (total + page_size - 1) // page_size,
+                'total_pages': pagination['pages'],
+                'has_next': pagination['has_next'],
+                'next_cursor': pagination['next_cursor'],
                 'source': 'database'
             }
         
+        except ValueError:
+            # 无效的分页游标，交给接口返回400
+            raise
         except Exception as e:
             logger.error(f"获取股票列表失败: {e}")
             return {
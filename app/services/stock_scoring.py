@@ -6,12 +6,20 @@ from loguru import logger
 
 from app.extensions import db
 from app.models import FactorValues, MLPredictions, StockBasic
+from app.services.factor_panel_store import FactorPanelStore, factor_panel_store
+from config import Config
 
 
 class StockScoringEngine:
-    """股票打分引擎"""
+    """股票打分引擎
     
-    def __init__(self):
+    打分核心基于 股票×因子 的NumPy矩阵：综合分数为矩阵与权重向量的点积，
+    排名、百分位、截面去极值和行业中性化均为整列向量运算
+    """
+    
+    def __init__(self, panel_store: Optional[FactorPanelStore] = None):
+        # 因子面板：已同步的交易日直接从内存映射文件读取截面，并提供滚动Rank IC
+        self.panel_store = panel_store or factor_panel_store
         self.scoring_methods = {
             'equal_weight': self._equal_weight_scoring,
             'factor_weight': self._factor_weight_scoring,
@@ -20,32 +28,49 @@ class StockScoringEngine:
         }
     
     def calculate_factor_scores(self, trade_date: str, factor_list: List[str] = None,
-                               ts_codes: List[str] = None) -> pd.DataFrame:
-        """计算因子分数"""
+                               ts_codes: List[str] = None, winsorize: Optional[float] = None,
+                               neutralize: bool = False) -> pd.DataFrame:
+        """计算因子分数
+        
+        Args:
+            winsorize: 截面去极值的分位数（如0.01表示截断到1%~99%分位），None不处理
+            neutralize: 是否做行业中性化（每个因子减去所在行业均值）
+        """
         try:
-            # 构建查询
-            query = FactorValues.query.filter(FactorValues.trade_date == trade_date)
+            # 面板中已有该交易日时直接读取截面（新交易日先追加到面板），否则查询数据库
+            panel = pd.DataFrame()
+            if not self.panel_store.has_date(trade_date):
+                self.panel_store.catch_up(trade_date)
+            if self.panel_store.has_date(trade_date):
+                panel = self.panel_store.get_factor_cross_section(trade_date, factor_list, ts_codes)
+            
+            if not panel.empty:
+                codes = panel.index.to_numpy()
+                factors = panel.columns.to_numpy()
+                matrix = panel.to_numpy(dtype=float)
+            else:
+                codes, factors, matrix = self._load_factor_matrix(trade_date, factor_list, ts_codes)
             
-            if factor_list:
-                query = query.filter(FactorValues.factor_id.in_(factor_list))
+            if matrix.size == 0:
+                logger.warning(f"未找到因子数据: {trade_date}")
+                return pd.DataFrame()
             
-            if ts_codes:
-                query = query.filter(FactorValues.ts_code.in_(ts_codes))
+            if winsorize:
+                matrix = self.winsorize(matrix, winsorize)
             
-            # 获取因子数据
-            factor_data = pd.read_sql(query.statement, db.engine)
+            if neutralize:
+                stock_info = self._get_stock_info(codes.tolist())
+                industries = np.array([stock_info.get(code, {}).get('industry') or '未知' for code in codes])
+                matrix = self.neutralize(matrix, industries)
             
-            if factor_data.empty:
-                logger.warning(f"未找到因子数据: {trade_date}")
-                return pd.DataFrame()
+            factor_scores = pd.DataFrame(
+                np.nan_to_num(matrix, nan=0.0),
+                index=pd.Index(codes, name='ts_code'),
+                columns=pd.Index(factors, name='factor_id')
+            )
             
-            # 透视表：行为ts_code，列为factor_id
-            factor_scores = factor_data.pivot_table(
-                index='ts_code',
-                columns='factor_id',
-                values='z_score',  # 使用标准化后的Z分数
-                aggfunc='first'
-            ).fillna(0)
+            # 记录交易日，供Rank IC评分取截至当日的IC权重
+            factor_scores.attrs['trade_date'] = trade_date
             
             logger.info(f"计算因子分数完成: {len(factor_scores)} 只股票, {len(factor_scores.columns)} 个因子")
             return factor_scores
@@ -54,6 +79,97 @@ class StockScoringEngine:
             logger.error(f"计算因子分数失败: {trade_date}, 错误: {e}")
             return pd.DataFrame()
     
+    def _load_factor_matrix(self, trade_date: str, factor_list: List[str] = None,
+                            ts_codes: List[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """从数据库读取一个交易日的因子数据（面板中没有该交易日时使用）"""
+        query = FactorValues.query.filter(FactorValues.trade_date == trade_date)
+        
+        if factor_list:
+            query = query.filter(FactorValues.factor_id.in_(factor_list))
+        
+        if ts_codes:
+            query = query.filter(FactorValues.ts_code.in_(ts_codes))
+        
+        factor_data = pd.read_sql(query.statement, db.engine)
+        
+        # 矩阵：行为ts_code，列为factor_id，使用标准化后的Z分数
+        return self._build_factor_matrix(
+            factor_data['ts_code'].to_numpy(),
+            factor_data['factor_id'].to_numpy(),
+            factor_data['z_score'].to_numpy(dtype=float)
+        )
+    
+    @staticmethod
+    def _build_factor_matrix(ts_codes: np.ndarray, factor_ids: np.ndarray,
+                             values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """长表转为 股票×因子 矩阵，缺失为NaN；同一格有多条记录时取第一条非空值"""
+        rows, codes = pd.factorize(ts_codes, sort=True)
+        cols, factors = pd.factorize(factor_ids, sort=True)
+        
+        matrix = np.full((len(codes), len(factors)), np.nan)
+        valid = ~np.isnan(values)
+        rows, cols, values = rows[valid], cols[valid], values[valid]
+        
+        # 每格只保留第一条记录（与pivot_table的aggfunc='first'一致）
+        _, first = np.unique(rows * len(factors) + cols, return_index=True)
+        matrix[rows[first], cols[first]] = values[first]
+        
+        return np.asarray(codes), np.asarray(factors), matrix
+    
+    @staticmethod
+    def winsorize(matrix: np.ndarray, quantile: float = 0.01) -> np.ndarray:
+        """截面去极值：每个因子截断到 [quantile, 1-quantile] 分位"""
+        if matrix.size == 0:
+            return matrix
+        with np.errstate(all='ignore'):
+            lower = np.nanquantile(matrix, quantile, axis=0)
+            upper = np.nanquantile(matrix, 1 - quantile, axis=0)
+        return np.clip(matrix, lower, upper)
+    
+    @staticmethod
+    def neutralize(matrix: np.ndarray, groups: np.ndarray) -> np.ndarray:
+        """行业中性化：每个因子减去所在分组的均值（忽略缺失值）"""
+        if matrix.size == 0:
+            return matrix
+        _, group_idx = np.unique(groups, return_inverse=True)
+        n_groups = group_idx.max() + 1
+        
+        valid = ~np.isnan(matrix)
+        sums = np.zeros((n_groups, matrix.shape[1]))
+        counts = np.zeros((n_groups, matrix.shape[1]))
+        np.add.at(sums, group_idx, np.where(valid, matrix, 0.0))
+        np.add.at(counts, group_idx, valid)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+        return matrix - means[group_idx]
+    
+    @staticmethod
+    def dense_rank_desc(values: np.ndarray) -> np.ndarray:
+        """降序密集排名（最大值为1，相同值同名次）"""
+        _, inverse = np.unique(-values, return_inverse=True)
+        return inverse + 1
+    
+    @staticmethod
+    def percentile_rank(values: np.ndarray) -> np.ndarray:
+        """升序平均排名的百分位（0~100，相同值取平均名次）"""
+        n = len(values)
+        if n == 0:
+            return np.array([], dtype=float)
+        
+        order = np.argsort(values, kind='mergesort')
+        sorted_values = values[order]
+        
+        # 每组相同值的起止位置，名次取平均
+        boundaries = np.flatnonzero(np.diff(sorted_values)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [n]))
+        average_ranks = (starts + ends + 1) / 2.0
+        
+        ranks = np.empty(n)
+        ranks[order] = np.repeat(average_ranks, ends - starts)
+        return ranks / n * 100
+    
     def calculate_composite_score(self, factor_scores: pd.DataFrame, weights: Dict[str, float],
                                  method: str = 'equal_weight') -> pd.DataFrame:
         """计算综合分数"""
@@ -62,7 +178,7 @@ class StockScoringEngine:
                 return pd.DataFrame()
             
             # 检查权重
-            if method != 'equal_weight' and not weights:
+            if method not in ('equal_weight', 'rank_ic') and not weights:
                 logger.warning("未提供权重，使用等权重方法")
                 method = 'equal_weight'
             
@@ -72,57 +188,71 @@ class StockScoringEngine:
                 method = 'equal_weight'
             
             scoring_func = self.scoring_methods[method]
-            composite_scores = scoring_func(factor_scores, weights)
+            composite_scores = np.asarray(scoring_func(factor_scores, weights), dtype=float)
+            
+            # 排名与百分位排名
+            ranks = self.dense_rank_desc(composite_scores)
+            order = np.argsort(ranks, kind='mergesort')
             
-            # 构建结果DataFrame
             result_df = pd.DataFrame({
-                'ts_code': composite_scores.index,
-                'composite_score': composite_scores.values
+                'ts_code': factor_scores.index.to_numpy()[order],
+                'composite_score': composite_scores[order],
+                'rank': ranks[order],
+                'percentile_rank': self.percentile_rank(composite_scores)[order]
             })
             
-            # 计算排名
-            result_df['rank'] = result_df['composite_score'].rank(ascending=False, method='dense').astype(int)
-            
-            # 计算百分位排名
-            result_df['percentile_rank'] = result_df['composite_score'].rank(pct=True) * 100
-            
             logger.info(f"计算综合分数完成: {len(result_df)} 只股票")
-            return result_df.sort_values('rank')
+            return result_df
             
         except Exception as e:
             logger.error(f"计算综合分数失败: {method}, 错误: {e}")
             return pd.DataFrame()
     
-    def _equal_weight_scoring(self, factor_scores: pd.DataFrame, weights: Dict[str, float]) -> pd.Series:
+    def _equal_weight_scoring(self, factor_scores: pd.DataFrame, weights: Dict[str, float]) -> np.ndarray:
         """等权重评分"""
-        return factor_scores.mean(axis=1)
+        return factor_scores.to_numpy(dtype=float).mean(axis=1)
     
-    def _factor_weight_scoring(self, factor_scores: pd.DataFrame, weights: Dict[str, float]) -> pd.Series:
-        """因子权重评分"""
-        # 确保权重归一化
+    def _factor_weight_scoring(self, factor_scores: pd.DataFrame, weights: Dict[str, float]) -> np.ndarray:
+        """因子权重评分：矩阵与归一化权重向量的点积"""
+        # 确保权重归一化（不在矩阵中的因子也计入总权重）
         total_weight = sum(weights.values())
-        normalized_weights = {k: v / total_weight for k, v in weights.items()}
-        
-        # 计算加权分数
-        weighted_scores = pd.Series(0, index=factor_scores.index)
-        
-        for factor_id, weight in normalized_weights.items():
-            if factor_id in factor_scores.columns:
-                weighted_scores += factor_scores[factor_id] * weight
+        weight_vector = np.array(
+            [weights.get(factor_id, 0.0) for factor_id in factor_scores.columns], dtype=float
+        ) / total_weight
         
-        return weighted_scores
+        return factor_scores.to_numpy(dtype=float) @ weight_vector
     
-    def _ml_ensemble_scoring(self, factor_scores: pd.DataFrame, weights: Dict[str, float]) -> pd.Series:
+    def _ml_ensemble_scoring(self, factor_scores: pd.DataFrame, weights: Dict[str, float]) -> np.ndarray:
         """机器学习集成评分"""
         # TODO: 实现基于多个ML模型的集成评分
         # 目前使用等权重作为占位符
         return self._equal_weight_scoring(factor_scores, weights)
     
-    def _rank_ic_scoring(self, factor_scores: pd.DataFrame, weights: Dict[str, float]) -> pd.Series:
-        """基于Rank IC的评分"""
-        # TODO: 实现基于历史Rank IC的动态权重评分
-        # 目前使用等权重作为占位符
-        return self._equal_weight_scoring(factor_scores, weights)
+    def _rank_ic_scoring(self, factor_scores: pd.DataFrame, weights: Dict[str, float]) -> np.ndarray:
+        """基于Rank IC的评分：截至打分日的滚动Rank IC作为带符号权重
+        
+        weights 不为空时只使用其中列出的因子；面板数据不足以计算IC时退化为等权重
+        """
+        trade_date = factor_scores.attrs.get('trade_date')
+        factor_ids = [factor_id for factor_id in factor_scores.columns if not weights or factor_id in weights]
+        
+        ic_weights = {}
+        if trade_date:
+            ic_weights = self.panel_store.ic_weights(
+                factor_ids, trade_date,
+                window=Config.FACTOR_IC_WINDOW,
+                horizon=Config.FACTOR_IC_HORIZON,
+                method=Config.FACTOR_IC_METHOD
+            )
+        
+        if not ic_weights:
+            logger.warning(f"Rank IC数据不足: {trade_date}，使用等权重方法")
+            return self._equal_weight_scoring(factor_scores, weights)
+        
+        weight_vector = np.array(
+            [ic_weights.get(factor_id, 0.0) for factor_id in factor_scores.columns], dtype=float
+        )
+        return factor_scores.to_numpy(dtype=float) @ weight_vector
     
     def rank_stocks(self, scores: pd.DataFrame, top_n: int = 50, 
                    filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
@@ -146,20 +276,11 @@ class StockScoringEngine:
             stock_info = self._get_stock_info(ts_codes)
             
             # 构建结果
-            result = []
-            for _, row in top_stocks.iterrows():
-                stock_data = {
-                    'ts_code': row['ts_code'],
-                    'composite_score': float(row['composite_score']),
-                    'rank': int(row['rank']),
-                    'percentile_rank': float(row['percentile_rank'])
-                }
-                
-                # 添加股票基本信息
-                if row['ts_code'] in stock_info:
-                    stock_data.update(stock_info[row['ts_code']])
-                
-                result.append(stock_data)
+            result = self._to_records(top_stocks, {
+                'composite_score': float,
+                'rank': int,
+                'percentile_rank': float
+            }, stock_info)
             
             logger.info(f"股票排名完成: 选出 {len(result)} 只股票")
             return result
@@ -168,6 +289,23 @@ class StockScoringEngine:
             logger.error(f"股票排名失败: {e}")
             return []
     
+    @staticmethod
+    def _to_records(frame: pd.DataFrame, columns: Dict[str, type],
+                    stock_info: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按列批量转为JSON行，并附加股票基本信息"""
+        ts_codes = frame['ts_code'].tolist()
+        names = list(columns.keys())
+        values = [frame[name].to_numpy(dtype=dtype).tolist() for name, dtype in columns.items()]
+        
+        result = []
+        for ts_code, row in zip(ts_codes, zip(*values)):
+            stock_data = {'ts_code': ts_code, **dict(zip(names, row))}
+            info = stock_info.get(ts_code)
+            if info:
+                stock_data.update(info)
+            result.append(stock_data)
+        return result
+    
     def _apply_filters(self, scores: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
         """应用过滤条件"""
         try:
@@ -241,34 +379,25 @@ class StockScoringEngine:
                 logger.warning("未提供模型ID")
                 return []
             
-            # 获取所有模型的预测结果
-            all_predictions = []
+            # 一次查询获取所有模型的预测结果
+            pred_query = MLPredictions.query.filter(
+                MLPredictions.model_id.in_(model_ids),
+                MLPredictions.trade_date == trade_date
+            ).order_by(MLPredictions.rank_score)
             
-            for model_id in model_ids:
-                pred_query = MLPredictions.query.filter(
-                    MLPredictions.model_id == model_id,
-                    MLPredictions.trade_date == trade_date
-                ).order_by(MLPredictions.rank_score)
-                
-                pred_data = pd.read_sql(pred_query.statement, db.engine)
-                
-                if not pred_data.empty:
-                    pred_data['model_id'] = model_id
-                    all_predictions.append(pred_data)
+            combined_predictions = pd.read_sql(pred_query.statement, db.engine)
             
-            if not all_predictions:
+            if combined_predictions.empty:
                 logger.warning(f"未找到预测数据: {trade_date}")
                 return []
             
-            # 合并所有预测结果
-            combined_predictions = pd.concat(all_predictions, ignore_index=True)
-            
             # 集成预测结果
             ensemble_scores = self._ensemble_predictions(combined_predictions, ensemble_method)
             
             # 排名和选择
-            ensemble_scores['rank'] = ensemble_scores['ensemble_score'].rank(ascending=False, method='dense').astype(int)
-            ensemble_scores['percentile_rank'] = ensemble_scores['ensemble_score'].rank(pct=True) * 100
+            score_values = ensemble_scores['ensemble_score'].to_numpy(dtype=float)
+            ensemble_scores['rank'] = self.dense_rank_desc(score_values)
+            ensemble_scores['percentile_rank'] = self.percentile_rank(score_values)
             
             # 选择前N只股票
             top_stocks = ensemble_scores.head(top_n)
@@ -278,21 +407,12 @@ class StockScoringEngine:
             stock_info = self._get_stock_info(ts_codes)
             
             # 构建结果
-            result = []
-            for _, row in top_stocks.iterrows():
-                stock_data = {
-                    'ts_code': row['ts_code'],
-                    'ensemble_score': float(row['ensemble_score']),
-                    'rank': int(row['rank']),
-                    'percentile_rank': float(row['percentile_rank']),
-                    'model_count': int(row['model_count'])
-                }
-                
-                # 添加股票基本信息
-                if row['ts_code'] in stock_info:
-                    stock_data.update(stock_info[row['ts_code']])
-                
-                result.append(stock_data)
+            result = self._to_records(top_stocks, {
+                'ensemble_score': float,
+                'rank': int,
+                'percentile_rank': float,
+                'model_count': int
+            }, stock_info)
             
             logger.info(f"ML选股完成: 使用 {len(model_ids)} 个模型，选出 {len(result)} 只股票")
             return result
@@ -374,44 +494,43 @@ class StockScoringEngine:
             if factor_data.empty:
                 return {'error': '未找到因子数据'}
             
-            # 获取全市场因子分布
-            market_query = FactorValues.query.filter(
-                FactorValues.trade_date == trade_date
+            # 获取全市场因子分布（只取该股票有值的因子，按因子一次聚合）
+            market_query = FactorValues.query.with_entities(
+                FactorValues.factor_id, FactorValues.factor_value
+            ).filter(
+                FactorValues.trade_date == trade_date,
+                FactorValues.factor_id.in_(factor_data['factor_id'].unique().tolist())
             )
             
-            if factor_list:
-                market_query = market_query.filter(FactorValues.factor_id.in_(factor_list))
-            
             market_data = pd.read_sql(market_query.statement, db.engine)
+            market_stats = market_data.groupby('factor_id')['factor_value'].agg(['mean', 'std', 'median'])
             
             # 计算因子贡献度
             contributions = {}
             
-            for _, row in factor_data.iterrows():
-                factor_id = row['factor_id']
-                factor_value = row['factor_value']
-                z_score = row['z_score']
-                percentile_rank = row['percentile_rank']
-                
-                # 计算该因子在全市场的分布
-                market_factor = market_data[market_data['factor_id'] == factor_id]
-                
-                if not market_factor.empty:
-                    market_mean = market_factor['factor_value'].mean()
-                    market_std = market_factor['factor_value'].std()
-                    market_median = market_factor['factor_value'].median()
-                    
-                    contributions[factor_id] = {
-                        'factor_value': float(factor_value) if factor_value else None,
-                        'z_score': float(z_score) if z_score else None,
-                        'percentile_rank': float(percentile_rank) if percentile_rank else None,
-                        'market_mean': float(market_mean),
-                        'market_std': float(market_std),
-                        'market_median': float(market_median),
-                        'deviation_from_mean': float(factor_value - market_mean) if factor_value else None,
-                        'relative_strength': 'strong' if percentile_rank and percentile_rank > 80 else 
-                                           'weak' if percentile_rank and percentile_rank < 20 else 'neutral'
-                    }
+            factor_data = factor_data[factor_data['factor_id'].isin(market_stats.index)]
+            stats = market_stats.reindex(factor_data['factor_id'])
+            
+            for factor_id, factor_value, z_score, percentile_rank, market_mean, market_std, market_median in zip(
+                factor_data['factor_id'].tolist(),
+                factor_data['factor_value'].tolist(),
+                factor_data['z_score'].tolist(),
+                factor_data['percentile_rank'].tolist(),
+                stats['mean'].tolist(),
+                stats['std'].tolist(),
+                stats['median'].tolist()
+            ):
+                contributions[factor_id] = {
+                    'factor_value': float(factor_value) if factor_value else None,
+                    'z_score': float(z_score) if z_score else None,
+                    'percentile_rank': float(percentile_rank) if percentile_rank else None,
+                    'market_mean': float(market_mean),
+                    'market_std': float(market_std),
+                    'market_median': float(market_median),
+                    'deviation_from_mean': float(factor_value - market_mean) if factor_value else None,
+                    'relative_strength': 'strong' if percentile_rank and percentile_rank > 80 else 
+                                       'weak' if percentile_rank and percentile_rank < 20 else 'neutral'
+                }
             
             result = {
                 'ts_code': ts_code,
@@ -448,9 +567,9 @@ class StockScoringEngine:
             stock_info = self._get_stock_info(ts_codes)
             
             # 添加行业信息
-            composite_scores['industry'] = composite_scores['ts_code'].map(
-                lambda x: stock_info.get(x, {}).get('industry', '未知')
-            )
+            composite_scores['industry'] = [
+                stock_info.get(ts_code, {}).get('industry', '未知') for ts_code in composite_scores['ts_code'].tolist()
+            ]
             
             # 按行业分组分析
             industry_analysis = composite_scores.groupby('industry').agg({
@@ -465,23 +584,16 @@ class StockScoringEngine:
             # 排序
             industry_analysis = industry_analysis.sort_values('composite_score_mean', ascending=False)
             
-            # 选择每个行业的顶级股票
-            top_stocks_by_industry = {}
-            for industry in industry_analysis['industry'].head(top_n):
-                industry_stocks = composite_scores[composite_scores['industry'] == industry].head(5)
-                
-                top_stocks_by_industry[industry] = []
-                for _, stock in industry_stocks.iterrows():
-                    stock_data = {
-                        'ts_code': stock['ts_code'],
-                        'composite_score': float(stock['composite_score']),
-                        'rank': int(stock['rank'])
-                    }
-                    
-                    if stock['ts_code'] in stock_info:
-                        stock_data.update(stock_info[stock['ts_code']])
-                    
-                    top_stocks_by_industry[industry].append(stock_data)
+            # 选择每个行业的顶级股票（composite_scores已按排名排序，每组取前5）
+            top_industries = industry_analysis['industry'].head(top_n).tolist()
+            top_stocks = composite_scores[composite_scores['industry'].isin(top_industries)].groupby(
+                'industry', sort=False
+            ).head(5)
+            
+            top_stocks_by_industry = {industry: [] for industry in top_industries}
+            records = self._to_records(top_stocks, {'composite_score': float, 'rank': int}, stock_info)
+            for industry, stock_data in zip(top_stocks['industry'].tolist(), records):
+                top_stocks_by_industry[industry].append(stock_data)
             
             result = {
                 'trade_date': trade_date,
@@ -0,0 +1,561 @@
+"""
+截面选股引擎
+股票业务大宽表某个交易日的截面一次性加载为NumPy列，
+筛选条件编译为向量化布尔掩码，排序和分页直接在掩码结果上完成
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sqlalchemy import select
+
+from app.extensions import db
+from app.models import StockBasic, StockBusiness, StockDailyHistory
+from app.services.panel_store import compound_forward_returns
+from app.utils.cache import TTLCache
+from config import Config
+
+
+class ScreenerSnapshot:
+    """一个交易日的列式截面"""
+
+    def __init__(self, trade_date, frame: pd.DataFrame):
+        self.trade_date = trade_date
+        self.size = len(frame)
+        self.columns: List[str] = list(frame.columns)
+
+        # 数值列为float64（缺失为NaN），其余列为已转换好的Python对象
+        self.numeric: Dict[str, np.ndarray] = {}
+        self.objects: Dict[str, np.ndarray] = {}
+        for column in self.columns:
+            series = frame[column]
+            if pd.api.types.is_bool_dtype(series) or not self._is_numeric(series):
+                self.objects[column] = self._to_objects(series)
+            else:
+                self.numeric[column] = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64)
+
+        self.ts_codes = self.objects['ts_code'].astype(str)
+        self.shape = (self.size,)
+        # 每个位置是否有数据（截面中全部为True）
+        self.present: Optional[np.ndarray] = None
+        self._category_codes: Dict[str, Any] = {}
+
+    @staticmethod
+    def _is_numeric(series: pd.Series) -> bool:
+        if pd.api.types.is_numeric_dtype(series):
+            return True
+        # DECIMAL列读出为object类型的Decimal
+        sample = series.dropna()
+        return not sample.empty and pd.api.types.is_number(sample.iloc[0]) and not isinstance(sample.iloc[0], bool)
+
+    @staticmethod
+    def _to_objects(series: pd.Series) -> np.ndarray:
+        """日期转为 YYYY-MM-DD 字符串，缺失转为None"""
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = series.dt.strftime('%Y-%m-%d')
+        else:
+            values = series.map(lambda value: value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else value)
+        return values.astype(object).where(values.notna(), None).to_numpy()
+
+    def category_mask(self, column: str, value: Any) -> np.ndarray:
+        """分类列等值过滤（按列缓存因子化结果，过滤为整数比较）"""
+        if column not in self._category_codes:
+            codes, uniques = pd.factorize(self.objects[column])
+            self._category_codes[column] = (codes, {label: i for i, label in enumerate(uniques)})
+        codes, index = self._category_codes[column]
+        code = index.get(value)
+        if code is None:
+            return np.zeros(len(codes), dtype=bool)
+        return codes == code
+
+    def records(self, indexes: np.ndarray) -> List[Dict[str, Any]]:
+        """只为选中的行构建字典"""
+        columns = {}
+        for column in self.columns:
+            if column in self.numeric:
+                values = self.numeric[column][indexes]
+                columns[column] = [None if value != value else value for value in values.tolist()]
+            else:
+                columns[column] = self.objects[column][indexes].tolist()
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+class ScreenerPanel(ScreenerSnapshot):
+    """交易日×股票 的多日面板：数值列为二维数组，股票属性列为一维数组（沿交易日广播）"""
+
+    def __init__(self, trade_dates: List, ts_codes: np.ndarray, numeric: Dict[str, np.ndarray],
+                 objects: Dict[str, np.ndarray], present: np.ndarray):
+        self.trade_dates = trade_dates
+        self.ts_codes = np.asarray(ts_codes).astype(str)
+        self.size = len(self.ts_codes)
+        self.shape = present.shape
+        self.present = present
+        self.numeric = numeric
+        self.objects = objects
+        self.columns = list(numeric) + list(objects)
+        self._category_codes = {}
+
+    @classmethod
+    def from_long(cls, frame: pd.DataFrame, fields: List[str],
+                  attributes: pd.DataFrame) -> 'ScreenerPanel':
+        """
+        长表（ts_code, trade_date, 字段...）转为面板
+
+        Args:
+            attributes: 以ts_code为索引的股票属性（行业、地域等）
+        """
+        rows, trade_dates = pd.factorize(pd.to_datetime(frame['trade_date']), sort=True)
+        cols, ts_codes = pd.factorize(frame['ts_code'], sort=True)
+        shape = (len(trade_dates), len(ts_codes))
+
+        present = np.zeros(shape, dtype=bool)
+        present[rows, cols] = True
+
+        numeric = {}
+        for field in fields:
+            matrix = np.full(shape, np.nan)
+            matrix[rows, cols] = pd.to_numeric(frame[field], errors='coerce').to_numpy(dtype=np.float64)
+            numeric[field] = matrix
+
+        attributes = attributes.reindex(ts_codes)
+        objects = {column: attributes[column].astype(object).where(attributes[column].notna(), None).to_numpy()
+                   for column in attributes.columns}
+        return cls(list(trade_dates), np.asarray(ts_codes), numeric, objects, present)
+
+
+class StockScreener:
+    """基于股票业务大宽表截面的内存选股引擎"""
+
+    # 区间条件：条件前缀 -> 字段，条件名为 前缀_min / 前缀_max
+    RANGE_FILTERS = {
+        # 估值指标
+        'pe': 'pe',
+        'pb': 'pb',
+        'ps': 'ps',
+        'dv': 'dv_ratio',
+        # 市值和交易指标
+        'mv': 'total_mv',
+        'circ_mv': 'circ_mv',
+        'turnover': 'turnover_rate',
+        'volume_ratio': 'volume_ratio',
+        # 技术指标
+        'rsi6': 'factor_rsi_6',
+        'kdj_k': 'factor_kdj_k',
+        'macd': 'factor_macd',
+        'cci': 'factor_cci',
+        # 资金流向
+        'net_amount': 'moneyflow_net_amount',
+        'lg_buy_rate': 'moneyflow_buy_lg_amount_rate',
+        'net_d5_amount': 'moneyflow_net_d5_amount'
+    }
+
+    # 与SQL语义一致：任一侧为NULL(NaN)时条件不成立
+    OPERATORS: Dict[str, Callable[[np.ndarray, Any], np.ndarray]] = {
+        '>': np.greater,
+        '>=': np.greater_equal,
+        '<': np.less,
+        '<=': np.less_equal,
+        '=': np.equal,
+        '!=': lambda a, b: np.not_equal(a, b) & ~np.isnan(a) & ~np.isnan(b)
+    }
+
+    # 股票基本信息列（覆盖宽表中的同名列）
+    BASIC_COLUMNS = ('industry', 'area', 'symbol', 'name', 'list_date')
+
+    def __init__(self, max_results: int = 200, version_check_interval: int = 60,
+                 history_cache_size: int = 5, history_max_days: int = 366,
+                 history_horizons: Optional[List[int]] = None):
+        """
+        Args:
+            max_results: 默认每页返回数量
+            version_check_interval: 检查最新交易日的最小间隔（秒）
+            history_cache_size: 缓存的非最新交易日截面数量
+            history_max_days: 历史区间筛选的最大自然日跨度
+            history_horizons: 历史区间筛选默认统计的远期收益天数
+        """
+        self.max_results = max_results
+        self.history_max_days = history_max_days
+        self.history_horizons = history_horizons or [1, 5, 20]
+        self.version_check_interval = version_check_interval
+        self.history_snapshots = TTLCache(max_size=history_cache_size)
+
+        self._latest: Optional[ScreenerSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # ---------- 截面加载 ----------
+
+    def load_snapshot(self, trade_date) -> ScreenerSnapshot:
+        """一次查询读取某个交易日的宽表截面并关联股票基本信息"""
+        basic_columns = [getattr(StockBasic, column).label(f"basic_{column}") for column in self.BASIC_COLUMNS]
+        statement = select(StockBusiness.__table__, *basic_columns).join(
+            StockBasic, StockBusiness.ts_code == StockBasic.ts_code
+        ).where(StockBusiness.trade_date == trade_date).order_by(StockBusiness.ts_code)
+
+        start = time.perf_counter()
+        frame = pd.read_sql(statement, db.engine)
+        for column in self.BASIC_COLUMNS:
+            frame[column] = frame.pop(f"basic_{column}")
+
+        snapshot = ScreenerSnapshot(trade_date, frame)
+        logger.info(f"选股截面加载完成: {trade_date}, {snapshot.size} 只股票, "
+                    f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+        return snapshot
+
+    def _latest_trade_date(self):
+        return db.session.query(db.func.max(StockBusiness.trade_date)).scalar()
+
+    def get_snapshot(self, trade_date=None) -> Optional[ScreenerSnapshot]:
+        """
+        获取截面：不指定交易日时为最新截面，
+        最多每 version_check_interval 秒检查一次是否有新交易日，有则重新加载
+        """
+        if trade_date is not None:
+            if self._latest is not None and self._latest.trade_date == trade_date:
+                return self._latest
+            snapshot = self.history_snapshots.get(trade_date)
+            if snapshot is None:
+                snapshot = self.load_snapshot(trade_date)
+                self.history_snapshots.set(trade_date, snapshot)
+            return snapshot
+
+        now = time.monotonic()
+        if self._latest is not None and now - self._checked_at < self.version_check_interval:
+            return self._latest
+
+        with self._lock:
+            if self._latest is None or now - self._checked_at >= self.version_check_interval:
+                latest_date = self._latest_trade_date()
+                if latest_date is None:
+                    return None
+                if self._latest is None or self._latest.trade_date != latest_date:
+                    self._latest = self.load_snapshot(latest_date)
+                self._checked_at = now
+
+        return self._latest
+
+    def refresh(self):
+        """数据同步后调用：丢弃已加载的截面，下次筛选时重新加载"""
+        with self._lock:
+            self._latest = None
+            self._checked_at = 0.0
+        self.history_snapshots.clear()
+
+    # ---------- 条件编译 ----------
+
+    def compile_mask(self, snapshot: ScreenerSnapshot, criteria: Dict) -> np.ndarray:
+        """筛选条件编译为布尔掩码（截面为一维，多日面板为 交易日×股票 二维）"""
+        if snapshot.present is None:
+            mask = np.ones(snapshot.shape, dtype=bool)
+        else:
+            mask = snapshot.present.copy()
+
+        # 基本条件
+        for column in ('industry', 'area'):
+            if criteria.get(column):
+                mask &= snapshot.category_mask(column, criteria[column])
+
+        market = criteria.get('market')
+        if market in ('SZ', 'SH'):
+            mask &= np.char.endswith(snapshot.ts_codes, f".{market}")
+
+        # 区间条件
+        for prefix, field in self.RANGE_FILTERS.items():
+            values = snapshot.numeric.get(field)
+            if values is None:
+                continue
+            if criteria.get(f"{prefix}_min"):
+                mask &= values >= float(criteria[f"{prefix}_min"])
+            if criteria.get(f"{prefix}_max"):
+                mask &= values <= float(criteria[f"{prefix}_max"])
+
+        # 动态条件
+        for condition in criteria.get('dynamic_conditions', []):
+            condition_mask = self._compile_dynamic_condition(snapshot, condition)
+            if condition_mask is not None:
+                mask &= condition_mask
+
+        return mask
+
+    def _compile_dynamic_condition(self, snapshot: ScreenerSnapshot, condition: Dict) -> Optional[np.ndarray]:
+        field_a = condition.get('field_a')
+        operator = self.OPERATORS.get(condition.get('operator'))
+        field_b = condition.get('field_b')
+        value = condition.get('value')
+
+        if not field_a or operator is None:
+            return None
+
+        values_a = snapshot.numeric.get(field_a)
+        if values_a is None:
+            return None
+
+        if field_b:
+            # 字段间比较
+            values_b = snapshot.numeric.get(field_b)
+            if values_b is None:
+                return None
+            return operator(values_a, values_b)
+
+        if value is not None:
+            # 字段与固定值比较
+            try:
+                return operator(values_a, float(value))
+            except ValueError:
+                logger.warning(f"动态条件值转换失败: {value}")
+        return None
+
+    # ---------- 排序与分页 ----------
+
+    def sort_indexes(self, snapshot: ScreenerSnapshot, indexes: np.ndarray,
+                     sort_by: Optional[str], sort_order: str = 'desc') -> np.ndarray:
+        """按数值字段排序（缺失值始终排在最后）；未指定或字段不存在时保持股票代码顺序"""
+        values = snapshot.numeric.get(sort_by) if sort_by else None
+        if values is None:
+            return indexes
+
+        keys = values[indexes]
+        if sort_order != 'asc':
+            keys = -keys
+        return indexes[np.argsort(keys, kind='stable')]
+
+    def screen(self, criteria: Dict) -> Dict[str, Any]:
+        """执行筛选"""
+        start = time.perf_counter()
+
+        trade_date = None
+        if criteria.get('trade_date'):
+            trade_date = datetime.strptime(criteria['trade_date'], '%Y-%m-%d').date()
+
+        snapshot = self.get_snapshot(trade_date)
+        if snapshot is None:
+            return {'stocks': [], 'total': 0, 'criteria': criteria, 'has_more': False}
+
+        indexes = np.flatnonzero(self.compile_mask(snapshot, criteria))
+        indexes = self.sort_indexes(snapshot, indexes, criteria.get('sort_by'), criteria.get('sort_order', 'desc'))
+
+        page = max(int(criteria.get('page') or 1), 1)
+        page_size = max(min(int(criteria.get('page_size') or self.max_results), self.max_results), 1)
+        offset = (page - 1) * page_size
+
+        total_count = len(indexes)
+        stocks = snapshot.records(indexes[offset:offset + page_size])
+        has_more = total_count > offset + page_size
+
+        logger.info(f"股票筛选完成，共找到 {total_count} 只股票，返回 {len(stocks)} 只，"
+                    f"耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        return {
+            'stocks': stocks,
+            'total': total_count,
+            'criteria': criteria,
+            'has_more': has_more,
+            'trade_date': str(snapshot.trade_date),
+            'page': page,
+            'page_size': page_size
+        }
+
+    # ---------- 历史区间筛选 ----------
+
+    def _criteria_fields(self, criteria: Dict) -> List[str]:
+        """条件和排序用到的宽表字段（多日面板只加载这些列）"""
+        fields = [field for prefix, field in self.RANGE_FILTERS.items()
+                  if criteria.get(f"{prefix}_min") or criteria.get(f"{prefix}_max")]
+        for condition in criteria.get('dynamic_conditions', []):
+            fields.extend([condition.get('field_a'), condition.get('field_b')])
+        fields.append(criteria.get('sort_by'))
+
+        columns = set(StockBusiness.__table__.columns.keys()) - {'ts_code', 'trade_date'}
+        return sorted({field for field in fields if field in columns})
+
+    def load_panel(self, start_date, end_date, fields: List[str]) -> Optional[ScreenerPanel]:
+        """一次查询读取区间内宽表的指定字段，转为 交易日×股票 面板"""
+        statement = select(
+            StockBusiness.ts_code, StockBusiness.trade_date, *[getattr(StockBusiness, field) for field in fields]
+        ).where(StockBusiness.trade_date.between(start_date, end_date))
+        frame = pd.read_sql(statement, db.engine)
+        if frame.empty:
+            return None
+
+        attributes = pd.read_sql(
+            select(StockBasic.ts_code, StockBasic.industry, StockBasic.area), db.engine
+        ).drop_duplicates('ts_code').set_index('ts_code')
+        return ScreenerPanel.from_long(frame, fields, attributes)
+
+    def load_forward_returns(self, panel: ScreenerPanel, horizons: List[int]) -> Dict[int, np.ndarray]:
+        """面板每个交易日之后 h 日的累计收益（日线涨跌幅复利），形状与面板一致"""
+        start_date = panel.trade_dates[0].date()
+        end_date = panel.trade_dates[-1].date()
+
+        # 区间末尾之后还需要 max(horizons) 个交易日的收益
+        later_dates = db.session.query(StockDailyHistory.trade_date).filter(
+            StockDailyHistory.trade_date > end_date
+        ).distinct().order_by(StockDailyHistory.trade_date).limit(max(horizons)).all()
+        last_date = later_dates[-1][0] if later_dates else end_date
+
+        statement = select(
+            StockDailyHistory.ts_code, StockDailyHistory.trade_date, StockDailyHistory.pct_chg
+        ).where(StockDailyHistory.trade_date.between(start_date, last_date))
+        frame = pd.read_sql(statement, db.engine)
+
+        empty = {horizon: np.full(panel.shape, np.nan) for horizon in horizons}
+        if frame.empty:
+            return empty
+
+        frame['trade_date'] = pd.to_datetime(frame['trade_date'])
+        returns = frame.pivot(index='trade_date', columns='ts_code', values='pct_chg')
+        returns = returns.sort_index().reindex(columns=panel.ts_codes).to_numpy(dtype=float) / 100
+
+        # 面板交易日在日线交易日中的行号（日线缺失的交易日为NaN）
+        rows = pd.DatetimeIndex(frame['trade_date'].drop_duplicates().sort_values()).get_indexer(panel.trade_dates)
+        found = rows >= 0
+
+        for horizon in horizons:
+            forward = compound_forward_returns(returns, horizon)
+            empty[horizon][found] = forward[rows[found]]
+        return empty
+
+    def _sort_panel(self, panel: ScreenerPanel, mask: np.ndarray, sort_by: Optional[str],
+                    sort_order: str = 'desc') -> np.ndarray:
+        """每个交易日内的排序：命中股票在前，按排序字段排列（缺失值在后），其余按股票代码"""
+        position = np.broadcast_to(np.arange(panel.size), panel.shape)
+        values = panel.numeric.get(sort_by) if sort_by else None
+        if values is None:
+            return np.lexsort((position, ~mask), axis=1)
+
+        keys = values if sort_order == 'asc' else -values
+        missing = np.isnan(keys)
+        return np.lexsort((position, np.where(missing, 0.0, keys), missing, ~mask), axis=1)
+
+    @staticmethod
+    def _float(value) -> Optional[float]:
+        return None if value is None or np.isnan(value) else float(value)
+
+    def _forward_stats(self, mask: np.ndarray, universe: np.ndarray,
+                       forward: np.ndarray) -> Dict[str, np.ndarray]:
+        """命中股票与全市场的逐日平均远期收益、胜率"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            valid = ~np.isnan(forward)
+            hits = mask & valid
+            hit_count = hits.sum(axis=1)
+            hit_mean = np.where(hits, forward, 0.0).sum(axis=1) / hit_count
+            hit_wins = (hits & (forward > 0)).sum(axis=1)
+
+            universe = universe & valid
+            universe_mean = np.where(universe, forward, 0.0).sum(axis=1) / universe.sum(axis=1)
+
+        return {
+            'count': hit_count,
+            'mean': hit_mean,
+            'wins': hit_wins,
+            'excess': hit_mean - universe_mean
+        }
+
+    def screen_history(self, criteria: Dict) -> Dict[str, Any]:
+        """
+        历史区间筛选：同一组条件在区间内每个交易日上一次性向量化求值
+
+        criteria 在单日筛选条件之外还支持：
+            start_date / end_date: 区间（YYYY-MM-DD），end_date 默认最新交易日
+            horizons: 远期收益天数列表，默认配置值
+            max_hits: 每日返回的命中股票数上限
+        """
+        start = time.perf_counter()
+
+        if not criteria.get('start_date'):
+            raise ValueError('历史筛选需要 start_date')
+        start_date = datetime.strptime(criteria['start_date'], '%Y-%m-%d').date()
+        if criteria.get('end_date'):
+            end_date = datetime.strptime(criteria['end_date'], '%Y-%m-%d').date()
+        else:
+            end_date = self._latest_trade_date()
+        if end_date is None or end_date < start_date:
+            raise ValueError(f"无效的日期区间: {start_date} ~ {end_date}")
+        if (end_date - start_date).days > self.history_max_days:
+            raise ValueError(f"日期区间不能超过 {self.history_max_days} 天")
+
+        horizons = sorted({int(horizon) for horizon in (criteria.get('horizons') or self.history_horizons)
+                           if int(horizon) > 0})
+        max_hits = max(min(int(criteria.get('max_hits') or self.max_results), self.max_results), 0)
+
+        panel = self.load_panel(start_date, end_date, self._criteria_fields(criteria))
+        if panel is None:
+            return {'days': [], 'summary': {}, 'trade_days': 0, 'criteria': criteria}
+
+        mask = self.compile_mask(panel, criteria)
+        order = self._sort_panel(panel, mask, criteria.get('sort_by'), criteria.get('sort_order', 'desc'))
+        hit_counts = mask.sum(axis=1)
+
+        stats = {}
+        if horizons:
+            forward_returns = self.load_forward_returns(panel, horizons)
+            stats = {horizon: self._forward_stats(mask, panel.present, forward_returns[horizon])
+                     for horizon in horizons}
+
+        days = []
+        for i, trade_date in enumerate(panel.trade_dates):
+            day_returns = {}
+            for horizon, horizon_stats in stats.items():
+                count = int(horizon_stats['count'][i])
+                day_returns[f"{horizon}d"] = {
+                    'mean': self._float(horizon_stats['mean'][i]),
+                    'excess': self._float(horizon_stats['excess'][i]),
+                    'win_rate': float(horizon_stats['wins'][i]) / count if count else None
+                }
+            days.append({
+                'trade_date': trade_date.strftime('%Y-%m-%d'),
+                'count': int(hit_counts[i]),
+                'ts_codes': panel.ts_codes[order[i, :min(hit_counts[i], max_hits)]].tolist(),
+                'forward_returns': day_returns
+            })
+
+        summary = {}
+        for horizon, horizon_stats in stats.items():
+            daily_mean = horizon_stats['mean']
+            realized = ~np.isnan(daily_mean)
+            total = int(horizon_stats['count'].sum())
+            summary[f"{horizon}d"] = {
+                'days': int(realized.sum()),
+                'hits': total,
+                'mean_return': self._float(daily_mean[realized].mean()) if realized.any() else None,
+                'median_return': self._float(np.median(daily_mean[realized])) if realized.any() else None,
+                'excess_return': self._float(np.nanmean(horizon_stats['excess'][realized])) if realized.any() else None,
+                'win_rate': float(horizon_stats['wins'].sum()) / total if total else None,
+                'day_win_rate': float((daily_mean[realized] > 0).mean()) if realized.any() else None
+            }
+
+        logger.info(f"历史筛选完成: {start_date} ~ {end_date}, {len(panel.trade_dates)} 个交易日, "
+                    f"{panel.size} 只股票, 命中 {int(hit_counts.sum())} 次, "
+                    f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        return {
+            'days': days,
+            'summary': summary,
+            'trade_days': len(panel.trade_dates),
+            'horizons': horizons,
+            'start_date': str(start_date),
+            'end_date': str(end_date),
+            'criteria': criteria
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'latest_trade_date': str(self._latest.trade_date) if self._latest else None,
+            'latest_size': self._latest.size if self._latest else 0,
+            'history_snapshots': len(self.history_snapshots)
+        }
+
+
+# 全局选股引擎实例
+stock_screener = StockScreener(
+    max_results=Config.SCREENER_MAX_RESULTS,
+    version_check_interval=Config.SCREENER_VERSION_CHECK_INTERVAL,
+    history_cache_size=Config.SCREENER_HISTORY_CACHE_SIZE,
+    history_max_days=Config.SCREENER_HISTORY_MAX_DAYS,
+    history_horizons=Config.SCREENER_HISTORY_HORIZONS
+)
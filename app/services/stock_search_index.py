@@ -0,0 +1,277 @@
+"""
+股票搜索索引
+StockBasic 全量加载到内存，按以下索引做自动补全：
+- 代码前缀：ts_code / symbol 的有序键数组，二分查找前缀区间
+- 名称前缀与拼音首字母前缀（如 gzmt -> 贵州茅台），同样为有序键数组
+- 子串：代码和名称的 n-gram 倒排表（单字 + 二元组），候选求交后校验
+结果按 完全匹配 > 代码前缀 > 名称前缀 > 拼音首字母前缀 > 子串 排序；
+超过刷新间隔后在后台线程重建，重建期间继续使用当前索引
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import current_app
+from loguru import logger
+from pypinyin import Style, lazy_pinyin
+
+from app.models.stock_basic import StockBasic
+from config import Config
+
+# 汉字（基本区、扩展A、兼容区、扩展B及以后）
+CJK_PATTERN = re.compile('[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\U00020000-\U0003134f]+')
+
+# 多音字：除按词组判定的读音外，其他读音的声母也建立索引
+POLYPHONES = {
+    '行': 'hx', '重': 'cz', '长': 'cz', '藏': 'cz', '乐': 'ly', '朝': 'cz',
+    '调': 'dt', '传': 'cz', '解': 'jx', '单': 'ds', '省': 'sx', '曾': 'cz', '会': 'hk',
+    '晟': 'cs'
+}
+
+# 单个名称最多展开的多音字组合数
+MAX_INITIAL_VARIANTS = 8
+
+
+def _name_initials(name: str) -> Optional[List[str]]:
+    """
+    名称中每个可索引字符的候选首字母（英文数字原样小写，其他符号跳过）
+
+    Returns:
+        每个字符一个候选串；有无法识别读音的汉字时返回None
+    """
+    chars = []
+    position = 0
+    for match in CJK_PATTERN.finditer(name):
+        chars.extend(char.lower() for char in name[position:match.start()] if char.isascii() and char.isalnum())
+
+        run = match.group()
+        # 按词组判定读音（重庆 -> cq，银行 -> yh），无法识别的字原样返回
+        initials = lazy_pinyin(run, style=Style.FIRST_LETTER)
+        if len(initials) != len(run) or not all(initial.isascii() and initial.isalpha() for initial in initials):
+            return None
+        for char, initial in zip(run, initials):
+            chars.append(initial + POLYPHONES.get(char, '').replace(initial, ''))
+        position = match.end()
+
+    chars.extend(char.lower() for char in name[position:] if char.isascii() and char.isalnum())
+    return chars
+
+
+def pinyin_initials(name: str) -> List[str]:
+    """
+    名称的拼音首字母串（多音字展开为多个），如 贵州茅台 -> ['gzmt']
+
+    名称先做NFKC规范化（全角字母数字转半角）；含无法识别读音的汉字时不建立首字母索引，
+    避免索引一个缺字的错误串
+    """
+    chars = _name_initials(unicodedata.normalize('NFKC', name or ''))
+    if not chars:
+        return []
+
+    variants = ['']
+    for initials in chars:
+        variants = [prefix + initial for prefix in variants for initial in initials][:MAX_INITIAL_VARIANTS]
+    return variants
+
+
+class PrefixIndex:
+    """有序键数组上的前缀查找"""
+
+    def __init__(self, pairs: Iterable[Tuple[str, int]]):
+        self._pairs = sorted(set(pairs))
+        self._keys = [key for key, _ in self._pairs]
+
+    def exact(self, key: str) -> List[int]:
+        i = bisect_left(self._keys, key)
+        ids = []
+        while i < len(self._keys) and self._keys[i] == key:
+            ids.append(self._pairs[i][1])
+            i += 1
+        return ids
+
+    def prefix(self, prefix: str, limit: int) -> List[int]:
+        """前缀匹配的ID（按键排序去重，最多limit个）"""
+        i = bisect_left(self._keys, prefix)
+        ids = []
+        while i < len(self._keys) and self._keys[i].startswith(prefix) and len(ids) < limit:
+            if self._pairs[i][1] not in ids:
+                ids.append(self._pairs[i][1])
+            i += 1
+        return ids
+
+
+class StockSearchIndex:
+    """股票自动补全索引"""
+
+    def __init__(self, refresh_interval: int = 3600):
+        """
+        Args:
+            refresh_interval: 自动重建间隔（秒），其他进程同步股票列表后最迟在此间隔后生效
+        """
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        # 同一时间只允许一个线程重建
+        self._build_lock = threading.Lock()
+        self._next_refresh = 0.0
+        self.is_built = False
+
+        self._stocks: List[Dict[str, Any]] = []
+        self._code_index = PrefixIndex([])
+        self._name_index = PrefixIndex([])
+        self._initials_index = PrefixIndex([])
+        self._grams: Dict[str, Set[int]] = {}
+        self._texts: List[str] = []
+
+    # ---------- 构建 ----------
+
+    def build(self):
+        """一次查询加载全部股票并重建索引（需在应用上下文中调用，已有线程在重建时等待其完成后再重建）"""
+        with self._build_lock:
+            self._build()
+
+    def _build(self):
+        start = time.perf_counter()
+        stocks = [stock.to_dict() for stock in StockBasic.query.order_by(StockBasic.symbol).all()]
+
+        code_pairs, name_pairs, initials_pairs = [], [], []
+        grams: Dict[str, Set[int]] = {}
+        texts = []
+
+        for i, stock in enumerate(stocks):
+            ts_code = (stock['ts_code'] or '').lower()
+            symbol = (stock['symbol'] or '').lower()
+            # 全角字母数字转半角，与查询的规范化一致
+            name = unicodedata.normalize('NFKC', stock['name'] or '').lower()
+
+            code_pairs.extend((key, i) for key in (ts_code, symbol) if key)
+            if name:
+                name_pairs.append((name, i))
+                # 去掉 ST、*ST 前缀后的名称也可前缀匹配
+                stripped = name.lstrip('*')
+                if stripped.startswith('st') and stripped[2:].strip():
+                    name_pairs.append((stripped[2:].strip(), i))
+            initials_pairs.extend((initials, i) for initials in pinyin_initials(stock['name']))
+
+            # 子串候选：代码和名称的单字与二元组
+            text = f"{ts_code}\n{symbol}\n{name}"
+            texts.append(text)
+            for field in (ts_code, symbol, name):
+                for n in (1, 2):
+                    for j in range(len(field) - n + 1):
+                        grams.setdefault(field[j:j + n], set()).add(i)
+
+        with self._lock:
+            self._stocks = stocks
+            self._code_index = PrefixIndex(code_pairs)
+            self._name_index = PrefixIndex(name_pairs)
+            self._initials_index = PrefixIndex(initials_pairs)
+            self._grams = grams
+            self._texts = texts
+            self._next_refresh = time.monotonic() + self.refresh_interval
+            self.is_built = True
+
+        logger.info(f"股票搜索索引构建完成: {len(stocks)} 只股票, {len(grams)} 个n-gram, "
+                    f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def _build_in_background(self, app):
+        try:
+            with app.app_context():
+                self._build()
+        except Exception as e:
+            # 失败后等下一个刷新间隔再重试，期间继续使用旧索引
+            self._next_refresh = time.monotonic() + self.refresh_interval
+            logger.error(f"股票搜索索引后台重建失败: {e}")
+        finally:
+            self._build_lock.release()
+
+    def ensure_fresh(self):
+        """首次使用时同步构建；超过刷新间隔时启动一个后台线程重建，不阻塞查询"""
+        if not self.is_built:
+            with self._build_lock:
+                if not self.is_built:
+                    self._build()
+            return
+
+        if time.monotonic() < self._next_refresh or not self._build_lock.acquire(blocking=False):
+            return
+        if time.monotonic() < self._next_refresh:
+            # 抢到锁前其他线程刚完成重建
+            self._build_lock.release()
+            return
+
+        try:
+            threading.Thread(target=self._build_in_background, args=(current_app._get_current_object(),),
+                             name='stock-search-index', daemon=True).start()
+        except Exception:
+            self._build_lock.release()
+            raise
+
+    # ---------- 查询 ----------
+
+    def _substring(self, query: str) -> List[int]:
+        """n-gram 求交得到候选，再校验子串"""
+        n = 2 if len(query) >= 2 else 1
+        grams = {query[j:j + n] for j in range(len(query) - n + 1)}
+
+        postings = []
+        for gram in grams:
+            ids = self._grams.get(gram)
+            if not ids:
+                return []
+            postings.append(ids)
+
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        if n == 2 and len(query) > 2:
+            candidates = {i for i in candidates if query in self._texts[i]}
+        return sorted(candidates)
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """按相关度返回匹配的股票"""
+        self.ensure_fresh()
+
+        query = unicodedata.normalize('NFKC', query or '').strip().lower()
+        if not query or limit <= 0:
+            return []
+
+        ranked: List[int] = []
+        seen: Set[int] = set()
+
+        def collect(ids: Iterable[int]) -> bool:
+            for i in ids:
+                if i not in seen:
+                    seen.add(i)
+                    ranked.append(i)
+                    if len(ranked) >= limit:
+                        return True
+            return False
+
+        with self._lock:
+            tiers = (
+                lambda: self._code_index.exact(query) + self._name_index.exact(query)
+                + self._initials_index.exact(query),
+                lambda: self._code_index.prefix(query, limit),
+                lambda: self._name_index.prefix(query, limit),
+                lambda: self._initials_index.prefix(query, limit),
+                lambda: self._substring(query)
+            )
+            for tier in tiers:
+                if collect(tier()):
+                    break
+
+            return [dict(self._stocks[i]) for i in ranked]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'is_built': self.is_built,
+            'stock_count': len(self._stocks),
+            'gram_count': len(self._grams)
+        }
+
+
+# 全局搜索索引实例
+stock_search_index = StockSearchIndex(refresh_interval=Config.STOCK_SEARCH_REFRESH_INTERVAL)
@@ -7,6 +7,7 @@ from app.models import (
     StockFactor, StockMaData, StockMoneyflow, StockCyqPerf
 )
 from app.utils.cache import cached
+from app.utils.pagination import paginate
 from loguru import logger
 import pandas as pd
 import numpy as np
@@ -16,8 +17,8 @@ class StockService:
     
     @staticmethod
     @cached(expire=1800, key_prefix='stock_basic')
-    def get_stock_list(industry=None, area=None, page=1, page_size=20):
-        """获取股票列表 - 优先显示有数据的股票"""
+    def get_stock_list(industry=None, area=None, page=None, page_size=20, cursor=None):
+        """获取股票列表 - 优先显示有数据的股票（传cursor或不传page时按ts_code键集分页）"""
         try:
             # 首先尝试从stock_basic表获取
             query = StockBasic.query
@@ -28,22 +29,27 @@ class StockService:
             if area:
                 query = query.filter(StockBasic.area == area)
             
-            # 分页
-            offset = (page - 1) * page_size
-            stocks = query.offset(offset).limit(page_size).all()
-            total = query.count()
+            # 分页，总数按筛选条件缓存
+            pagination = paginate(
+                query, [StockBasic.ts_code], count_key=('stock_basic', industry, area),
+                per_page=page_size, page=page, cursor=cursor
+            )
             
             # 如果stock_basic表有数据，直接返回
-            if stocks:
+            if pagination['items']:
                 return {
-                    'stocks': [stock.to_dict() for stock in stocks],
-                    'total': total,
-                    'page': page,
+                    'stocks': [stock.to_dict() for stock in pagination['items']],
+                    'total': pagination['total'],
+                    'page': pagination['page'],
                     'page_size': page_size,
-                    'total_pages': (total + page_size - 1) // page_size
+                    'total_pages': pagination['pages'],
+                    'has_next': pagination['has_next'],
+                    'next_cursor': pagination['next_cursor']
                 }
             
             # 如果stock_basic表没有数据，从stock_minute_data表获取有数据的股票
+            page = page or 1
+            offset = (page - 1) * page_size
             logger.info("stock_basic表无数据，从stock_minute_data表获取股票列表")
             from app.models.stock_minute_data import StockMinuteData
             
@@ -84,9 +90,13 @@ class StockService:
                 'total_pages': (total_minute_stocks + page_size - 1) // page_size
             }
             
+        except ValueError:
+            # 无效的分页游标，交给接口返回400（不缓存空结果）
+            raise
         except Exception as e:
             logger.error(f"获取股票列表失败: {e}")
-            return {'stocks': [], 'total': 0, 'page': page, 'page_size': page_size, 'total_pages': 0}
+            return {'stocks': [], 'total': 0, 'page': page, 'page_size': page_size, 'total_pages': 0,
+                    'has_next': False, 'next_cursor': None}
     
     @staticmethod
     @cached(expire=600, key_prefix='stock_info')
@@ -319,215 +329,43 @@ class StockService:
     
     @staticmethod
     def screen_stocks(criteria: Dict):
-        """基于股票业务大宽表的增强筛选"""
+        """基于股票业务大宽表的增强筛选
+        
+        最新交易日截面常驻内存（列式NumPy数组），条件编译为布尔掩码后排序分页，
+        支持 sort_by / sort_order / page / page_size
+        """
         try:
-            from app.models import StockBusiness
-            from sqlalchemy import and_, or_, text
-            from datetime import datetime, timedelta
-            
-            # 构建基础查询，关联stock_basic表获取行业和地域信息
-            query = db.session.query(StockBusiness, StockBasic).join(
-                StockBasic, StockBusiness.ts_code == StockBasic.ts_code
-            )
-            
-            # 确定查询日期
-            target_date = None
-            if criteria.get('trade_date'):
-                target_date = datetime.strptime(criteria['trade_date'], '%Y-%m-%d').date()
-                query = query.filter(StockBusiness.trade_date == target_date)
-            else:
-                # 使用最新数据，先获取最新日期
-                latest_date = db.session.query(db.func.max(StockBusiness.trade_date)).scalar()
-                if latest_date:
-                    query = query.filter(StockBusiness.trade_date == latest_date)
-            
-            # 基本条件筛选
-            if criteria.get('industry'):
-                query = query.filter(StockBasic.industry == criteria['industry'])
-            
-            if criteria.get('area'):
-                query = query.filter(StockBasic.area == criteria['area'])
-            
-            if criteria.get('market'):
-                market = criteria['market']
-                if market == 'SZ':
-                    query = query.filter(StockBusiness.ts_code.like('%.SZ'))
-                elif market == 'SH':
-                    query = query.filter(StockBusiness.ts_code.like('%.SH'))
-            
-            # 估值指标筛选
-            if criteria.get('pe_min'):
-                query = query.filter(StockBusiness.pe >= float(criteria['pe_min']))
-            if criteria.get('pe_max'):
-                query = query.filter(StockBusiness.pe <= float(criteria['pe_max']))
-            
-            if criteria.get('pb_min'):
-                query = query.filter(StockBusiness.pb >= float(criteria['pb_min']))
-            if criteria.get('pb_max'):
-                query = query.filter(StockBusiness.pb <= float(criteria['pb_max']))
-            
-            if criteria.get('ps_min'):
-                query = query.filter(StockBusiness.ps >= float(criteria['ps_min']))
-            if criteria.get('ps_max'):
-                query = query.filter(StockBusiness.ps <= float(criteria['ps_max']))
-            
-            if criteria.get('dv_min'):
-                query = query.filter(StockBusiness.dv_ratio >= float(criteria['dv_min']))
-            if criteria.get('dv_max'):
-                query = query.filter(StockBusiness.dv_ratio <= float(criteria['dv_max']))
-            
-            # 市值和交易指标筛选
-            if criteria.get('mv_min'):
-                query = query.filter(StockBusiness.total_mv >= float(criteria['mv_min']))
-            if criteria.get('mv_max'):
-                query = query.filter(StockBusiness.total_mv <= float(criteria['mv_max']))
-            
-            if criteria.get('circ_mv_min'):
-                query = query.filter(StockBusiness.circ_mv >= float(criteria['circ_mv_min']))
-            if criteria.get('circ_mv_max'):
-                query = query.filter(StockBusiness.circ_mv <= float(criteria['circ_mv_max']))
-            
-            if criteria.get('turnover_min'):
-                query = query.filter(StockBusiness.turnover_rate >= float(criteria['turnover_min']))
-            if criteria.get('turnover_max'):
-                query = query.filter(StockBusiness.turnover_rate <= float(criteria['turnover_max']))
-            
-            if criteria.get('volume_ratio_min'):
-                query = query.filter(StockBusiness.volume_ratio >= float(criteria['volume_ratio_min']))
-            if criteria.get('volume_ratio_max'):
-                query = query.filter(StockBusiness.volume_ratio <= float(criteria['volume_ratio_max']))
-            
-            # 技术指标筛选
-            if criteria.get('rsi6_min'):
-                query = query.filter(StockBusiness.factor_rsi_6 >= float(criteria['rsi6_min']))
-            if criteria.get('rsi6_max'):
-                query = query.filter(StockBusiness.factor_rsi_6 <= float(criteria['rsi6_max']))
-            
-            if criteria.get('kdj_k_min'):
-                query = query.filter(StockBusiness.factor_kdj_k >= float(criteria['kdj_k_min']))
-            if criteria.get('kdj_k_max'):
-                query = query.filter(StockBusiness.factor_kdj_k <= float(criteria['kdj_k_max']))
-            
-            if criteria.get('macd_min'):
-                query = query.filter(StockBusiness.factor_macd >= float(criteria['macd_min']))
-            if criteria.get('macd_max'):
-                query = query.filter(StockBusiness.factor_macd <= float(criteria['macd_max']))
-            
-            if criteria.get('cci_min'):
-                query = query.filter(StockBusiness.factor_cci >= float(criteria['cci_min']))
-            if criteria.get('cci_max'):
-                query = query.filter(StockBusiness.factor_cci <= float(criteria['cci_max']))
-            
-            # 资金流向筛选
-            if criteria.get('net_amount_min'):
-                query = query.filter(StockBusiness.moneyflow_net_amount >= float(criteria['net_amount_min']))
-            if criteria.get('net_amount_max'):
-                query = query.filter(StockBusiness.moneyflow_net_amount <= float(criteria['net_amount_max']))
-            
-            if criteria.get('lg_buy_rate_min'):
-                query = query.filter(StockBusiness.moneyflow_buy_lg_amount_rate >= float(criteria['lg_buy_rate_min']))
-            if criteria.get('lg_buy_rate_max'):
-                query = query.filter(StockBusiness.moneyflow_buy_lg_amount_rate <= float(criteria['lg_buy_rate_max']))
-            
-            if criteria.get('net_d5_amount_min'):
-                query = query.filter(StockBusiness.moneyflow_net_d5_amount >= float(criteria['net_d5_amount_min']))
-            if criteria.get('net_d5_amount_max'):
-                query = query.filter(StockBusiness.moneyflow_net_d5_amount <= float(criteria['net_d5_amount_max']))
-            
-            # 处理动态查询条件
-            dynamic_conditions = criteria.get('dynamic_conditions', [])
-            for condition in dynamic_conditions:
-                field_a = condition.get('field_a')
-                operator = condition.get('operator')
-                field_b = condition.get('field_b')
-                value = condition.get('value')
-                
-                if not field_a or not operator:
-                    continue
-                
-                # 构建动态条件
-                if field_b:
-                    # 字段间比较
-                    field_a_attr = getattr(StockBusiness, field_a, None)
-                    field_b_attr = getattr(StockBusiness, field_b, None)
-                    
-                    if field_a_attr is not None and field_b_attr is not None:
-                        if operator == '>':
-                            query = query.filter(field_a_attr > field_b_attr)
-                        elif operator == '>=':
-                            query = query.filter(field_a_attr >= field_b_attr)
-                        elif operator == '<':
-                            query = query.filter(field_a_attr < field_b_attr)
-                        elif operator == '<=':
-                            query = query.filter(field_a_attr <= field_b_attr)
-                        elif operator == '=':
-                            query = query.filter(field_a_attr == field_b_attr)
-                        elif operator == '!=':
-                            query = query.filter(field_a_attr != field_b_attr)
-                elif value is not None:
-                    # 字段与固定值比较
-                    field_a_attr = getattr(StockBusiness, field_a, None)
-                    
-                    if field_a_attr is not None:
-                        try:
-                            value_float = float(value)
-                            if operator == '>':
-                                query = query.filter(field_a_attr > value_float)
-                            elif operator == '>=':
-                                query = query.filter(field_a_attr >= value_float)
-                            elif operator == '<':
-                                query = query.filter(field_a_attr < value_float)
-                            elif operator == '<=':
-                                query = query.filter(field_a_attr <= value_float)
-                            elif operator == '=':
-                                query = query.filter(field_a_attr == value_float)
-                            elif operator == '!=':
-                                query = query.filter(field_a_attr != value_float)
-                        except ValueError:
-                            logger.warning(f"动态条件值转换失败: {value}")
-                            continue
-            
-            # 执行查询
-            results = query.all()
-            
-            # 转换为字典列表，合并StockBusiness和StockBasic的数据
-            stocks = []
-            for stock_business, stock_basic in results:
-                stock_dict = stock_business.to_dict()
-                # 添加基本信息
-                stock_dict.update({
-                    'industry': stock_basic.industry,
-                    'area': stock_basic.area,
-                    'symbol': stock_basic.symbol,
-                    'name': stock_basic.name,
-                    'list_date': stock_basic.list_date.strftime('%Y-%m-%d') if stock_basic.list_date else None
-                })
-                stocks.append(stock_dict)
-            
-            # 限制返回数量，避免数据过多
-            max_results = 200
-            total_count = len(stocks)
-            has_more = total_count > max_results
-            
-            if has_more:
-                stocks = stocks[:max_results]
+            from app.services.stock_screener import stock_screener
             
-            logger.info(f"股票筛选完成，共找到 {total_count} 只股票，返回 {len(stocks)} 只")
+            return stock_screener.screen(criteria)
             
+        except Exception as e:
+            logger.error(f"股票筛选失败: {e}")
+            import traceback
+            logger.error(f"详细错误: {traceback.format_exc()}")
             return {
-                'stocks': stocks,
-                'total': total_count,
+                'stocks': [],
+                'total': 0,
                 'criteria': criteria,
-                'has_more': has_more
+                'error': str(e)
             }
+    
+    @staticmethod
+    def screen_stocks_history(criteria: Dict):
+        """历史区间筛选：同一组条件在区间内每个交易日的命中股票和远期收益统计"""
+        try:
+            from app.services.stock_screener import stock_screener
+            
+            return stock_screener.screen_history(criteria)
             
         except Exception as e:
-            logger.error(f"股票筛选失败: {e}")
+            logger.error(f"历史筛选失败: {e}")
             import traceback
             logger.error(f"详细错误: {traceback.format_exc()}")
             return {
-                'stocks': [],
-                'total': 0,
+                'days': [],
+                'summary': {},
+                'trade_days': 0,
                 'criteria': criteria,
                 'error': str(e)
             }
@@ -0,0 +1,159 @@
+"""
+Text2SQL多级缓存
+- 解析缓存：标准化后的查询文本 -> 意图与实体（纯计算结果，进程内LRU）
+- 结果缓存：规范化SQL + 绑定参数 + 数据版本 -> 查询结果（带TTL，数据更新后自动换键失效）
+"""
+
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from app.extensions import db
+from app.models.stock_daily_history import StockDailyHistory
+from app.utils.cache import TTLCache, cache
+from config import Config
+
+
+class Text2SQLCache:
+    """Text2SQL多级缓存"""
+
+    # 句末不影响语义的标点和语气词
+    TRAILING_PATTERN = re.compile(r'[\s?？!！.。,，~～]*(?:吗|呢|啊|呀|吧)?[\s?？!！.。,，~～]*$')
+
+    def __init__(self, parse_cache_size: int = 2000, result_cache_size: int = 500,
+                 result_ttl: int = 300, version_check_interval: int = 60,
+                 backend: str = 'memory', key_prefix: str = 'text2sql'):
+        """
+        Args:
+            parse_cache_size: 解析缓存最大条目数
+            result_cache_size: 结果缓存最大条目数（进程内）
+            result_ttl: 结果缓存过期时间（秒）
+            version_check_interval: 检查数据版本（最新交易日）的最小间隔（秒）
+            backend: 结果缓存后端，'memory' 或 'redis'（多进程共享）
+            key_prefix: Redis键前缀
+        """
+        self.parse_cache = TTLCache(max_size=parse_cache_size)
+        self.result_cache = TTLCache(max_size=result_cache_size, ttl=result_ttl)
+        self.result_ttl = result_ttl
+        self.version_check_interval = version_check_interval
+        self.backend = backend
+        self.key_prefix = key_prefix
+
+        self._data_version = None
+        self._version_checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # ---------- 键规范化 ----------
+
+    def normalize_query(self, user_query: str) -> str:
+        """标准化查询文本：全角转半角、合并空白、去掉句末标点和语气词"""
+        query = unicodedata.normalize('NFKC', user_query or '')
+        query = re.sub(r'\s+', ' ', query).strip()
+        return self.TRAILING_PATTERN.sub('', query)
+
+    def canonical_sql(self, sql: str) -> str:
+        """规范化SQL：合并空白、去掉末尾分号"""
+        return re.sub(r'\s+', ' ', sql or '').strip().rstrip(';').strip()
+
+    # ---------- 解析缓存 ----------
+
+    def get_parse(self, normalized_query: str, user_query: str) -> Optional[Dict[str, Any]]:
+        """命中时返回副本，原始查询替换为本次输入"""
+        intent_result = self.parse_cache.get(normalized_query)
+        if intent_result is None:
+            return None
+        intent_result = copy.deepcopy(intent_result)
+        intent_result['original_query'] = user_query
+        return intent_result
+
+    def set_parse(self, normalized_query: str, intent_result: Dict[str, Any]):
+        # 解析出错的结果不缓存
+        if intent_result.get('error'):
+            return
+        self.parse_cache.set(normalized_query, intent_result)
+
+    # ---------- 结果缓存 ----------
+
+    def get_data_version(self) -> str:
+        """数据版本：日线最新交易日，最多每version_check_interval秒查询一次"""
+        now = time.monotonic()
+        if self._data_version is not None and now - self._version_checked_at < self.version_check_interval:
+            return self._data_version
+
+        with self._lock:
+            if self._data_version is None or now - self._version_checked_at >= self.version_check_interval:
+                try:
+                    latest = db.session.query(db.func.max(StockDailyHistory.trade_date)).scalar()
+                    version = latest.isoformat() if latest else 'empty'
+                except Exception as e:
+                    logger.error(f"获取Text2SQL数据版本失败: {e}")
+                    version = self._data_version or 'unknown'
+
+                if self._data_version is not None and version != self._data_version:
+                    logger.info(f"数据版本更新 {self._data_version} -> {version}，Text2SQL结果缓存失效")
+                    self.result_cache.clear()
+
+                self._data_version = version
+                self._version_checked_at = now
+
+        return self._data_version
+
+    def _result_key(self, sql: str, params: Optional[Dict[str, Any]] = None) -> str:
+        raw = self.canonical_sql(sql)
+        if params:
+            raw += '|' + json.dumps(params, sort_keys=True, default=str)
+        digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        return f"{self.key_prefix}:result:{self.get_data_version()}:{digest}"
+
+    def get_result(self, sql: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        key = self._result_key(sql, params)
+
+        result = self.result_cache.get(key)
+        if result is None and self.backend == 'redis':
+            result = cache.get(key)
+            if result is not None:
+                self.result_cache.set(key, result)
+        return result
+
+    def set_result(self, sql: str, params: Optional[Dict[str, Any]], execution_result: Dict[str, Any]):
+        # 只缓存成功的结果
+        if not execution_result.get('success'):
+            return
+
+        key = self._result_key(sql, params)
+        self.result_cache.set(key, execution_result)
+        if self.backend == 'redis':
+            cache.set(key, execution_result, expire=self.result_ttl)
+
+    # ---------- 管理 ----------
+
+    def clear(self):
+        """清空进程内缓存（Redis中的结果按TTL过期）"""
+        self.parse_cache.clear()
+        self.result_cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': self.backend,
+            'data_version': self._data_version,
+            'parse_cache': self.parse_cache.get_stats(),
+            'result_cache': self.result_cache.get_stats()
+        }
+
+
+def create_text2sql_cache() -> Text2SQLCache:
+    """按配置创建缓存"""
+    return Text2SQLCache(
+        parse_cache_size=Config.TEXT2SQL_PARSE_CACHE_SIZE,
+        result_cache_size=Config.TEXT2SQL_RESULT_CACHE_SIZE,
+        result_ttl=Config.TEXT2SQL_RESULT_CACHE_TTL,
+        version_check_interval=Config.TEXT2SQL_DATA_VERSION_CHECK_INTERVAL,
+        backend=Config.TEXT2SQL_CACHE_BACKEND
+    )
@@ -3,35 +3,44 @@ Text2SQL核心引擎
 整合自然语言处理、SQL生成和查询执行功能
 """
 
+import re
 import time
 import traceback
-from typing import Dict, List, Any, Optional
+from decimal import Decimal
+from typing import Dict, List, Any, Optional, Tuple
 from flask import request
 from sqlalchemy import text
 from app.extensions import db
-from app.services.nlp_processor import NLPProcessor
-from app.services.sql_generator import SQLGenerator
+from app.services.nlp_processor import get_nlp_processor
+from app.services.sql_generator import SQLGenerator, render_sql
 from app.services.llm_service import get_llm_service
+from app.services.text2sql_cache import create_text2sql_cache
 from app.models.text2sql_metadata import QueryHistory
+from config import Config
 
 
 class Text2SQLEngine:
     """Text2SQL引擎"""
     
     def __init__(self):
-        self.nlp_processor = NLPProcessor()
+        self.nlp_processor = get_nlp_processor()
         self.sql_generator = SQLGenerator()
         self.query_executor = QueryExecutor()
         self.result_formatter = ResultFormatter()
         self.llm_service = get_llm_service()
+        self.cache = create_text2sql_cache()
     
     def process_query(self, user_query: str) -> Dict[str, Any]:
         """处理用户查询"""
         start_time = time.time()
         
         try:
-            # 1. 自然语言理解
-            intent_result = self.nlp_processor.parse_intent(user_query)
+            # 1. 自然语言理解（相同或仅标点、空白不同的问题直接复用解析结果）
+            normalized_query = self.cache.normalize_query(user_query)
+            intent_result = self.cache.get_parse(normalized_query, user_query)
+            if intent_result is None:
+                intent_result = self.nlp_processor.parse_intent(user_query)
+                self.cache.set_parse(normalized_query, intent_result)
             
             # 2. SQL生成
             sql_result = self.sql_generator.generate_sql(intent_result)
@@ -43,10 +52,13 @@ class Text2SQLEngine:
                     sql_result = {
                         'success': True,
                         'sql': enhanced_sql,
+                        'params': {},
                         'template_used': 'llm_enhanced',
                         'explanation': '使用大模型增强生成的SQL'
                     }
             
+            sql_params = sql_result.get('params') or {}
+            
             if not sql_result['success']:
                 return self._create_error_response(
                     user_query, intent_result, None, 
@@ -54,12 +66,16 @@ class Text2SQLEngine:
                     time.time() - start_time
                 )
             
-            # 4. 执行查询
-            execution_result = self.query_executor.execute(sql_result['sql'])
+            # 4. 执行查询（结果按规范化SQL和数据版本缓存）
+            execution_result = self.cache.get_result(sql_result['sql'], sql_params)
+            cache_hit = execution_result is not None
+            if not cache_hit:
+                execution_result = self.query_executor.execute(sql_result['sql'], sql_params)
+                self.cache.set_result(sql_result['sql'], sql_params, execution_result)
             
             if not execution_result['success']:
                 return self._create_error_response(
-                    user_query, intent_result, sql_result['sql'],
+                    user_query, intent_result, render_sql(sql_result['sql'], sql_params),
                     execution_result.get('error', '查询执行失败'),
                     time.time() - start_time
                 )
@@ -74,7 +90,7 @@ class Text2SQLEngine:
             # 6. 记录查询历史
             execution_time = time.time() - start_time
             self._save_query_history(
-                user_query, intent_result, sql_result['sql'],
+                user_query, intent_result, render_sql(sql_result['sql'], sql_params),
                 len(execution_result['data']), True, None,
                 sql_result.get('template_used'), execution_time
             )
@@ -85,13 +101,15 @@ class Text2SQLEngine:
                 'intent': intent_result['intent'],
                 'entities': intent_result['entities'],
                 'sql': sql_result['sql'],
+                'params': sql_params,
                 'data': execution_result['data'],
                 'formatted_data': formatted_result['data'],
                 'chart_config': formatted_result.get('chart_config'),
                 'explanation': sql_result.get('explanation'),
                 'execution_time': execution_time,
                 'result_count': len(execution_result['data']),
-                'llm_enhanced': sql_result.get('template_used') == 'llm_enhanced'
+                'llm_enhanced': sql_result.get('template_used') == 'llm_enhanced',
+                'cache_hit': cache_hit
             }
             
         except Exception as e:
@@ -244,48 +262,56 @@ class Text2SQLEngine:
 
 
 class QueryExecutor:
-    """查询执行器"""
+    """查询执行器
+    
+    - 在SQL上强制 LIMIT max+1，数据库端就截断超大结果
+    - 服务端游标分批读取，不一次性把结果集拉进内存
+    - MySQL上通过 MAX_EXECUTION_TIME 提示限制单条语句执行时间
+    - 按列批量转换为可JSON序列化的值
+    """
+    
+    LIMIT_PATTERN = re.compile(r'\bLIMIT\s+(\d+|:\w+)(?:\s*,\s*(\d+|:\w+))?(\s+OFFSET\s+(?:\d+|:\w+))?\s*$', re.IGNORECASE)
     
     def __init__(self):
-        self.max_result_count = 1000  # 最大结果数量限制
+        self.max_result_count = Config.TEXT2SQL_MAX_RESULT_COUNT  # 最大结果数量限制
+        self.statement_timeout = Config.TEXT2SQL_STATEMENT_TIMEOUT  # 单条语句超时（秒）
+        self.fetch_size = Config.TEXT2SQL_FETCH_SIZE  # 每批读取行数
     
-    def execute(self, sql: str) -> Dict[str, Any]:
-        """执行SQL查询"""
+    def execute(self, sql: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """执行SQL查询（数值以绑定参数传入）"""
         try:
             if not sql:
                 return {'success': False, 'error': 'SQL为空'}
             
-            # 执行查询
-            result = db.session.execute(text(sql))
+            bounded_sql, params = self._prepare_sql(sql, params or {})
             
-            # 获取列名
-            columns = list(result.keys())
-            
-            # 获取数据
-            rows = result.fetchall()
+            # 服务端游标流式读取
+            result = db.session.execute(
+                text(bounded_sql).execution_options(stream_results=True, max_row_buffer=self.fetch_size),
+                params
+            )
             
-            # 检查结果数量限制
-            if len(rows) > self.max_result_count:
-                return {
-                    'success': False,
-                    'error': f'查询结果过多({len(rows)}条)，请添加更多筛选条件'
-                }
+            try:
+                # 获取列名
+                columns = list(result.keys())
+                
+                # 分批读取，超过上限立即停止
+                rows = []
+                while True:
+                    batch = result.fetchmany(self.fetch_size)
+                    if not batch:
+                        break
+                    rows.extend(batch)
+                    if len(rows) > self.max_result_count:
+                        return {
+                            'success': False,
+                            'error': f'查询结果过多(超过{self.max_result_count}条)，请添加更多筛选条件'
+                        }
+            finally:
+                result.close()
             
             # 转换为字典列表
-            data = []
-            for row in rows:
-                row_dict = {}
-                for i, column in enumerate(columns):
-                    value = row[i]
-                    # 处理特殊数据类型
-                    if value is not None:
-                        if isinstance(value, (int, float)):
-                            row_dict[column] = value
-                        else:
-                            row_dict[column] = str(value)
-                    else:
-                        row_dict[column] = None
-                data.append(row_dict)
+            data = self._rows_to_records(columns, rows)
             
             return {
                 'success': True,
@@ -304,6 +330,8 @@ class QueryExecutor:
                 error_msg = '字段不存在，请检查查询条件'
             elif 'syntax error' in error_msg.lower():
                 error_msg = 'SQL语法错误'
+            elif 'maximum statement execution time exceeded' in error_msg.lower():
+                error_msg = f'查询执行超时(超过{self.statement_timeout}秒)，请缩小查询范围'
             
             return {
                 'success': False,
@@ -312,6 +340,63 @@ class QueryExecutor:
                 'columns': [],
                 'row_count': 0
             }
+    
+    def _prepare_sql(self, sql: str, params: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """注入结果数量上限和执行超时"""
+        sql = sql.strip().rstrip(';').strip()
+        params = dict(params)
+        limit = self.max_result_count + 1
+        
+        def bounded(token: str) -> Optional[str]:
+            """LIMIT数量不超过上限时返回None，否则返回替换后的数量"""
+            if token.startswith(':'):
+                name = token[1:]
+                value = params.get(name)
+                if value is None or int(value) > limit:
+                    params[name] = limit
+                return None
+            return str(limit) if int(token) > limit else None
+        
+        # 已有LIMIT时取较小值，没有则追加
+        match = self.LIMIT_PATTERN.search(sql)
+        if match:
+            if match.group(2) is not None:
+                # LIMIT offset, count
+                count = bounded(match.group(2))
+                if count is not None:
+                    sql = f"{sql[:match.start()]}LIMIT {match.group(1)}, {count}"
+            else:
+                count = bounded(match.group(1))
+                if count is not None:
+                    sql = f"{sql[:match.start()]}LIMIT {count}{match.group(3) or ''}"
+        else:
+            sql = f"{sql} LIMIT {limit}"
+        
+        if self.statement_timeout and db.engine.dialect.name == 'mysql':
+            sql = re.sub(
+                r'^\s*SELECT\b',
+                f'SELECT /*+ MAX_EXECUTION_TIME({int(self.statement_timeout * 1000)}) */',
+                sql, count=1, flags=re.IGNORECASE
+            )
+        
+        return sql, params
+    
+    def _rows_to_records(self, columns: List[str], rows: List[Any]) -> List[Dict[str, Any]]:
+        """按列转换：每列只判断一次类型，数值原样保留，Decimal转float，其余转字符串"""
+        if not rows:
+            return []
+        
+        converted_columns = []
+        for values in zip(*rows):
+            sample = next((value for value in values if value is not None), None)
+            if sample is None or isinstance(sample, (int, float)):
+                converted_columns.append(values)
+            elif isinstance(sample, Decimal):
+                converted_columns.append([None if value is None else float(value) for value in values])
+            else:
+                converted_columns.append([None if value is None else str(value) for value in values])
+        
+        return [dict(zip(columns, row)) for row in zip(*converted_columns)]
 
 
 class ResultFormatter:
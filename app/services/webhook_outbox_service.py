@@ -0,0 +1,169 @@
+"""
+Webhook发件箱分发服务
+后台轮询发件箱，将同一Webhook在聚合窗口内的多条预警合并为一条汇总消息发送
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict
+
+from app.extensions import db
+from app.models.webhook_config import WebhookConfig
+from app.models.webhook_outbox import WebhookOutbox
+from app.services.webhook_service import webhook_dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookOutboxService:
+    """Webhook发件箱分发服务"""
+
+    def __init__(self, digest_window: int = 10, max_digest_size: int = 20,
+                 poll_interval: float = 2.0, batch_limit: int = 1000,
+                 max_attempts: int = 5, retry_delay: int = 30,
+                 send_timeout: float = 120):
+        """
+        Args:
+            digest_window: 聚合窗口（秒），最早一条等待超过该时间后发送
+            max_digest_size: 单条汇总消息包含的最大预警数，达到后立即发送
+            poll_interval: 轮询间隔（秒）
+            batch_limit: 每次轮询读取的最大条数
+            max_attempts: 最大发送轮次，超过后标记为失败
+            retry_delay: 发送失败后的基础重试延迟（秒），按次数指数增长
+            send_timeout: 等待一轮发送结果的最长时间（秒）
+        """
+        self.digest_window = digest_window
+        self.max_digest_size = max_digest_size
+        self.poll_interval = poll_interval
+        self.batch_limit = batch_limit
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.send_timeout = send_timeout
+
+        self.app = None
+        self.is_running = False
+        self.worker_thread = None
+
+    def start(self, app):
+        """启动后台分发线程"""
+        if self.is_running:
+            logger.warning("Webhook发件箱分发服务已在运行")
+            return
+
+        self.app = app
+        self.is_running = True
+        self.worker_thread = threading.Thread(target=self._run_loop, name='webhook-outbox', daemon=True)
+        self.worker_thread.start()
+        logger.info("Webhook发件箱分发服务已启动")
+
+    def stop(self):
+        """停止后台分发线程"""
+        self.is_running = False
+        if self.worker_thread:
+            self.worker_thread.join(timeout=5)
+        logger.info("Webhook发件箱分发服务已停止")
+
+    def _run_loop(self):
+        """分发循环"""
+        while self.is_running:
+            try:
+                with self.app.app_context():
+                    self.drain_once()
+            except Exception as e:
+                logger.error(f"Webhook发件箱分发失败: {e}")
+                with self.app.app_context():
+                    db.session.rollback()
+
+            time.sleep(self.poll_interval)
+
+    def drain_once(self, force: bool = False) -> Dict[str, int]:
+        """
+        处理一轮到期通知（需在应用上下文中调用）
+
+        Args:
+            force: 忽略聚合窗口，立即发送所有到期通知
+
+        Returns:
+            本轮统计
+        """
+        stats = {'messages': 0, 'sent_alerts': 0, 'failed_alerts': 0, 'deferred_alerts': 0}
+
+        entries = WebhookOutbox.get_due_entries(limit=self.batch_limit)
+        if not entries:
+            return stats
+
+        entries_by_webhook = defaultdict(list)
+        for entry in entries:
+            entries_by_webhook[entry.webhook_id].append(entry)
+
+        webhooks = {
+            webhook.id: webhook
+            for webhook in WebhookConfig.query.filter(WebhookConfig.id.in_(list(entries_by_webhook))).all()
+        }
+
+        now = datetime.utcnow()
+        jobs = []
+
+        for webhook_id, webhook_entries in entries_by_webhook.items():
+            webhook = webhooks.get(webhook_id)
+            if not webhook or not webhook.is_enabled or not webhook.is_active:
+                WebhookOutbox.mark_cancelled(webhook_entries, 'Webhook已删除或禁用')
+                continue
+
+            # 聚合窗口未到且未攒满，等待更多预警合并发送
+            oldest = min(entry.created_at for entry in webhook_entries)
+            if (not force and len(webhook_entries) < self.max_digest_size
+                    and (now - oldest).total_seconds() < self.digest_window):
+                stats['deferred_alerts'] += len(webhook_entries)
+                continue
+
+            webhook_config = webhook.to_dict()
+            for i in range(0, len(webhook_entries), self.max_digest_size):
+                chunk = webhook_entries[i:i + self.max_digest_size]
+                alerts = [entry.get_payload() for entry in chunk]
+                future = webhook_dispatcher.dispatch_digest(webhook_config, alerts)
+                jobs.append((webhook, chunk, future))
+
+        # 等待发送结果并更新状态
+        deadline = time.monotonic() + self.send_timeout
+        for webhook, chunk, future in jobs:
+            stats['messages'] += 1
+            try:
+                result = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except Exception as e:
+                result = {'success': False, 'message': f'等待发送结果失败: {str(e)}'}
+
+            if result.get('success'):
+                WebhookOutbox.mark_sent(chunk)
+                webhook.record_success()
+                stats['sent_alerts'] += len(chunk)
+                logger.info(f"Webhook汇总发送成功: {webhook.name}, 包含 {len(chunk)} 条预警")
+            else:
+                WebhookOutbox.mark_failed(chunk, result.get('message'), self.retry_delay, self.max_attempts)
+                webhook.record_failure()
+                stats['failed_alerts'] += len(chunk)
+                logger.error(f"Webhook汇总发送失败: {webhook.name} - {result.get('message')}")
+
+        db.session.commit()
+
+        if stats['messages']:
+            logger.info(f"Webhook发件箱处理完成: {stats}")
+
+        return stats
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取服务状态"""
+        return {
+            'is_running': self.is_running,
+            'digest_window': self.digest_window,
+            'max_digest_size': self.max_digest_size,
+            'poll_interval': self.poll_interval,
+            'outbox': WebhookOutbox.get_stats()
+        }
+
+
+# 全局实例
+webhook_outbox_service = WebhookOutboxService()
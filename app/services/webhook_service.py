@@ -3,10 +3,15 @@ Webhook通知服务
 支持飞书、钉钉、企业微信等多种Webhook消息发送
 """
 
+import re
 import json
 import asyncio
 import aiohttp
 import logging
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from urllib.parse import urlparse
@@ -17,9 +22,116 @@ import base64
 logger = logging.getLogger(__name__)
 
 
+class CompiledTemplate:
+    """预编译的消息模板
+
+    模板只解析一次，拆分为字面量片段和变量名，渲染时按片段拼接，
+    只计算模板中实际引用到的变量。
+    """
+
+    PLACEHOLDER_PATTERN = re.compile(r'\{\{(\w+)\}\}')
+
+    def __init__(self, template: str):
+        self.source = template
+        self.variables = set()
+
+        # (是否变量, 字面量或变量名, 原始占位符)
+        self._parts = []
+        pos = 0
+        for match in self.PLACEHOLDER_PATTERN.finditer(template):
+            if match.start() > pos:
+                self._parts.append((False, template[pos:match.start()], None))
+            self._parts.append((True, match.group(1), match.group(0)))
+            self.variables.add(match.group(1))
+            pos = match.end()
+        if pos < len(template):
+            self._parts.append((False, template[pos:], None))
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """渲染模板，未提供值的占位符原样保留"""
+        return ''.join(
+            (str(values[text]) if text in values else raw) if is_var else text
+            for is_var, text, raw in self._parts
+        )
+
+
+# 已编译模板缓存：{缓存键: CompiledTemplate}，模板内容变化时自动重新编译
+_template_cache = {}
+_template_cache_lock = threading.Lock()
+
+
+def get_compiled_template(config: Dict[str, Any]) -> Optional[CompiledTemplate]:
+    """获取Webhook配置对应的已编译模板（按配置ID缓存）"""
+    template = config.get('message_template')
+    if not template:
+        return None
+
+    cache_key = config.get('id') or template
+    compiled = _template_cache.get(cache_key)
+    if compiled is None or compiled.source != template:
+        compiled = CompiledTemplate(template)
+        with _template_cache_lock:
+            _template_cache[cache_key] = compiled
+    return compiled
+
+
+def invalidate_template_cache(webhook_id: Optional[int] = None):
+    """Webhook配置更新或删除后清除对应的已编译模板"""
+    with _template_cache_lock:
+        if webhook_id is None:
+            _template_cache.clear()
+        else:
+            _template_cache.pop(webhook_id, None)
+
+
+@lru_cache(maxsize=256)
+def _hmac_sign(key: str, message: str) -> str:
+    """计算 base64(HMAC-SHA256)，签名时间戳按窗口对齐，窗口内直接命中缓存"""
+    hmac_code = hmac.new(
+        key.encode('utf-8'),
+        message.encode('utf-8'),
+        digestmod=hashlib.sha256
+    ).digest()
+    return base64.b64encode(hmac_code).decode('utf-8')
+
+
 class WebhookService:
     """Webhook通知服务"""
 
+    # 预警级别对应的飞书卡片颜色
+    LEVEL_COLORS = {
+        'low': 'blue',
+        'medium': 'yellow',
+        'high': 'orange',
+        'critical': 'red'
+    }
+
+    # 预警级别名称
+    LEVEL_NAMES = {
+        'low': '低级预警',
+        'medium': '中级预警',
+        'high': '高级预警',
+        'critical': '严重预警'
+    }
+
+    # 预警级别排序（汇总消息取最高级别）
+    LEVEL_ORDER = ['low', 'medium', 'high', 'critical']
+
+    # 签名时间戳窗口（秒）：窗口内复用同一时间戳和签名，平台允许的时间偏差远大于该值
+    SIGN_WINDOW = 60
+
+    # 模板变量 -> 预警数据字段
+    TEMPLATE_FIELDS = {
+        'stock_code': 'ts_code',
+        'stock_name': 'stock_name',
+        'alert_level': 'alert_level',
+        'alert_type': 'alert_type',
+        'alert_message': 'alert_message',
+        'current_price': 'current_price',
+        'threshold_value': 'threshold_value',
+        'risk_value': 'risk_value'
+    }
+
     def __init__(self):
         self.session = None
         self.timeout = 30
@@ -98,13 +210,14 @@ class WebhookService:
 
         # 如果配置了签名，添加签名
         if config.get('secret'):
-            timestamp = str(int(datetime.now().timestamp()))
+            timestamp = self._get_sign_timestamp()
             sign = self._generate_feishu_sign(config['secret'], timestamp)
             headers['X-Lark-Request-Timestamp'] = timestamp
             headers['X-Lark-Signature'] = sign
 
         try:
-            async with self.session.post(url, json=message, headers=headers) as response:
+            async with self.session.post(url, json=message, headers=headers,
+                                         timeout=self._get_request_timeout(config)) as response:
                 if response.status == 200:
                     result = await response.json()
 
@@ -147,27 +260,12 @@ class WebhookService:
                              config: Dict[str, Any]) -> Dict[str, Any]:
         """构建飞书消息格式"""
 
-        # 获取消息模板
-        message_template = config.get('message_template')
-        if message_template:
+        # 获取已编译的消息模板
+        compiled = get_compiled_template(config)
+        if compiled:
             # 使用自定义模板
             try:
-                # 解析模板中的变量
-                template_vars = {
-                    'stock_code': alert_data.get('ts_code', ''),
-                    'stock_name': alert_data.get('stock_name', ''),
-                    'alert_level': alert_data.get('alert_level', ''),
-                    'alert_type': alert_data.get('alert_type', ''),
-                    'alert_message': alert_data.get('alert_message', ''),
-                    'current_price': alert_data.get('current_price', ''),
-                    'threshold_value': alert_data.get('threshold_value', ''),
-                    'risk_value': alert_data.get('risk_value', ''),
-                    'timestamp': alert_data.get('created_at', datetime.now().isoformat()),
-                    'change_percent': self._calculate_change_percent(alert_data)
-                }
-
-                # 替换模板变量
-                message_content = self._replace_template_vars(message_template, template_vars)
+                message_content = compiled.render(self._get_template_values(compiled, alert_data))
 
                 return {
                     "msg_type": "text",
@@ -178,24 +276,29 @@ class WebhookService:
 
             except Exception as e:
                 logger.error(f"处理飞书消息模板失败: {str(e)}")
-                # 使用默认消息
-        else:
-            # 使用默认消息格式
-            return self._build_default_feishu_message(alert_data)
+
+        # 使用默认消息格式
+        return self._build_default_feishu_message(alert_data)
+
+    def _get_template_values(self, compiled: CompiledTemplate,
+                             alert_data: Dict[str, Any]) -> Dict[str, Any]:
+        """只计算模板中引用到的变量"""
+        values = {}
+        for name in compiled.variables:
+            if name in self.TEMPLATE_FIELDS:
+                values[name] = alert_data.get(self.TEMPLATE_FIELDS[name], '')
+            elif name == 'timestamp':
+                values[name] = alert_data.get('created_at', datetime.now().isoformat())
+            elif name == 'change_percent':
+                values[name] = self._calculate_change_percent(alert_data)
+        return values
 
     def _build_default_feishu_message(self, alert_data: Dict[str, Any]) -> Dict[str, Any]:
         """构建默认飞书消息格式"""
 
         # 确定预警级别对应的颜色
-        level_colors = {
-            'low': 'blue',
-            'medium': 'yellow',
-            'high': 'orange',
-            'critical': 'red'
-        }
-
         alert_level = alert_data.get('alert_level', 'medium')
-        color = level_colors.get(alert_level, 'blue')
+        color = self.LEVEL_COLORS.get(alert_level, 'blue')
 
         # 股票代码和名称
         stock_code = alert_data.get('ts_code', '')
@@ -224,13 +327,7 @@ class WebhookService:
             })
 
         # 预警级别
-        level_names = {
-            'low': '低级预警',
-            'medium': '中级预警',
-            'high': '高级预警',
-            'critical': '严重预警'
-        }
-        level_name = level_names.get(alert_level, '未知级别')
+        level_name = self.LEVEL_NAMES.get(alert_level, '未知级别')
 
         elements.append({
             "tag": "div",
@@ -289,22 +386,231 @@ class WebhookService:
             }
         }
 
+    async def send_digest(self, webhook_config: Dict[str, Any],
+                          alerts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        发送预警汇总消息（同一Webhook在聚合窗口内的多条预警合并为一条）
+
+        Args:
+            webhook_config: Webhook配置
+            alerts: 预警数据列表
+
+        Returns:
+            发送结果
+        """
+        try:
+            webhook_type = webhook_config.get('type', 'generic')
+
+            # 单条飞书预警沿用原有格式（支持自定义模板）
+            if len(alerts) == 1 and webhook_type == 'feishu':
+                return await self.send_webhook(webhook_config, alerts[0])
+
+            message = self._build_digest_message(webhook_type, alerts)
+            if message is None:
+                return {
+                    'success': False,
+                    'message': f'不支持的Webhook类型: {webhook_type}',
+                    'error': 'unsupported_type'
+                }
+
+            return await self._post_message(webhook_config, message)
+
+        except Exception as e:
+            logger.error(f"发送预警汇总失败: {str(e)}")
+            return {
+                'success': False,
+                'message': f'发送预警汇总失败: {str(e)}',
+                'error': str(e)
+            }
+
+    def _build_digest_message(self, webhook_type: str,
+                              alerts: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """按平台格式构建预警汇总消息"""
+        title = f"🚨 股票异动预警汇总（{len(alerts)}条）"
+        lines = [self._format_digest_line(alert) for alert in alerts]
+
+        if webhook_type == 'feishu':
+            top_level = max(
+                (alert.get('alert_level', 'medium') for alert in alerts),
+                key=lambda level: self.LEVEL_ORDER.index(level) if level in self.LEVEL_ORDER else 0
+            )
+            return {
+                "msg_type": "interactive",
+                "card": {
+                    "config": {
+                        "wide_screen_mode": True
+                    },
+                    "header": {
+                        "title": {
+                            "tag": "plain_text",
+                            "content": title
+                        },
+                        "template": self.LEVEL_COLORS.get(top_level, 'blue')
+                    },
+                    "elements": [
+                        {
+                            "tag": "div",
+                            "text": {
+                                "tag": "lark_md",
+                                "content": line
+                            }
+                        }
+                        for line in lines
+                    ]
+                }
+            }
+        elif webhook_type == 'dingtalk':
+            return {
+                "msgtype": "markdown",
+                "markdown": {
+                    "title": title,
+                    "text": f"### {title}\n\n" + "\n".join(f"- {line}" for line in lines)
+                }
+            }
+        elif webhook_type == 'wechat_work':
+            return {
+                "msgtype": "markdown",
+                "markdown": {
+                    "content": f"**{title}**\n" + "\n".join(f"> {line}" for line in lines)
+                }
+            }
+        elif webhook_type == 'slack':
+            return {
+                "text": title,
+                "blocks": [
+                    {
+                        "type": "header",
+                        "text": {"type": "plain_text", "text": title}
+                    },
+                    {
+                        "type": "section",
+                        "text": {
+                            "type": "mrkdwn",
+                            # Slack的mrkdwn加粗使用单星号
+                            "text": "\n".join(f"• {line}" for line in lines).replace('**', '*')
+                        }
+                    }
+                ]
+            }
+        elif webhook_type == 'generic':
+            return {
+                "type": "alert_digest",
+                "count": len(alerts),
+                "alerts": alerts
+            }
+
+        return None
+
+    def _format_digest_line(self, alert_data: Dict[str, Any]) -> str:
+        """格式化汇总消息中的单条预警"""
+        stock_code = alert_data.get('ts_code', '')
+        stock_name = alert_data.get('stock_name', '')
+        stock_display = f"{stock_name}({stock_code})" if stock_name else stock_code
+        level_name = self.LEVEL_NAMES.get(alert_data.get('alert_level'), '未知级别')
+
+        line = f"**{level_name}** {stock_display} {alert_data.get('alert_message', '')}"
+        if alert_data.get('current_price'):
+            line += f" ¥{alert_data['current_price']}"
+        return line
+
+    async def _post_message(self, config: Dict[str, Any],
+                            message: Dict[str, Any]) -> Dict[str, Any]:
+        """按平台约定发送已构建好的消息并解析响应"""
+        url = config.get('url')
+        if not url:
+            return {
+                'success': False,
+                'message': 'Webhook URL未配置',
+                'error': 'missing_url'
+            }
+
+        webhook_type = config.get('type', 'generic')
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        params = None
+
+        if config.get('secret'):
+            if webhook_type == 'feishu':
+                timestamp = self._get_sign_timestamp()
+                headers['X-Lark-Request-Timestamp'] = timestamp
+                headers['X-Lark-Signature'] = self._generate_feishu_sign(config['secret'], timestamp)
+            elif webhook_type == 'dingtalk':
+                timestamp = str(int(self._get_sign_timestamp()) * 1000)
+                params = {
+                    'timestamp': timestamp,
+                    'sign': self._generate_dingtalk_sign(config['secret'], timestamp)
+                }
+
+        try:
+            async with self.session.post(url, json=message, headers=headers, params=params,
+                                         timeout=self._get_request_timeout(config)) as response:
+                if response.status != 200:
+                    return {
+                        'success': False,
+                        'message': f'HTTP错误: {response.status}',
+                        'error': f'http_{response.status}',
+                        'status_code': response.status
+                    }
+
+                if webhook_type in ('slack', 'generic'):
+                    return {
+                        'success': True,
+                        'message': '消息发送成功',
+                        'response': await response.text()
+                    }
+
+                result = await response.json(content_type=None)
+
+                # 飞书返回code，钉钉/企业微信返回errcode
+                code = result.get('code', result.get('errcode', 0))
+                if code == 0:
+                    return {
+                        'success': True,
+                        'message': '消息发送成功',
+                        'response': result
+                    }
+
+                return {
+                    'success': False,
+                    'message': f"平台API错误: {result.get('msg', result.get('errmsg', '未知错误'))}",
+                    'error': result,
+                    'code': code
+                }
+
+        except asyncio.TimeoutError:
+            return {
+                'success': False,
+                'message': '请求超时',
+                'error': 'timeout'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'网络请求失败: {str(e)}',
+                'error': str(e)
+            }
+
+    def _generate_dingtalk_sign(self, secret: str, timestamp: str) -> str:
+        """生成钉钉签名"""
+        return _hmac_sign(secret, f"{timestamp}\n{secret}")
+
+    def _get_request_timeout(self, config: Dict[str, Any]) -> aiohttp.ClientTimeout:
+        """按Webhook配置获取单次请求超时"""
+        return aiohttp.ClientTimeout(total=config.get('timeout') or self.timeout)
+
+    def _get_sign_timestamp(self) -> str:
+        """获取签名时间戳（秒），按SIGN_WINDOW对齐以复用签名"""
+        now = int(time.time())
+        return str(now - now % self.SIGN_WINDOW)
+
     def _generate_feishu_sign(self, secret: str, timestamp: str) -> str:
         """生成飞书签名"""
-        string_to_sign = f"{timestamp}\n{secret}"
-        hmac_code = hmac.new(
-            string_to_sign.encode('utf-8'),
-            digestmod=hashlib.sha256
-        ).digest()
-        return base64.b64encode(hmac_code).decode('utf-8')
+        return _hmac_sign(f"{timestamp}\n{secret}", '')
 
     def _replace_template_vars(self, template: str, vars_dict: Dict[str, Any]) -> str:
         """替换模板变量"""
-        result = template
-        for key, value in vars_dict.items():
-            placeholder = f"{{{{{key}}}}}"
-            result = result.replace(placeholder, str(value))
-        return result
+        return CompiledTemplate(template).render(vars_dict)
 
     def _calculate_change_percent(self, alert_data: Dict[str, Any]) -> str:
         """计算涨跌幅"""
@@ -344,32 +650,210 @@ class WebhookService:
         pass
 
 
+class WebhookDispatcher:
+    """长期运行的Webhook分发器
+
+    在后台线程中维护一个事件循环和共享的aiohttp会话（按主机复用连接池），
+    多个Webhook并发发送并受并发上限约束，每个目标独立超时和退避重试。
+    """
+
+    # 可重试的HTTP状态码
+    RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+    # 不可重试的错误（配置问题，重试也不会成功）
+    NON_RETRYABLE_ERRORS = {'unsupported_type', 'missing_url'}
+
+    def __init__(self, max_concurrency: int = 20, limit_per_host: int = 10,
+                 default_retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0):
+        self.max_concurrency = max_concurrency
+        self.limit_per_host = limit_per_host
+        self.default_retries = default_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._loop = None
+        self._thread = None
+        self._service = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """启动后台事件循环和共享会话"""
+        with self._start_lock:
+            if self._loop and self._loop.is_running():
+                return
+
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever,
+                                            name='webhook-dispatcher', daemon=True)
+            self._thread.start()
+
+            asyncio.run_coroutine_threadsafe(self._open_session(), self._loop).result()
+            logger.info("Webhook分发器已启动")
+
+    async def _open_session(self):
+        """在分发器事件循环中创建共享会话"""
+        self._service = WebhookService()
+        self._service.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self._service.timeout),
+            connector=aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                limit_per_host=self.limit_per_host
+            )
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _close_session(self):
+        """关闭共享会话"""
+        if self._service and self._service.session:
+            await self._service.session.close()
+
+    def stop(self):
+        """停止分发器"""
+        with self._start_lock:
+            if not self._loop:
+                return
+
+            try:
+                asyncio.run_coroutine_threadsafe(self._close_session(), self._loop).result(timeout=5)
+            except Exception as e:
+                logger.error(f"关闭Webhook会话失败: {str(e)}")
+
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            if self._thread:
+                self._thread.join(timeout=5)
+
+            self._loop = None
+            self._thread = None
+            self._service = None
+            logger.info("Webhook分发器已停止")
+
+    def _is_retryable(self, result: Dict[str, Any]) -> bool:
+        """判断发送失败是否值得重试"""
+        if not result:
+            return False
+        if result.get('error') in self.NON_RETRYABLE_ERRORS:
+            return False
+        if 'status_code' in result:
+            return result['status_code'] in self.RETRYABLE_STATUS
+        if 'code' in result:
+            # 平台业务错误（如签名错误）重试无效
+            return False
+        # 超时、网络错误
+        return True
+
+    async def _send_with_retry(self, webhook_config: Dict[str, Any], send) -> Dict[str, Any]:
+        """发送单个Webhook，失败时指数退避重试
+
+        Args:
+            webhook_config: Webhook配置
+            send: 无参协程函数，执行一次实际发送
+        """
+        retries = webhook_config.get('retry_count')
+        if retries is None:
+            retries = self.default_retries
+
+        result = None
+        for attempt in range(retries + 1):
+            async with self._semaphore:
+                result = await send()
+
+            if result is None:
+                result = {
+                    'success': False,
+                    'message': f"Webhook类型暂未实现: {webhook_config.get('type')}",
+                    'error': 'not_implemented'
+                }
+                break
+
+            if result.get('success') or not self._is_retryable(result) or attempt == retries:
+                break
+
+            delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+            logger.warning(f"Webhook发送失败，{delay}秒后重试({attempt + 1}/{retries}): "
+                           f"{webhook_config.get('name')} - {result.get('message')}")
+            await asyncio.sleep(delay)
+
+        result['attempts'] = attempt + 1
+        return result
+
+    async def _dispatch(self, webhook_configs: List[Dict[str, Any]],
+                        alert_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """并发发送到多个Webhook"""
+        results = await asyncio.gather(
+            *[
+                self._send_with_retry(config, lambda config=config: self._service.send_webhook(config, alert_data))
+                for config in webhook_configs
+            ],
+            return_exceptions=True
+        )
+
+        return [
+            result if not isinstance(result, Exception) else {
+                'success': False,
+                'message': f'发送Webhook失败: {str(result)}',
+                'error': str(result)
+            }
+            for result in results
+        ]
+
+    def dispatch(self, webhook_configs: List[Dict[str, Any]],
+                 alert_data: Dict[str, Any]) -> Future:
+        """
+        提交发送任务（不阻塞调用方）
+
+        Returns:
+            Future，结果为与webhook_configs一一对应的发送结果列表
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(
+            self._dispatch(webhook_configs, alert_data), self._loop
+        )
+
+    def dispatch_sync(self, webhook_configs: List[Dict[str, Any]],
+                      alert_data: Dict[str, Any],
+                      timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """同步发送并等待结果"""
+        return self.dispatch(webhook_configs, alert_data).result(timeout=timeout)
+
+
+    def dispatch_digest(self, webhook_config: Dict[str, Any],
+                        alerts: List[Dict[str, Any]]) -> Future:
+        """
+        提交一条预警汇总消息（不阻塞调用方）
+
+        Returns:
+            Future，结果为发送结果
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(
+            self._send_with_retry(webhook_config, lambda: self._service.send_digest(webhook_config, alerts)),
+            self._loop
+        )
+
+
 # 全局实例
 webhook_service = WebhookService()
+webhook_dispatcher = WebhookDispatcher()
 
 
 async def send_webhook_notification(webhook_config: Dict[str, Any],
                                    alert_data: Dict[str, Any]) -> Dict[str, Any]:
-    """发送Webhook通知的便捷函数"""
-    async with webhook_service as service:
+    """发送Webhook通知的便捷函数（每次调用独立会话，批量发送请使用webhook_dispatcher）"""
+    async with WebhookService() as service:
         return await service.send_webhook(webhook_config, alert_data)
 
 
 def sync_send_webhook_notification(webhook_config: Dict[str, Any],
                                   alert_data: Dict[str, Any]) -> Dict[str, Any]:
-    """同步发送Webhook通知"""
+    """同步发送Webhook通知（通过共享分发器，复用连接池）"""
     try:
-        # 在同步环境中使用asyncio.run
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(send_webhook_notification(webhook_config, alert_data))
-        finally:
-            loop.close()
+        return webhook_dispatcher.dispatch_sync([webhook_config], alert_data)[0]
     except Exception as e:
         logger.error(f"同步发送Webhook失败: {str(e)}")
         return {
             'success': False,
             'message': f'同步发送Webhook失败: {str(e)}',
             'error': str(e)
-        }
\ No newline at end of file
+        }
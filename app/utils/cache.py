@@ -1,4 +1,7 @@
 import json
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from app.extensions import redis_client
 from loguru import logger
@@ -61,6 +64,70 @@ class CacheManager:
             logger.error(f"检查缓存失败: {key}, 错误: {e}")
             return False
 
+class TTLCache:
+    """进程内LRU缓存，条目带过期时间（线程安全）"""
+    
+    def __init__(self, max_size=1000, ttl=None):
+        """
+        Args:
+            max_size: 最大条目数，超过后淘汰最久未使用的条目
+            ttl: 默认过期时间（秒），None为不过期
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key, default=None):
+        """获取缓存，过期或不存在时返回default"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expire_at = item
+                if expire_at is None or expire_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+    
+    def set(self, key, value, ttl=None):
+        """设置缓存"""
+        ttl = self.ttl if ttl is None else ttl
+        expire_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expire_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def delete(self, key):
+        """删除缓存"""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def get_stats(self):
+        """缓存统计"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
 # 全局缓存实例
 cache = CacheManager()
 
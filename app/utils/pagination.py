@@ -0,0 +1,154 @@
+"""
+键集（游标）分页
+按 (排序列..., 主键) 的元组比较定位下一页，代替 OFFSET 扫描，深翻页耗时与页码无关；
+总数按查询条件缓存，翻页时不再每页执行一次 count()
+"""
+
+import base64
+import json
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+
+from app.utils.cache import TTLCache
+from config import Config
+
+# 表名 -> (查询条件 -> 总数)，缓存期内返回的总数为近似值；按表分开以便数据变更后单独失效
+_count_caches: Dict[str, TTLCache] = {}
+_count_caches_lock = threading.Lock()
+
+
+def _count_cache(table: str) -> TTLCache:
+    with _count_caches_lock:
+        cache = _count_caches.get(table)
+        if cache is None:
+            cache = TTLCache(max_size=Config.PAGINATION_COUNT_CACHE_SIZE, ttl=Config.PAGINATION_COUNT_CACHE_TTL)
+            _count_caches[table] = cache
+        return cache
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """排序键编码为URL安全的游标字符串"""
+    data = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """游标字符串还原为排序键，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        if not isinstance(values, list):
+            raise ValueError
+        return [_decode_value(value) for value in values]
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError(f'无效的分页游标: {cursor}')
+
+
+def _after(columns: Sequence, values: Sequence[Any], descending: bool):
+    """(c1, c2, ...) 严格位于 values 之后的条件，展开为 c1 > v1 OR (c1 = v1 AND c2 > v2) ..."""
+    conditions = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        beyond = column < value if descending else column > value
+        equals = [prev == prev_value for prev, prev_value in zip(columns[:i], values[:i])]
+        conditions.append(and_(*equals, beyond) if equals else beyond)
+    return or_(*conditions)
+
+
+def cached_count(query, key: Tuple) -> int:
+    """
+    带缓存的总数
+
+    Args:
+        query: 带筛选条件的查询
+        key: 缓存键，第一个元素为表名，其余为全部筛选条件
+    """
+    cache = _count_cache(key[0])
+    total = cache.get(key)
+    if total is None:
+        total = query.order_by(None).count()
+        cache.set(key, total)
+    return total
+
+
+def clear_count_cache(table: Optional[str] = None):
+    """数据变更后清空总数缓存（table 为None时清空所有表）"""
+    with _count_caches_lock:
+        caches = list(_count_caches.values()) if table is None else [_count_caches.get(table)]
+    for cache in caches:
+        if cache is not None:
+            cache.clear()
+
+
+def paginate(query, order_columns: Sequence, count_key: Optional[Tuple] = None, per_page: int = 20,
+             page: Optional[int] = None, cursor: Optional[str] = None, descending: bool = False) -> Dict:
+    """
+    分页查询
+
+    传入 cursor 或未指定 page 时使用键集分页；只指定 page 时保留 OFFSET 分页以兼容旧客户端。
+    两种方式都返回 next_cursor，客户端可随时切换到游标翻页。
+
+    Args:
+        query: 带筛选条件、未排序的查询
+        order_columns: 排序列，最后一列必须唯一（通常为主键）
+        count_key: 总数缓存键（表名, 筛选条件...），为None时不计算总数
+        per_page: 每页数量
+        page: 页码（OFFSET分页）
+        cursor: 上一页返回的 next_cursor
+        descending: 是否倒序
+
+    Returns:
+        {'items', 'page', 'per_page', 'total', 'pages', 'has_next', 'has_prev', 'next_cursor'}
+    """
+    ordering = [column.desc() if descending else column.asc() for column in order_columns]
+    page_query = query
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(order_columns):
+            raise ValueError(f'无效的分页游标: {cursor}')
+        page_query = page_query.filter(_after(order_columns, values, descending))
+        page = None
+    elif page is not None:
+        page = max(page, 1)
+        page_query = page_query.offset((page - 1) * per_page)
+
+    # 多取一条判断是否还有下一页
+    rows = page_query.order_by(*ordering).limit(per_page + 1).all()
+    items = rows[:per_page]
+    has_next = len(rows) > per_page
+
+    next_cursor = None
+    if has_next:
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column in order_columns])
+
+    total = cached_count(query, count_key) if count_key is not None else None
+    return {
+        'items': items,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page if total is not None else None,
+        'has_next': has_next,
+        'has_prev': bool(cursor) or (page or 1) > 1,
+        'next_cursor': next_cursor
+    }
@@ -0,0 +1,119 @@
+"""
+WebSocket客户端出站队列
+为每个客户端维护有界发送队列，落后时按股票合并消息并自动降低推送频率
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Tuple
+
+
+class ClientSendQueue:
+    """单个客户端的有界出站队列
+
+    - 同一合并键（通常是股票代码）只保留最新一条消息
+    - 队列满时丢弃最旧的消息
+    - 根据未确认（ack）的消息数判断客户端是否落后，并动态调整推送间隔
+    """
+
+    def __init__(self, max_size: int = 200, base_interval: float = 0.5,
+                 max_interval: float = 8.0, lag_threshold: int = 50):
+        self.max_size = max_size
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.lag_threshold = lag_threshold
+
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.push_interval = base_interval
+        self.last_flush_at = 0.0
+        self.in_flight = 0
+        self.is_lagging = False
+
+        # 慢客户端指标
+        self.enqueued_count = 0
+        self.sent_count = 0
+        self.acked_count = 0
+        self.conflated_count = 0
+        self.dropped_count = 0
+        self.downgrade_count = 0
+        self.max_depth = 0
+
+    def put(self, key: Hashable, event: str, payload: Dict[str, Any]):
+        """加入待发送消息，同键消息直接覆盖"""
+        with self._lock:
+            self.enqueued_count += 1
+
+            if key in self._pending:
+                self._pending[key] = (event, payload)
+                self._pending.move_to_end(key)
+                self.conflated_count += 1
+                return
+
+            if len(self._pending) >= self.max_size:
+                self._pending.popitem(last=False)
+                self.dropped_count += 1
+
+            self._pending[key] = (event, payload)
+            self.max_depth = max(self.max_depth, len(self._pending))
+
+    def is_due(self, now: float = None) -> bool:
+        """是否到达本客户端的下一次推送时间"""
+        if not self._pending:
+            return False
+        now = time.monotonic() if now is None else now
+        return now - self.last_flush_at >= self.push_interval
+
+    def drain(self, now: float = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """取出全部待发送消息，并按积压情况调整推送间隔"""
+        with self._lock:
+            items = list(self._pending.values())
+            self._pending.clear()
+
+            self.last_flush_at = time.monotonic() if now is None else now
+            self.in_flight += len(items)
+            self.sent_count += len(items)
+            self._adjust_interval()
+
+        return items
+
+    def on_ack(self, *args):
+        """客户端确认收到一条消息（作为emit的callback使用）"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.acked_count += 1
+
+    def _adjust_interval(self):
+        """未确认消息过多时加倍推送间隔，追上后逐步恢复"""
+        if self.in_flight > self.lag_threshold:
+            if self.push_interval < self.max_interval:
+                self.push_interval = min(self.push_interval * 2, self.max_interval)
+                self.downgrade_count += 1
+            self.is_lagging = True
+        elif self.in_flight <= self.lag_threshold // 4 and self.push_interval > self.base_interval:
+            self.push_interval = max(self.push_interval / 2, self.base_interval)
+            self.is_lagging = self.push_interval > self.base_interval
+        elif self.push_interval <= self.base_interval:
+            self.is_lagging = False
+
+    def depth(self) -> int:
+        """当前队列深度"""
+        return len(self._pending)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列指标"""
+        return {
+            'depth': len(self._pending),
+            'max_depth': self.max_depth,
+            'in_flight': self.in_flight,
+            'push_interval': self.push_interval,
+            'is_lagging': self.is_lagging,
+            'enqueued': self.enqueued_count,
+            'sent': self.sent_count,
+            'acked': self.acked_count,
+            'conflated': self.conflated_count,
+            'dropped': self.dropped_count,
+            'downgrades': self.downgrade_count
+        }
@@ -4,10 +4,13 @@ WebSocket事件处理器 - 简化版本
 """
 
 import logging
+import time
 from datetime import datetime
 from flask import request
 from flask_socketio import emit, join_room, leave_room, disconnect
 from app.extensions import socketio
+from app.websocket.client_queue import ClientSendQueue
+from config import Config
 
 
 
@@ -17,6 +20,39 @@ logger = logging.getLogger(__name__)
 connected_clients = {}
 room_subscriptions = {}
 
+# 每个客户端的出站队列
+client_queues = {}
+
+# 队列发送循环的检查间隔（秒）
+DRAIN_TICK = 0.1
+_drain_task_started = False
+
+
+def _ensure_drain_task():
+    """按需启动出站队列发送循环"""
+    global _drain_task_started
+    if not _drain_task_started:
+        _drain_task_started = True
+        socketio.start_background_task(_drain_loop)
+
+
+def _drain_loop():
+    """逐个客户端发送到期的队列消息，慢客户端不会阻塞其他客户端"""
+    while True:
+        try:
+            now = time.monotonic()
+            for client_id, queue in list(client_queues.items()):
+                if not queue.is_due(now):
+                    continue
+
+                for event, payload in queue.drain(now):
+                    socketio.emit(event, payload, to=client_id, callback=queue.on_ack)
+
+        except Exception as e:
+            logger.error(f"发送客户端队列消息失败: {e}")
+
+        socketio.sleep(DRAIN_TICK)
+
 @socketio.on('connect')
 def handle_connect():
     """客户端连接事件"""
@@ -27,6 +63,13 @@ def handle_connect():
         'user_agent': request.headers.get('User-Agent', ''),
         'remote_addr': request.remote_addr
     }
+    client_queues[client_id] = ClientSendQueue(
+        max_size=Config.WS_CLIENT_QUEUE_SIZE,
+        base_interval=Config.WS_PUSH_INTERVAL,
+        max_interval=Config.WS_MAX_PUSH_INTERVAL,
+        lag_threshold=Config.WS_LAG_THRESHOLD
+    )
+    _ensure_drain_task()
     
     logger.info(f"客户端连接: {client_id} from {request.remote_addr}")
     
@@ -52,6 +95,7 @@ def handle_disconnect():
                     del room_subscriptions[subscription]
         
         del connected_clients[client_id]
+        client_queues.pop(client_id, None)
         logger.info(f"客户端断开连接: {client_id}")
 
 @socketio.on('subscribe')
@@ -145,14 +189,22 @@ def handle_ping():
 
 # 广播消息函数（供其他模块调用）
 def broadcast_market_data(symbol, data):
-    """广播市场数据更新"""
+    """广播市场数据更新（写入各订阅客户端的队列，落后时只保留每只股票的最新一条）"""
     room_name = f"market_data_{symbol}"
     if room_name in room_subscriptions and room_subscriptions[room_name]:
-        socketio.emit('market_data_update', {
+        payload = {
             'symbol': symbol,
             'data': data,
             'timestamp': datetime.now().isoformat()
-        }, room=room_name)
+        }
+        ts_code = data.get('ts_code', symbol) if isinstance(data, dict) else symbol
+        conflate_key = ('market_data_update', symbol, ts_code)
+
+        for client_id in list(room_subscriptions[room_name]):
+            queue = client_queues.get(client_id)
+            if queue:
+                queue.put(conflate_key, 'market_data_update', payload)
+
         logger.debug(f"广播市场数据到房间 {room_name}: {len(room_subscriptions[room_name])} 个客户端")
 
 def broadcast_risk_alert(alert_data):
@@ -165,10 +217,25 @@ def broadcast_risk_alert(alert_data):
         }, room=room_name)
         logger.info(f"广播风险预警到房间 {room_name}: {len(room_subscriptions[room_name])} 个客户端")
 
+def get_queue_stats():
+    """获取客户端出站队列统计（慢客户端指标）"""
+    client_stats = {client_id: queue.get_stats() for client_id, queue in list(client_queues.items())}
+    slow_clients = [client_id for client_id, stats in client_stats.items() if stats['is_lagging']]
+
+    return {
+        'total_queued': sum(stats['depth'] for stats in client_stats.values()),
+        'total_conflated': sum(stats['conflated'] for stats in client_stats.values()),
+        'total_dropped': sum(stats['dropped'] for stats in client_stats.values()),
+        'slow_clients': slow_clients,
+        'slow_client_count': len(slow_clients),
+        'clients': client_stats
+    }
+
 def get_connection_stats():
     """获取连接统计信息"""
     return {
         'total_clients': len(connected_clients),
         'total_rooms': len(room_subscriptions),
-        'room_details': {room: len(clients) for room, clients in room_subscriptions.items()}
+        'room_details': {room: len(clients) for room, clients in room_subscriptions.items()},
+        'queue_stats': get_queue_stats()
     }
\ No newline at end of file
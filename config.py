@@ -36,6 +36,12 @@ class Config:
     REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
     REDIS_DB = int(os.getenv('REDIS_DB', 0))
     
+    # WebSocket推送配置（每个客户端的出站队列）
+    WS_CLIENT_QUEUE_SIZE = int(os.getenv('WS_CLIENT_QUEUE_SIZE', 200))  # 队列上限（按股票合并后的条数）
+    WS_PUSH_INTERVAL = float(os.getenv('WS_PUSH_INTERVAL', 0.5))  # 正常推送间隔（秒）
+    WS_MAX_PUSH_INTERVAL = float(os.getenv('WS_MAX_PUSH_INTERVAL', 8.0))  # 慢客户端降级后的最大间隔（秒）
+    WS_LAG_THRESHOLD = int(os.getenv('WS_LAG_THRESHOLD', 50))  # 未确认消息超过该值视为慢客户端
+    
     # 日志配置
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', 'logs/stock_analysis.log')
@@ -49,10 +55,69 @@ class Config:
     EMAIL_SMTP_PORT = int(os.getenv('EMAIL_SMTP_PORT', 587))
     EMAIL_USERNAME = os.getenv('EMAIL_USERNAME', '')
     EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD', '')
+    ALERT_DEDUP_WINDOW = int(os.getenv('ALERT_DEDUP_WINDOW', 3600))  # 重复预警抑制窗口（秒）
+    ALERT_DEDUP_BACKEND = os.getenv('ALERT_DEDUP_BACKEND', 'memory')  # memory 或 redis（多进程共享）
+    ALERT_SWEEP_WORKERS = int(os.getenv('ALERT_SWEEP_WORKERS', 1))  # 预警检查分片并行的工作进程数，1为单进程
+    ALERT_SWEEP_PARALLEL_MIN_STOCKS = int(os.getenv('ALERT_SWEEP_PARALLEL_MIN_STOCKS', 500))  # 股票数达到该值才分片并行
+    ALERT_SWEEP_SHARD_TIMEOUT = int(os.getenv('ALERT_SWEEP_SHARD_TIMEOUT', 300))  # 单个分片的最长等待时间（秒）
+    
+    # 异动检测配置
+    ANOMALY_WINDOW = int(os.getenv('ANOMALY_WINDOW', 20))  # 收益率Z分数滚动窗口
+    ANOMALY_VOLUME_LOOKBACK = int(os.getenv('ANOMALY_VOLUME_LOOKBACK', 20))  # 成交量中位数回看交易日数
+    ANOMALY_ZSCORE_THRESHOLD = float(os.getenv('ANOMALY_ZSCORE_THRESHOLD', 3.0))  # 价格异动Z分数阈值
+    ANOMALY_VOLUME_SPIKE_RATIO = float(os.getenv('ANOMALY_VOLUME_SPIKE_RATIO', 3.0))  # 放量倍数阈值
+    ANOMALY_GAP_THRESHOLD = float(os.getenv('ANOMALY_GAP_THRESHOLD', 2.0))  # 跳空幅度阈值(%)
+    
+    # Text2SQL缓存配置
+    TEXT2SQL_PARSE_CACHE_SIZE = int(os.getenv('TEXT2SQL_PARSE_CACHE_SIZE', 2000))  # 解析缓存最大条目数
+    TEXT2SQL_RESULT_CACHE_SIZE = int(os.getenv('TEXT2SQL_RESULT_CACHE_SIZE', 500))  # 结果缓存最大条目数
+    TEXT2SQL_RESULT_CACHE_TTL = int(os.getenv('TEXT2SQL_RESULT_CACHE_TTL', 300))  # 结果缓存过期时间（秒）
+    TEXT2SQL_DATA_VERSION_CHECK_INTERVAL = int(os.getenv('TEXT2SQL_DATA_VERSION_CHECK_INTERVAL', 60))  # 数据版本检查间隔（秒）
+    TEXT2SQL_CACHE_BACKEND = os.getenv('TEXT2SQL_CACHE_BACKEND', 'memory')  # 结果缓存后端: memory / redis
+    TEXT2SQL_MAX_RESULT_COUNT = int(os.getenv('TEXT2SQL_MAX_RESULT_COUNT', 1000))  # 单次查询最大结果数
+    TEXT2SQL_STATEMENT_TIMEOUT = float(os.getenv('TEXT2SQL_STATEMENT_TIMEOUT', 10))  # 单条语句执行超时（秒）
+    TEXT2SQL_FETCH_SIZE = int(os.getenv('TEXT2SQL_FETCH_SIZE', 500))  # 服务端游标每批读取行数
+    TEXT2SQL_PLAN_CACHE_SIZE = int(os.getenv('TEXT2SQL_PLAN_CACHE_SIZE', 1000))  # 参数化SQL执行计划缓存条目数
+    NLP_JIEBA_CACHE_FILE = os.getenv('NLP_JIEBA_CACHE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'jieba.cache'))  # jieba词典缓存文件
+    
+    # 因子面板配置
+    FACTOR_PANEL_DIR = os.getenv('FACTOR_PANEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'factor_panel'))  # 因子面板存储目录
+    FACTOR_PANEL_HISTORY_DAYS = int(os.getenv('FACTOR_PANEL_HISTORY_DAYS', 250))  # 面板首次同步的交易日数
+    FACTOR_IC_WINDOW = int(os.getenv('FACTOR_IC_WINDOW', 20))  # Rank IC权重的滚动窗口（交易日）
+    FACTOR_IC_HORIZON = int(os.getenv('FACTOR_IC_HORIZON', 1))  # Rank IC远期收益天数
+    FACTOR_IC_METHOD = os.getenv('FACTOR_IC_METHOD', 'ic')  # IC权重方式: ic / icir
+    FACTOR_IC_MIN_STOCKS = int(os.getenv('FACTOR_IC_MIN_STOCKS', 30))  # 计算单日IC的最少股票数
+    
+    # 选股引擎配置
+    SCREENER_MAX_RESULTS = int(os.getenv('SCREENER_MAX_RESULTS', 200))  # 选股每页最大返回数量
+    SCREENER_VERSION_CHECK_INTERVAL = int(os.getenv('SCREENER_VERSION_CHECK_INTERVAL', 60))  # 检查宽表最新交易日的间隔（秒）
+    SCREENER_HISTORY_CACHE_SIZE = int(os.getenv('SCREENER_HISTORY_CACHE_SIZE', 5))  # 缓存的历史交易日截面数量
+    SCREENER_HISTORY_MAX_DAYS = int(os.getenv('SCREENER_HISTORY_MAX_DAYS', 366))  # 历史区间筛选最大跨度（自然日）
+    SCREENER_HISTORY_HORIZONS = [int(h) for h in os.getenv('SCREENER_HISTORY_HORIZONS', '1,5,20').split(',')]  # 历史筛选统计的远期收益天数
+    
+    # 回测配置
+    BACKTEST_INITIAL_CAPITAL = float(os.getenv('BACKTEST_INITIAL_CAPITAL', 1000000))  # 初始资金
+    BACKTEST_MAX_POSITIONS = int(os.getenv('BACKTEST_MAX_POSITIONS', 10))  # 最大持仓股票数
+    BACKTEST_COMMISSION_RATE = float(os.getenv('BACKTEST_COMMISSION_RATE', 0.00025))  # 佣金费率
+    BACKTEST_MIN_COMMISSION = float(os.getenv('BACKTEST_MIN_COMMISSION', 5))  # 单笔最低佣金（元）
+    BACKTEST_STAMP_DUTY = float(os.getenv('BACKTEST_STAMP_DUTY', 0.0005))  # 卖出印花税率
+    BACKTEST_SLIPPAGE = float(os.getenv('BACKTEST_SLIPPAGE', 0.001))  # 成交滑点（相对开盘价）
+    BACKTEST_LOT_SIZE = int(os.getenv('BACKTEST_LOT_SIZE', 100))  # 每手股数
+    BACKTEST_LOAD_CHUNK_SIZE = int(os.getenv('BACKTEST_LOAD_CHUNK_SIZE', 200000))  # 行情流式读取每批行数
+    BACKTEST_INSERT_BATCH_SIZE = int(os.getenv('BACKTEST_INSERT_BATCH_SIZE', 5000))  # 回测信号每批写入条数
+    
+    # 股票搜索配置
+    STOCK_SEARCH_REFRESH_INTERVAL = int(os.getenv('STOCK_SEARCH_REFRESH_INTERVAL', 3600))  # 搜索索引自动重建间隔（秒）
+    
+    # K线降采样配置
+    OHLC_RESAMPLE_CACHE_TTL = int(os.getenv('OHLC_RESAMPLE_CACHE_TTL', 300))  # 降采样结果缓存时间（秒）
+    OHLC_RESAMPLE_CACHE_SIZE = int(os.getenv('OHLC_RESAMPLE_CACHE_SIZE', 256))  # 降采样结果缓存条目数
     
     # 分页配置
     DEFAULT_PAGE_SIZE = 20
     MAX_PAGE_SIZE = 100
+    PAGINATION_COUNT_CACHE_TTL = int(os.getenv('PAGINATION_COUNT_CACHE_TTL', 60))  # 列表总数缓存时间（秒）
+    PAGINATION_COUNT_CACHE_SIZE = int(os.getenv('PAGINATION_COUNT_CACHE_SIZE', 1000))  # 列表总数缓存条目数
     
     # 大模型配置
     LLM_CONFIG = {
@@ -71,6 +136,16 @@ class Config:
             'timeout': 60,
             'temperature': 0.1,
             'max_tokens': 2048
+        },
+        # HTTP连接池大小（同一上游复用长连接）
+        'pool_size': int(os.getenv('LLM_POOL_SIZE', 10)),
+        # 服务状态检查结果缓存时间（秒）
+        'status_ttl': int(os.getenv('LLM_STATUS_TTL', 30)),
+        # 提示词 -> 回复缓存，按 提供商+地址+模型+消息+采样参数 的哈希为键
+        'cache': {
+            'backend': os.getenv('LLM_CACHE_BACKEND', 'disk'),  # disk / redis / none
+            'dir': os.getenv('LLM_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'llm')),
+            'ttl': int(os.getenv('LLM_CACHE_TTL', 7 * 24 * 3600))  # 过期时间（秒）
         }
     }
 
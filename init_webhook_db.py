@@ -9,6 +9,7 @@ Webhook配置数据库初始化脚本
 from app import create_app
 from app.extensions import db
 from app.models.webhook_config import WebhookConfig
+from app.models.webhook_outbox import WebhookOutbox  # 确保create_all同时创建发件箱表
 import logging
 
 logger = logging.getLogger(__name__)
@@ -6,6 +6,7 @@ import signal
 import sys
 from app import create_app
 from app.extensions import socketio
+from app.services.webhook_outbox_service import webhook_outbox_service
 
 # 创建Flask应用实例
 app = create_app(os.getenv('FLASK_ENV', 'default'))
@@ -21,6 +22,9 @@ if __name__ == '__main__':
     # 注册信号处理器
     signal.signal(signal.SIGINT, signal_handler)
     
+    # 启动Webhook发件箱分发服务（预警通知汇总发送）
+    webhook_outbox_service.start(app)
+    
     # 开发环境下运行，使用SocketIO
     print("=" * 60)
     print("🚀 启动 Flask API 服务器...")
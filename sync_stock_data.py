@@ -42,6 +42,28 @@ def sync_stocks(force_update=False):
         
         print("\n" + "=" * 60)
 
+def sync_factor_panel():
+    """把新交易日的因子数据追加到因子面板（面板为空时回填最近的交易日）"""
+    from app.services.factor_panel_store import factor_panel_store
+    
+    app = create_app()
+    
+    with app.app_context():
+        print("=" * 60)
+        print("📈 开始同步因子面板...")
+        print("=" * 60)
+        
+        added = factor_panel_store.sync_if_available()
+        if added is None:
+            print("\n⚠️  未找到 FactorValues 模型，跳过因子面板同步")
+        else:
+            stats = factor_panel_store.get_stats()
+            print(f"\n✅ 同步完成! 新增 {added} 个交易日")
+            print(f"   区间: {stats['first_date']} ~ {stats['last_date']}")
+            print(f"   股票: {stats['codes']} 只, 字段: {stats['fields']} 个")
+        
+        print("\n" + "=" * 60)
+
 if __name__ == '__main__':
     # 检查命令行参数
     force = '--force' in sys.argv or '-f' in sys.argv
@@ -49,4 +71,7 @@ if __name__ == '__main__':
     if force:
         print("⚠️  强制更新模式")
     
-    sync_stocks(force_update=force)
+    if '--factor-panel' in sys.argv:
+        sync_factor_panel()
+    else:
+        sync_stocks(force_update=force)
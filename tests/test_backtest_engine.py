@@ -0,0 +1,109 @@
+"""
+回测引擎测试
+只测试撮合与行情面板的纯计算部分（不访问数据库）
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.services.backtest_engine import BacktestEngine, BarPanel, MovingAverageCrossStrategy
+
+
+def make_panel(close, open_=None, pre_close=None, times=None, period_type='daily', ts_codes=None, names=None):
+    close = np.asarray(close, dtype=float).reshape(len(close), -1)
+    open_ = close.copy() if open_ is None else np.asarray(open_, dtype=float).reshape(close.shape)
+    if pre_close is None:
+        pre_close = np.vstack([close[:1], close[:-1]])
+    pre_close = np.asarray(pre_close, dtype=float).reshape(close.shape)
+    if times is None:
+        times = pd.bdate_range('2024-01-02', periods=len(close))
+    if ts_codes is None:
+        ts_codes = [f'600{i:03d}.SH' for i in range(close.shape[1])]
+
+    arrays = {
+        'open': open_,
+        'high': np.maximum(open_, close),
+        'low': np.minimum(open_, close),
+        'close': close,
+        'pre_close': pre_close,
+        'volume': np.full(close.shape, 1000.0)
+    }
+    return BarPanel(pd.DatetimeIndex(times), np.array(ts_codes, dtype=object), period_type, arrays, names=names)
+
+
+def make_engine(**overrides) -> BacktestEngine:
+    params = {'initial_capital': 100_000, 'max_positions': 1, 'commission_rate': 0.0,
+              'min_commission': 0.0, 'stamp_duty': 0.0, 'slippage': 0.0, 'lot_size': 100}
+    params.update(overrides)
+    return BacktestEngine(**params)
+
+
+def test_lot_rounding_and_ex_rights_day():
+    # 第3根K线10送10除权：昨收由10变为5
+    bars = make_panel(close=[10, 10, 5, 5.5], open_=[10, 10.3, 5, 5.2], pre_close=[10, 10, 5, 5])
+    signals = np.array([[1.0], [0.0], [-1.0], [0.0]])
+
+    result = make_engine().simulate(bars, signals)
+    buy, sell = result['trades']
+
+    # 100000 / (10.3 * 100) 取整为97手
+    assert buy['side'] == 'BUY' and buy['shares'] == 9700
+    assert np.isclose(result['equity'][2], result['equity'][1])
+    assert sell['side'] == 'SELL' and sell['shares'] == 19400
+    assert np.isclose(sell['profit_loss'], 19400 * 5.2 - 9700 * 10.3)
+    assert np.isclose(result['equity'][-1], 100_000 - 9700 * 10.3 + 19400 * 5.2)
+
+
+def test_limit_up_blocks_buy():
+    bars = make_panel(close=[10, 11, 11], open_=[10, 11, 11])
+    signals = np.array([[1.0], [0.0], [0.0]])
+
+    result = make_engine().simulate(bars, signals)
+
+    assert result['trades'] == []
+    assert result['stats']['blocked_limit_up'] == 1
+
+
+def test_limit_down_keeps_sell_pending():
+    bars = make_panel(close=[10, 10, 9, 9.5], open_=[10, 10, 9, 9.5])
+    signals = np.array([[1.0], [-1.0], [0.0], [0.0]])
+
+    result = make_engine().simulate(bars, signals)
+    buy, sell = result['trades']
+
+    assert result['stats']['blocked_limit_down'] == 1
+    assert buy['bar'] == 1
+    assert sell['bar'] == 3 and sell['price'] == 9.5
+
+
+def test_t1_blocks_same_day_sell():
+    times = [f'2024-01-0{day} {hour}' for day in (2, 3) for hour in ('10:30', '11:30', '14:00', '15:00')]
+    bars = make_panel(close=[10] * 8, times=times, period_type='60min')
+    signals = np.zeros((8, 1))
+    signals[0] = 1.0
+    signals[1] = -1.0
+
+    result = make_engine().simulate(bars, signals)
+    buy, sell = result['trades']
+
+    assert buy['bar'] == 1
+    assert result['stats']['blocked_t1'] == 2
+    assert sell['bar'] == 4 and sell['holding_days'] == 1
+
+
+def test_price_limits_by_board_and_st():
+    codes = ['600001.SH', '600002.SH', '300001.SZ', '830001.BJ']
+    names = ['*ST甲', '乙', 'ST丙', '丁']
+    up_limit, down_limit = BarPanel.price_limits(np.full((1, 4), 10.0), codes, names)
+
+    assert up_limit.tolist() == [[10.5, 11.0, 12.0, 13.0]]
+    assert down_limit.tolist() == [[9.5, 9.0, 8.0, 7.0]]
+
+
+def test_signals_use_adjusted_prices():
+    close = np.r_[np.full(25, 10.0), np.full(10, 5.0)]
+    bars = make_panel(close=close, pre_close=np.r_[close[:1], np.full(24, 10.0), np.full(10, 5.0)])
+
+    assert bars.ex_ratio[25, 0] == 2.0
+    assert np.allclose(bars.adjusted(bars.close), 10.0)
+    assert not MovingAverageCrossStrategy().generate_signals(bars).any()
@@ -0,0 +1,133 @@
+"""
+大模型服务测试
+用本地 http.server 桩服务代替 Ollama，验证缓存、并发合并和状态缓存
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services.llm_service import LLMService
+
+
+class StubOllama:
+    """最小的Ollama桩服务：/api/chat 延迟后回显最后一条消息，/api/tags 返回模型列表"""
+
+    def __init__(self, delay: float = 0.3, model: str = 'stub-model'):
+        self.delay = delay
+        self.model = model
+        self.chat_calls = 0
+        self.tags_calls = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.tags_calls += 1
+                self._send({'models': [{'name': stub.model}]})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub._lock:
+                    stub.chat_calls += 1
+                time.sleep(stub.delay)
+                self._send({'message': {'content': f"echo: {payload['messages'][-1]['content']}"}})
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubOllama()
+    yield server
+    server.close()
+
+
+def make_service(base_url: str, cache_dir) -> LLMService:
+    return LLMService({
+        'provider': 'ollama',
+        'ollama': {'base_url': base_url, 'model': 'stub-model', 'timeout': 5},
+        'cache': {'backend': 'disk', 'dir': str(cache_dir)}
+    })
+
+
+MESSAGES = [{'role': 'user', 'content': '今日涨幅前十的股票'}]
+
+
+def test_concurrent_identical_prompts_hit_upstream_once(stub, tmp_path):
+    service = make_service(stub.url, tmp_path)
+    callers = 8
+    barrier = threading.Barrier(callers)
+    results = []
+
+    def call():
+        barrier.wait()
+        results.append(service.chat_completion(MESSAGES))
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stub.chat_calls == 1
+    assert service.stats['upstream_calls'] == 1
+    assert service.stats['coalesced'] + service.stats['cache_hits'] == callers - 1
+    assert all(result['success'] and result['content'] == 'echo: 今日涨幅前十的股票' for result in results)
+
+
+def test_repeat_call_is_served_from_cache(stub, tmp_path):
+    service = make_service(stub.url, tmp_path)
+
+    first = service.chat_completion(MESSAGES)
+    second = service.chat_completion(MESSAGES)
+
+    assert stub.chat_calls == 1
+    assert first['success'] and not first.get('cached')
+    assert second['cached'] and second['content'] == first['content']
+
+
+def test_cache_is_keyed_by_base_url(stub, tmp_path):
+    other = StubOllama()
+    try:
+        make_service(stub.url, tmp_path).chat_completion(MESSAGES)
+        make_service(other.url, tmp_path).chat_completion(MESSAGES)
+    finally:
+        other.close()
+
+    assert stub.chat_calls == 1
+    assert other.chat_calls == 1
+
+
+def test_service_status_is_cached(stub, tmp_path):
+    service = make_service(stub.url, tmp_path)
+
+    assert service.check_service_status()['status'] == 'online'
+    assert service.check_service_status()['status'] == 'online'
+    assert stub.tags_calls == 1
+
+    service.check_service_status(force=True)
+    assert stub.tags_calls == 2
@@ -0,0 +1,88 @@
+"""
+自然语言处理器测试
+多模式匹配（Aho–Corasick自动机、合并前瞻正则）与逐个 in / re.search 的结果一致
+"""
+
+import random
+import re
+
+from app.services.nlp_processor import (
+    EntityExtractor, IntentClassifier, TermAutomaton, compile_presence_pattern, matched_indexes
+)
+
+QUERIES = [
+    '市盈率小于20且换手率大于5%的股票',
+    '今日主力资金净流入前10名',
+    '资金流向和净流出最多的股票',
+    'MACD金叉并且RSI超卖，按涨跌幅降序排序',
+    '成交量放大，成交额超过10亿，量比大于2',
+    'pe_ttm低于15，pb小于2，roe最高的top 20',
+    '均线多头排列的股票有哪些',
+    ''
+]
+
+
+def expected_terms(terms, text):
+    return {term for term in terms if term and term in text}
+
+
+def test_automaton_matches_substring_search_with_overlapping_terms():
+    terms = ['he', 'she', 'his', 'hers', 'h', 'ushers']
+    automaton = TermAutomaton(terms)
+
+    for text in ('ushers', 'ahishers', 'shhe', 'xyz', ''):
+        assert automaton.find_all(text) == expected_terms(terms, text)
+
+
+def test_automaton_matches_substring_search_on_chinese_terms():
+    terms = ['资金', '资金流', '金流', '净流入', '流入', '主力资金', '力资']
+    automaton = TermAutomaton(terms)
+
+    for text in QUERIES + ['主力资金流入', '资金资金流流入']:
+        assert automaton.find_all(text) == expected_terms(terms, text)
+
+
+def test_automaton_matches_substring_search_on_random_text():
+    rng = random.Random(0)
+    alphabet = 'abc'
+    for _ in range(200):
+        terms = [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        assert TermAutomaton(terms).find_all(text) == expected_terms(terms, text)
+
+
+def test_field_automaton_matches_field_terms():
+    extractor = EntityExtractor()
+    terms = list(extractor._field_entries)
+
+    for text in QUERIES:
+        assert extractor._field_automaton.find_all(text) == expected_terms(terms, text)
+
+
+def presence_by_search(items, text):
+    return [i for i, (pattern, ignore_case) in enumerate(items)
+            if re.search(pattern, text, re.IGNORECASE if ignore_case else 0)]
+
+
+def test_presence_pattern_matches_per_pattern_search():
+    items = [('资金', False), ('资金流', False), ('金流', False), ('流.*入', False),
+             (r'top\s*\d+', True), ('PE', False), ('pe', True), ('前.*名', False)]
+    compiled = compile_presence_pattern(items)
+
+    for text in QUERIES + ['TOP 5资金流入', 'Pe ttm']:
+        assert matched_indexes(compiled, text) == presence_by_search(items, text)
+
+
+def test_presence_pattern_matches_intent_and_comparison_patterns():
+    classifier = IntentClassifier()
+    for intent_config in classifier.intent_patterns.values():
+        items = [(pattern, True) for pattern in intent_config['patterns']]
+        items += [(re.escape(keyword), False) for keyword in intent_config['keywords']]
+        compiled = compile_presence_pattern(items)
+        for text in QUERIES:
+            assert matched_indexes(compiled, text) == presence_by_search(items, text)
+
+    extractor = EntityExtractor()
+    items = [(pattern, False) for pattern in extractor.comparison_patterns.values()]
+    for text in QUERIES:
+        assert matched_indexes(extractor._comparison_regex, text) == presence_by_search(items, text)
@@ -0,0 +1,70 @@
+"""
+K线降采样测试
+只测试纯计算部分（不访问数据库）
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.services.ohlc_resampler import OHLCResampler, daily_period_keys
+
+COLUMNS = ['start_trade_date', 'trade_date', 'open', 'high', 'low', 'close',
+           'pre_close', 'change', 'pct_chg', 'volume', 'amount', 'bars']
+
+
+def make_daily(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    pre_close = np.r_[close[:1], close[:-1]]
+    return pd.DataFrame({
+        'trade_date': pd.bdate_range('2020-01-01', periods=n),
+        'open': pre_close,
+        'high': np.maximum(pre_close, close) * 1.01,
+        'low': np.minimum(pre_close, close) * 0.99,
+        'close': close,
+        'pre_close': pre_close,
+        'volume': np.full(n, 100),
+        'amount': np.full(n, 1000.0)
+    })
+
+
+def test_points_not_smaller_than_series_returns_one_candle_per_bar():
+    frame = make_daily(300)
+
+    for points in (300, 500):
+        result = OHLCResampler._resample(frame, 'trade_date', None, points)
+
+        assert list(result.columns) == COLUMNS
+        assert len(result) == 300
+        assert (result['bars'] == 1).all()
+        assert np.allclose(result['close'], frame['close'])
+
+
+def test_points_downsamples_from_latest_bar():
+    frame = make_daily(1000)
+    result = OHLCResampler._resample(frame, 'trade_date', None, 300)
+
+    assert list(result.columns) == COLUMNS
+    assert len(result) <= 300
+    assert result['bars'].sum() == 1000
+    assert result['trade_date'].iloc[-1] == frame['trade_date'].iloc[-1]
+    assert result['volume'].sum() == frame['volume'].sum()
+
+
+def test_weekly_matches_pandas_resample():
+    frame = make_daily(500)
+    result = OHLCResampler._resample(frame, 'trade_date', lambda dates: daily_period_keys(dates, 'W'), None)
+
+    expected = frame.set_index('trade_date').resample('W-SUN').agg(
+        {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+    ).dropna()
+    assert len(result) == len(expected)
+    for column in ('open', 'high', 'low', 'close', 'volume'):
+        assert np.allclose(result[column].to_numpy(), expected[column].to_numpy())
+
+
+def test_empty_frame_keeps_columns():
+    result = OHLCResampler._resample(make_daily(0), 'trade_date', None, 10)
+
+    assert result.empty
+    assert list(result.columns) == COLUMNS
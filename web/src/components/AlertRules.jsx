@@ -250,7 +250,9 @@ export default function AlertRules() {
       'turnover_rate': '换手率',
       'market_value': '市值变化',
       'technical_indicator': '技术指标',
-      'money_flow': '资金流向'
+      'money_flow': '资金流向',
+      'price_zscore': '价格异动(Z分数)',
+      'volume_spike': '放量倍数'
     };
     return types[type] || type;
   };
@@ -364,6 +366,8 @@ export default function AlertRules() {
                       <SelectItem value="price_change_pct">涨跌幅(%)</SelectItem>
                       <SelectItem value="volume_ratio">成交量比率</SelectItem>
                       <SelectItem value="turnover_rate">换手率</SelectItem>
+                      <SelectItem value="price_zscore">价格异动(Z分数)</SelectItem>
+                      <SelectItem value="volume_spike">放量倍数</SelectItem>
                     </SelectContent>
                   </Select>
                 </div>
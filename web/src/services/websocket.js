@@ -59,9 +59,12 @@ class WebSocketService {
       this.notifyListeners('server_connected', data);
     });
 
-    // 市场数据更新
-    this.socket.on('market_data_update', (data) => {
+    // 市场数据更新（回复ack，服务端据此判断客户端是否落后并调整推送频率）
+    this.socket.on('market_data_update', (data, ack) => {
       this.notifyListeners('market_data_update', data);
+      if (typeof ack === 'function') {
+        ack();
+      }
     });
 
     // 风险预警